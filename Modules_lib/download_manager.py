@@ -5,14 +5,25 @@ import os
 from urllib.parse import urlparse, unquote
 import re
 import mimetypes
+from core.download_cache import get_download_cache
+from core.progress import ProgressReporter, ProgressTracker, ThrottledEditor
+from core.delivery import send_file
+from core.uploader import get_uploader
+from core.bandwidth import get_shaper
+from core.checksums import ALGORITHMS, HashingWriter, StreamingHasher, parse_expected_hash
+from core.storage import get_storage_manager
+from core import fs, split
 
 COMMAND = 'download'
-COMMAND_DESCRIPTION = 'Скачать файл из интернета. Использование: /download <url> [имя_файла]'
+COMMAND_DESCRIPTION = 'Скачать файл из интернета. Использование: /download <url> [имя_файла] [--send] [--sha256=<хеш>]'
 
 __version__ = "1.0.0"
 __doc__ = "Скачать файл из интернета"
 __dependencies__ = ["aiohttp"]  # optional
 
+# Размер блока при потоковом скачивании
+CHUNK_SIZE = 64 * 1024
+
 def sanitize_filename(filename):
     """Очистка имени файла от недопустимых символов"""
     # Заменяем недопустимые символы на подчеркивание
@@ -52,29 +63,138 @@ def get_filename_from_url(url, content_disposition=None, content_type=None):
     
     return sanitize_filename(filename)
 
+def parse_hash_options(options):
+    """
+    Разбор опций контрольных сумм: --md5 включает подсчет MD5,
+    --sha256=<хеш>, --md5=<хеш> или --hash=<хеш> задают ожидаемое значение.
+    Возвращает набор алгоритмов и ожидаемый хеш (алгоритм, значение) или None.
+    """
+    algorithms = {'sha256'}
+    expected = None
+    for option in options:
+        name, _, value = option[2:].partition('=')
+        if name in ALGORITHMS:
+            algorithms.add(name)
+            if value:
+                expected = parse_expected_hash(value, name)
+        elif name == 'hash':
+            expected = parse_expected_hash(value)
+            algorithms.add(expected[0])
+    return algorithms, expected
+
+def format_digests(digests: dict) -> str:
+    """Строки с контрольными суммами для сообщения"""
+    return "".join(f"🔐 {name.upper()}: {value}\n" for name, value in sorted(digests.items(), reverse=True))
+
+async def deliver_file(context, status_message, filepath: str, user_id=None):
+    """Отправка скачанного файла в чат или, если он слишком большой, на файлообменник"""
+    config = context.bot_data.get('config', {})
+    max_file_size = config.get('max_file_size', 50 * 1024 * 1024)
+    filename = os.path.basename(filepath)
+    size = os.path.getsize(filepath)
+    to_telegram = size <= max_file_size or (
+        config.get('large_file_mode') == split.MODE_SPLIT and split.can_split(size, max_file_size)
+    )
+    reporter = ProgressReporter(
+        status_message, f"📤 Отправка: {filename}", size,
+        metric='upload_telegram' if to_telegram else 'upload_external'
+    )
+    
+    try:
+        if size > max_file_size and to_telegram:
+            await split.send_in_parts(
+                context.bot, status_message.chat_id, filepath, max_file_size, on_chunk=reporter, user_id=user_id
+            )
+        elif size > max_file_size:
+            result = await get_uploader(config).upload_file(
+                filepath, on_chunk=reporter, user_id=user_id,
+                on_retry=lambda host: reporter.restart(f"📤 Отправка: {filename} (повтор: {host})")
+            )
+            if result:
+                await reporter.finish(
+                    f"✅ Файл слишком большой для Telegram и загружен на файлообменник {result.host}\n"
+                    f"📁 Имя файла: {filename}\n"
+                    f"📎 Ссылка (действительна 30 минут): {result.link}"
+                )
+            else:
+                await reporter.finish("❌ Не удалось загрузить файл на файлообменник", ok=False)
+            return
+        else:
+            await send_file(
+                context.bot, status_message.chat_id, filepath,
+                caption=f"📁 {filename}", on_chunk=reporter, user_id=user_id
+            )
+    except Exception:
+        reporter.close(ok=False)
+        raise
+    reporter.close()
+    await status_message.delete()
+
 async def download_command(update: Update, context):
     """Модуль для скачивания файлов"""
     user_message = update.message.text.split()
-    if len(user_message) < 2:
+    args = [arg for arg in user_message[1:] if not arg.startswith('--')]
+    options = [arg for arg in user_message[1:] if arg.startswith('--')]
+    if not args:
         await update.message.reply_text(
-            "Использование: /download <url> [имя_файла]\n"
+            "Использование: /download <url> [имя_файла] [--send]\n"
             "Например:\n"
             "/download https://example.com/file.pdf\n"
-            "/download https://example.com/file.pdf my_file.pdf"
+            "/download https://example.com/file.pdf my_file.pdf\n\n"
+            "--send - отправить файл в чат после загрузки\n"
+            "--sha256=<хеш> или --md5=<хеш> - проверить контрольную сумму\n"
+            "--md5 - дополнительно посчитать MD5"
         )
         return
     
-    url = user_message[1]
-    custom_filename = user_message[2] if len(user_message) > 2 else None
+    try:
+        algorithms, expected = parse_hash_options(options)
+    except ValueError as e:
+        await update.message.reply_text(f"❌ Неверная контрольная сумма: {str(e)}")
+        return
+    
+    url = args[0]
+    custom_filename = args[1] if len(args) > 1 else None
+    send_to_chat = '--send' in options
+    user_id = update.effective_user.id
+    
+    config = context.bot_data.get('config', {})
+    cache = get_download_cache(config.get('download_folder', 'downloads'))
+    part_path = None
     
     try:
         status_message = await update.message.reply_text("Начинаю загрузку файла...")
         
+        entry = await fs.run(cache.get, url)
+        # Недостающий хеш считается по всему файлу - не на цикле событий
+        if entry and expected and await fs.run(cache.digest, entry, expected[0]) != expected[1]:
+            # Локальная копия не совпадает с ожидаемой суммой: запись забывается,
+            # и файл скачивается заново обычным запросом, а не условным (304)
+            await fs.run(cache.forget, url)
+        
+        headers = await fs.run(cache.conditional_headers, url)
         async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                if response.status == 200:
-                    content = await response.read()
+            async with session.get(url, headers=headers) as response:
+                entry = await fs.run(cache.get, url)
+                if response.status == 304 and entry:
+                    # Файл не изменился - используем локальную копию
+                    digests = {name: await fs.run(cache.digest, entry, name) for name in algorithms}
+                    filename = sanitize_filename(custom_filename) if custom_filename else entry['files'][0]
+                    filepath = await fs.run(cache.link, entry['sha256'], filename)
+                    # Обе отметки пишут на диск (индекс и время доступа) - не на цикле событий
+                    await fs.run(cache.touch, url, os.path.basename(filepath))
+                    await fs.run(get_storage_manager().touch, filepath)
                     
+                    await status_message.edit_text(
+                        f"♻️ Файл не изменился, используется локальная копия\n"
+                        f"📁 Имя файла: {os.path.basename(filepath)}\n"
+                        f"📊 Размер: {entry['size'] / (1024 * 1024):.2f} МБ\n"
+                        f"{format_digests(digests)}"
+                        f"📂 Путь: {filepath}"
+                    )
+                    if send_to_chat:
+                        await deliver_file(context, status_message, filepath, user_id)
+                elif response.status == 200:
                     # Получаем имя файла
                     if custom_filename:
                         filename = sanitize_filename(custom_filename)
@@ -83,25 +203,59 @@ async def download_command(update: Update, context):
                         content_type = response.headers.get('Content-Type')
                         filename = get_filename_from_url(url, content_disposition, content_type)
                     
-                    # Создаем директорию downloads, если её нет
-                    os.makedirs('downloads', exist_ok=True)
+                    # Скачиваем потоком во временный файл, попутно считая хеш
+                    part_path = cache.new_part_path()
+                    hasher = StreamingHasher(algorithms)
+                    progress = ProgressTracker(response.content_length)
+                    editor = ThrottledEditor(status_message)
+                    shaper = get_shaper()
+                    with open(part_path, 'wb') as f:
+                        writer = HashingWriter(f, hasher)
+                        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                            await shaper.throttle(len(chunk), 'download', user_id)
+                            await writer.write(chunk)
+                            progress.update(len(chunk))
+                            if editor.ready():
+                                await editor.update(progress.render(f"⏳ Загрузка: {filename}"))
+                        await writer.flush()
+                    size = progress.done
                     
-                    # Полный путь к файлу
-                    filepath = os.path.join('downloads', filename)
+                    digests = hasher.hexdigests()
+                    if expected and digests[expected[0]] != expected[1]:
+                        # Недокачанный или подмененный файл удаляется в finally
+                        await editor.finish(
+                            f"❌ Контрольная сумма не совпадает, файл удален\n"
+                            f"Ожидалось: {expected[1]}\n"
+                            f"Получено: {digests[expected[0]]}"
+                        )
+                        return
                     
-                    # Записываем файл
-                    with open(filepath, 'wb') as f:
-                        f.write(content)
+                    digest = digests['sha256']
+                    await fs.run(cache.store_object, part_path, digest)
+                    part_path = None
+                    filepath = await fs.run(cache.link, digest, filename)
+                    await fs.run(
+                        cache.record, url, digest, size, os.path.basename(filepath),
+                        etag=response.headers.get('ETag'),
+                        last_modified=response.headers.get('Last-Modified'),
+                        digests=digests
+                    )
                     
                     # Получаем размер файла в МБ
-                    file_size = os.path.getsize(filepath) / (1024 * 1024)
+                    file_size = size / (1024 * 1024)
+                    verified = "✔️ Контрольная сумма совпадает\n" if expected else ""
                     
-                    await status_message.edit_text(
+                    await editor.finish(
                         f"✅ Файл успешно загружен\n"
-                        f"📁 Имя файла: {filename}\n"
+                        f"📁 Имя файла: {os.path.basename(filepath)}\n"
                         f"📊 Размер: {file_size:.2f} МБ\n"
+                        f"⚡ Средняя скорость: {progress.average_speed / (1024 * 1024):.2f} МБ/с\n"
+                        f"{format_digests(digests)}"
+                        f"{verified}"
                         f"📂 Путь: {filepath}"
                     )
+                    if send_to_chat:
+                        await deliver_file(context, status_message, filepath, user_id)
                 else:
                     await status_message.edit_text(
                         f"❌ Ошибка при скачивании\n"
@@ -111,4 +265,8 @@ async def download_command(update: Update, context):
     except aiohttp.ClientError as e:
         await status_message.edit_text(f"❌ Ошибка сети при скачивании: {str(e)}")
     except Exception as e:
-        await status_message.edit_text(f"❌ Ошибка при скачивании: {str(e)}")
\ No newline at end of file
+        await status_message.edit_text(f"❌ Ошибка при скачивании: {str(e)}")
+    finally:
+        # Удаляем недокачанный файл
+        if part_path and os.path.exists(part_path):
+            os.remove(part_path)
@@ -6,9 +6,13 @@ import asyncio
 import time
 import random
 import re
-import aiohttp
 import json
 import logging
+from core import delivery
+from core.bandwidth import ThrottledWriter
+from core.progress import ProgressReporter, format_duration
+from core.uploader import get_uploader
+from core.storage import get_storage_manager
 
 logger = logging.getLogger(__name__)
 
@@ -19,24 +23,6 @@ __version__ = "1.0.0"
 __doc__ = "Скачать видео с Rutube"
 __dependencies__ = ["aiohttp", "rutube"]
 
-# Список файловых хостингов
-FILE_HOSTS = [
-    {
-        'name': 'file.io',
-        'url': 'https://file.io/',
-        'field_name': 'file',
-        'link_key': 'link',
-        'success_key': 'success'
-    },
-    {
-        'name': 'tmpfiles.org',
-        'url': 'https://tmpfiles.org/api/v1/upload',
-        'field_name': 'file',
-        'link_key': 'data.url',
-        'success_key': 'status'
-    }
-]
-
 # Забавные сообщения во время загрузки
 UPLOAD_MESSAGES = [
     "Загружаем видео в облако... ☁️",
@@ -81,17 +67,10 @@ class RutubeDownloader:
         except Exception as e:
             logger.error(f"Ошибка при обновлении прогресса: {e}")
 
-    async def upload_to_fileio(self, file_path: str, progress_msg, context) -> str:
-        """Upload file to file.io and return download link"""
+    async def upload_to_file_host(self, file_path: str, progress_msg, context, user_id=None):
+        """Загрузка видео на файлообменник, возвращает ссылку и сервис"""
         try:
-            file_size = os.path.getsize(file_path)
-            start_time = time.time()
-            last_update = start_time
-            last_size = 0
-            upload_complete = False
-            message_index = 0
-            
-            # Обрезаем имя файла до 30 символов (с запасом от лимита в 255)
+            # Обрезаем имя файла до 50 символов (с запасом от лимита в 255)
             filename = os.path.basename(file_path)
             if len(filename) > 50:
                 name, ext = os.path.splitext(filename)
@@ -99,121 +78,61 @@ class RutubeDownloader:
             
             logger.info(f"Uploading file: {filename}")
             
-            async def update_progress():
-                nonlocal last_update, last_size, message_index
-                while not upload_complete:
-                    try:
-                        current_time = time.time()
-                        elapsed = current_time - start_time
-                        
-                        if current_time - last_update >= 2:  # Обновляем каждые 2 секунды
-                            current_size = last_size + 1024 * 1024  # Примерно увеличиваем на 1MB
-                            if current_size > file_size:
-                                current_size = file_size
-                                
-                            progress = min(current_size / file_size * 100, 100)
-                            speed = (current_size - last_size) / (current_time - last_update) / 1024 / 1024  # MB/s
-                            
-                            # Создаем индикатор прогресса
-                            filled = int(progress / 10)
-                            progress_bar = f"{'█' * filled}{'_' * (10 - filled)}"
-                            
-                            # Обновляем индекс сообщения каждые 15 секунд
-                            message_index = int(elapsed / 15) % len(UPLOAD_MESSAGES)
-                            fun_message = UPLOAD_MESSAGES[message_index]
-                            
-                            await progress_msg.edit_text(
-                                f"⏳ Загрузка файла: {filename}\n"
-                                f"[{progress_bar}] {int(progress)}%\n"
-                                f"⚡ {speed:.1f} MB/s\n\n"
-                                f"💭 {fun_message}"
-                            )
-                            
-                            last_size = current_size
-                            last_update = current_time
-                        
-                        await asyncio.sleep(0.5)
-                    except Exception as e:
-                        logger.error(f"Error in progress update: {e}")
-                        await asyncio.sleep(1)
-            
-            # Запускаем обновление прогресса в отдельной задаче
-            progress_task = asyncio.create_task(update_progress())
-            
-            # Добавляем user agent и другие заголовки
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
-                'Accept': '*/*',
-                'Accept-Language': 'en-US,en;q=0.9',
-                'Origin': 'https://file.io',
-                'Referer': 'https://file.io/'
-            }
-            
-            async with aiohttp.ClientSession(headers=headers) as session:
-                with open(file_path, 'rb') as f:
-                    data = aiohttp.FormData()
-                    data.add_field('file', f, filename=filename)
-                    data.add_field('expires', '24h')  # Увеличиваем время жизни файла до 24 часов
-                    
-                    async with session.post('https://file.io', data=data) as response:
-                        result = await response.json()
-                        upload_complete = True
-                        logger.info(f"File.io response: {result}")
-                        
-                        if response.status == 200 and result.get('success'):
-                            # Дожидаемся завершения задачи прогресса
-                            await progress_task
-                            
-                            # Финальное сообщение
-                            await progress_msg.edit_text(
-                                f"✅ Загрузка завершена!\n"
-                                f"[{'█' * 10}] 100%\n"
-                                f"📁 Файл: {filename}\n"
-                                f"⏱ Время: {int(time.time() - start_time)} сек"
-                            )
-                            await asyncio.sleep(2)
-                            return result.get('link')
-                        else:
-                            error_msg = result.get('message', 'Unknown error')
-                            logger.error(f"File.io upload failed: {error_msg}")
+            # Прогресс по фактически отправленным байтам, сообщение меняется каждые 15 секунд
+            reporter = ProgressReporter(
+                progress_msg, f"⏳ Загрузка файла: {filename}", os.path.getsize(file_path),
+                metric='upload_external',
+                footer=lambda tracker: f"💭 {UPLOAD_MESSAGES[int(tracker.elapsed / 15) % len(UPLOAD_MESSAGES)]}"
+            )
             
-            upload_complete = True
-            await progress_task
+            result = await get_uploader(context.bot_data.get('config')).upload_file(
+                file_path, on_chunk=reporter, user_id=user_id, filename=filename,
+                on_retry=lambda host: reporter.restart(f"⏳ Загрузка файла: {filename} (повтор: {host})"),
+                expires='24h'  # Время жизни файла до 24 часов, если сервис это поддерживает
+            )
+            if result:
+                # Финальное сообщение
+                await reporter.finish(
+                    f"✅ Загрузка завершена!\n"
+                    f"[{'█' * 10}] 100%\n"
+                    f"📁 Файл: {filename}\n"
+                    f"⏱ Время: {format_duration(reporter.tracker.elapsed)}"
+                )
+                await asyncio.sleep(2)
+                return result
+            reporter.close(ok=False)
         except Exception as e:
-            logger.error(f"Error uploading to file.io: {e}")
-            if 'progress_task' in locals():
-                progress_task.cancel()
+            logger.error(f"Ошибка загрузки на файлообменник: {e}")
+            if 'reporter' in locals():
+                reporter.close(ok=False)
         return None
 
-    async def send_file(self, file_path: str, message, context):
+    async def send_file(self, file_path: str, message, context, user_id=None):
         """Отправка файла пользователю"""
         try:
-            # Сначала пробуем загрузить на file.io
-            cloud_link = await self.upload_to_fileio(file_path, message, context)
+            # Сначала пробуем загрузить на файлообменник
+            upload = await self.upload_to_file_host(file_path, message, context, user_id)
             
-            if cloud_link:
+            if upload:
                 await message.edit_text(
-                    f"✅ Видео успешно загружено!\n\n"
-                    f"🔗 Ссылка на скачивание: {cloud_link}\n\n"
-                    f"⚠️ Ссылка действительна 24 часа"
+                    f"✅ Видео успешно загружено на {upload.host}!\n\n"
+                    f"🔗 Ссылка на скачивание: {upload.link}\n\n"
+                    f"⚠️ Ссылка действительна до 24 часов"
                 )
                 return
 
             # Если загрузка на облако не удалась, отправляем напрямую
-            file_size = os.path.getsize(file_path)
-            with open(file_path, 'rb') as video_file:
-                await context.bot.send_video(
-                    chat_id=message.chat_id,
-                    video=video_file,
-                    caption="Вот ваше видео!"
-                )
+            await delivery.send_file(
+                context.bot, message.chat_id, file_path,
+                caption="Вот ваше видео!", user_id=user_id
+            )
             await message.delete()
             
         except Exception as e:
             logger.error(f"Ошибка при отправке файла: {e}")
             await message.edit_text("Произошла ошибка при отправке видео")
 
-    async def download_rutube_video(self, url: str, resolution: str, msg, context, title: str):
+    async def download_rutube_video(self, url: str, resolution: str, msg, context, title: str, user_id=None):
         """Скачивание видео"""
         start_time = time.time()
         file_path = None
@@ -246,41 +165,23 @@ class RutubeDownloader:
             if current_message != download_msg:  # Проверяем, что сообщение отличается
                 await msg.edit_text(download_msg)
             
-            # Скачиваем видео
+            # Скачиваем видео в отдельном потоке с ограничением скорости
+            loop = asyncio.get_event_loop()
             with open(file_path, 'wb') as f:
-                video.download(stream=f)
+                stream = ThrottledWriter(f, 'download', user_id)
+                await loop.run_in_executor(None, lambda: video.download(stream=stream))
             
             # Отправляем файл пользователю
-            await self.send_file(file_path, msg, context)
+            await self.send_file(file_path, msg, context, user_id)
             
         except Exception as e:
             logger.error(f"Ошибка при скачивании видео: {e}")
             await msg.edit_text("Произошла ошибка при скачивании видео")
         
         finally:
-            # Безопасное удаление файла
-            if file_path and os.path.exists(file_path):
-                try:
-                    # Даем небольшую задержку перед удалением
-                    await asyncio.sleep(2)
-                    os.remove(file_path)
-                except Exception as e:
-                    logger.error(f"Ошибка при удалении файла {file_path}: {e}")
-                    # Планируем повторную попытку удаления через некоторое время
-                    asyncio.create_task(self.delayed_file_cleanup(file_path))
-
-    async def delayed_file_cleanup(self, file_path: str, max_attempts: int = 3):
-        """Отложенная очистка файла с несколькими попытками"""
-        attempt = 0
-        while attempt < max_attempts:
-            await asyncio.sleep(30)  # Ждем 30 секунд между попытками
-            try:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                    break
-            except Exception as e:
-                logger.error(f"Попытка {attempt + 1} удаления файла {file_path} не удалась: {e}")
-                attempt += 1
+            # Удаляем файл; если он еще занят, менеджер хранилища удалит его при очистке
+            if file_path:
+                get_storage_manager().discard(file_path)
 
     async def rutube_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /rutube"""
@@ -363,7 +264,8 @@ class RutubeDownloader:
                 resolution,
                 loading_msg,
                 context,
-                url_data['title']
+                url_data['title'],
+                user_id
             )
         except Exception as e:
             logger.error(f"Ошибка при обработке кнопки: {e}")
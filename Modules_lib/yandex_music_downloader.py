@@ -1,4 +1,5 @@
 import os
+import asyncio
 import requests
 from yandex_music import Client
 from mutagen.mp3 import MP3
@@ -7,6 +8,8 @@ import logging
 import re
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton, InputMediaAudio
 from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler, MessageHandler, filters
+from core import delivery
+from core.bandwidth import ThrottledWriter
 
 # Command settings
 COMMAND = 'music'
@@ -35,6 +38,9 @@ file_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
 file_handler.setFormatter(file_formatter)
 logger.addHandler(file_handler)
 
+# Размер блока при скачивании трека
+CHUNK_SIZE = 64 * 1024
+
 # Инициализация клиента Яндекс.Музыки
 client = None
 
@@ -64,6 +70,16 @@ def get_best_mp3_format(formats, quality='Оптимально'):
         return min(mp3_formats, key=lambda x: x.bitrate_in_kbps)
     return mp3_formats[0]
 
+def download_direct(download_info, filename, user_id=None):
+    """Потоковое скачивание трека по прямой ссылке с ограничением скорости"""
+    url = download_info.get_direct_link()
+    with requests.get(url, stream=True, timeout=30) as response:
+        response.raise_for_status()
+        with open(filename, 'wb') as f:
+            writer = ThrottledWriter(f, 'download', user_id)
+            for chunk in response.iter_content(CHUNK_SIZE):
+                writer.write(chunk)
+
 def is_mp3_corrupted(filename):
     """Проверка целостности MP3 файла"""
     try:
@@ -121,17 +137,15 @@ async def download_track(track_info, message, context: ContextTypes.DEFAULT_TYPE
         # Загружаем трек
         await message.edit_text(f"⏳ Загружаю: {artist_name} - {track_title}")
         
+        loop = asyncio.get_event_loop()
         try:
-            # Пробуем прямую загрузку через API
-            selected_format.download(filename)
+            # Скачиваем потоком по прямой ссылке (через общий лимит скорости)
+            await loop.run_in_executor(None, download_direct, selected_format, filename, message.chat.id)
         except Exception as e:
-            logger.error(f"Ошибка при прямой загрузке трека {track_title}: {e}")
+            logger.error(f"Ошибка при загрузке трека {track_title} по прямой ссылке: {e}")
             try:
-                # Пробуем альтернативную загрузку через URL
-                url = selected_format.get_direct_link()
-                response = requests.get(url)
-                with open(filename, 'wb') as f:
-                    f.write(response.content)
+                # Пробуем загрузку через API
+                await loop.run_in_executor(None, selected_format.download, filename)
             except Exception as e2:
                 logger.error(f"Ошибка при альтернативной загрузке трека {track_title}: {e2}")
                 await message.edit_text(f"❌ Ошибка при загрузке трека {track_title}")
@@ -171,15 +185,13 @@ async def download_track(track_info, message, context: ContextTypes.DEFAULT_TYPE
             audio.save()
             
             # Отправляем файл в Telegram
-            with open(filename, 'rb') as audio_file:
-                await message.edit_text(f"⬆️ Отправляю: {artist_name} - {track_title}")
-                await context.bot.send_audio(
-                    chat_id=message.chat.id,
-                    audio=audio_file,
-                    title=track_title,
-                    performer=artist_name,
-                    caption=f"🎵 {artist_name} - {track_title}"
-                )
+            await message.edit_text(f"⬆️ Отправляю: {artist_name} - {track_title}")
+            await delivery.send_file(
+                context.bot, message.chat.id, filename,
+                caption=f"🎵 {artist_name} - {track_title}",
+                user_id=message.chat.id,
+                fields={'title': track_title, 'performer': artist_name}
+            )
             
             # Удаляем локальный файл
             os.remove(filename)
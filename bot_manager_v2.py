@@ -1146,9 +1146,9 @@ class BotManager(ctk.CTk):
                 }
             }
             
-            # Обновляем модули
-            if 'modules' in self.config:
-                config['modules'] = self.config['modules']
+            # Сохраняем модули и настройки, которые не редактируются в интерфейсе
+            for key, value in self.config.items():
+                config.setdefault(key, value)
             
             # Сохраняем конфигурацию в файл
             with open('config.json', 'w', encoding='utf-8') as f:
@@ -0,0 +1 @@
+"""Общие сервисы, которые используются несколькими модулями бота"""
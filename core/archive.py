@@ -0,0 +1,284 @@
+import asyncio
+import concurrent.futures
+import logging
+import os
+import tarfile
+import threading
+import zipfile
+from typing import Awaitable, Callable, List, NamedTuple, Optional
+
+from core import fs
+from core.bandwidth import get_shaper
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Настройки по умолчанию (секция archive в config.json)
+DEFAULT_FORMAT = 'zip'
+DEFAULT_LEVEL = 6
+
+# Размер блока, передаваемого из потока архивации
+CHUNK_SIZE = 256 * 1024
+
+# Сколько блоков может ждать отправки (ограничивает память и скорость архивации)
+QUEUE_SIZE = 8
+
+# Уже сжатые форматы: в zip кладутся без сжатия, чтобы не тратить CPU впустую
+COMPRESSED_EXTENSIONS = {
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic', '.avif',
+    '.mp4', '.mkv', '.webm', '.avi', '.mov', '.m4v',
+    '.mp3', '.m4a', '.aac', '.ogg', '.opus', '.flac',
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.zst', '.7z', '.rar',
+    '.docx', '.xlsx', '.pptx', '.apk', '.jar',
+}
+
+# Оценка служебных данных zip на один файл (заголовки и центральный каталог)
+ZIP_ENTRY_OVERHEAD = 128
+
+class ArchiveEntry(NamedTuple):
+    path: str
+    arcname: str
+    size: int
+    is_dir: bool
+
+def available_formats() -> List[str]:
+    """Форматы архивов, доступные в этой установке"""
+    return ['zip', 'tar.zst'] if zstandard is not None else ['zip']
+
+def collect_entries(paths: List[str]) -> List[ArchiveEntry]:
+    """Список файлов и папок для архива (блокирующий вызов)"""
+    entries = []
+    for root in paths:
+        root = os.path.abspath(root)
+        base = os.path.dirname(root.rstrip(os.sep)) or root
+        if not os.path.isdir(root):
+            try:
+                entries.append(ArchiveEntry(root, os.path.relpath(root, base), os.path.getsize(root), False))
+            except OSError:
+                pass
+            continue
+        for dir_path, dir_names, file_names in os.walk(root):
+            entries.append(ArchiveEntry(dir_path, os.path.relpath(dir_path, base), 0, True))
+            for name in file_names:
+                path = os.path.join(dir_path, name)
+                try:
+                    if os.path.islink(path) or not os.path.isfile(path):
+                        continue
+                    entries.append(ArchiveEntry(path, os.path.relpath(path, base), os.path.getsize(path), False))
+                except OSError:
+                    continue
+    return entries
+
+class _QueueWriter:
+    """Файлоподобный приемник для потока архивации: блоки уходят в asyncio-очередь"""
+
+    def __init__(self, stream: 'ArchiveStream'):
+        self.stream = stream
+        self.buffer = bytearray()
+
+    def write(self, data) -> int:
+        self.stream._count_output(len(data))
+        self.buffer += data
+        if len(self.buffer) >= CHUNK_SIZE:
+            self._push(bytes(self.buffer))
+            self.buffer.clear()
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close_buffer(self):
+        if self.buffer:
+            self._push(bytes(self.buffer))
+            self.buffer.clear()
+
+    def _push(self, item):
+        future = asyncio.run_coroutine_threadsafe(self.stream._queue.put(item), self.stream._loop)
+        # Ждем места в очереди (обратное давление), проверяя отмену
+        while True:
+            if self.stream._cancelled.is_set():
+                future.cancel()
+                raise InterruptedError('Архивация отменена')
+            try:
+                future.result(timeout=0.5)
+                return
+            except concurrent.futures.TimeoutError:
+                continue
+
+class _CountingReader:
+    """Обертка исходного файла tar для учета прочитанных байт"""
+
+    def __init__(self, f, stream: 'ArchiveStream'):
+        self.f = f
+        self.stream = stream
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.stream.bytes_in += len(data)
+        return data
+
+class ArchiveStream:
+    """
+    Архив папок и файлов, создаваемый на лету без временного файла.
+    Архивация идет в отдельном потоке и пишет в ограниченную очередь,
+    отправка читает из нее блоки через async for. Формат zip (уже сжатые
+    файлы кладутся без сжатия) или tar.zst при установленном zstandard.
+    """
+
+    def __init__(self, paths: List[str], fmt: str = DEFAULT_FORMAT, level: int = DEFAULT_LEVEL,
+                 on_chunk: Optional[Callable[[int], Awaitable]] = None, user_id=None):
+        if fmt not in available_formats():
+            fmt = DEFAULT_FORMAT
+        self.paths = paths
+        self.format = fmt
+        self.level = level
+        self.on_chunk = on_chunk
+        self.user_id = user_id
+        self.entries: List[ArchiveEntry] = []
+        self.total_in = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.skipped = 0
+        # Поток одноразовый: после начала чтения для повтора нужен fresh()
+        self.consumed = False
+        self._queue = None
+        self._loop = None
+        self._cancelled = threading.Event()
+        # Сколько байт текущего файла zip еще не учтено в bytes_in
+        self._entry_left = 0
+
+    @property
+    def filename(self) -> str:
+        if len(self.paths) == 1:
+            name = os.path.basename(os.path.abspath(self.paths[0]).rstrip(os.sep)) or 'archive'
+        else:
+            name = 'files'
+        return f"{name}.{self.format}"
+
+    @property
+    def estimated_size(self) -> int:
+        """Оценка размера архива сверху (для выбора способа отправки)"""
+        return self.total_in + len(self.entries) * ZIP_ENTRY_OVERHEAD + sum(len(e.arcname) for e in self.entries) * 2
+
+    def fresh(self) -> 'ArchiveStream':
+        """Новый поток с теми же файлами и настройками (для повторной отправки)"""
+        stream = ArchiveStream(self.paths, self.format, self.level, self.on_chunk, self.user_id)
+        stream.entries = self.entries
+        stream.total_in = self.total_in
+        return stream
+
+    async def prepare(self):
+        """Сбор списка файлов в пуле потоков"""
+        self.entries = await fs.run(collect_entries, self.paths)
+        self.total_in = sum(e.size for e in self.entries)
+
+    def _count_output(self, nbytes: int):
+        """
+        Прогресс внутри файла zip: zipfile сам читает файл, поэтому прочитанное
+        оценивается по записанному в архив, но не больше размера файла
+        """
+        if self._entry_left:
+            step = min(nbytes, self._entry_left)
+            self._entry_left -= step
+            self.bytes_in += step
+
+    def _write_zip(self, writer: _QueueWriter):
+        compression = zipfile.ZIP_DEFLATED if self.level > 0 else zipfile.ZIP_STORED
+        with zipfile.ZipFile(writer, 'w', compression=compression, compresslevel=self.level or None,
+                             allowZip64=True) as zf:
+            for entry in self.entries:
+                if self._cancelled.is_set():
+                    raise InterruptedError('Архивация отменена')
+                try:
+                    if entry.is_dir:
+                        zf.write(entry.path, entry.arcname, compress_type=zipfile.ZIP_STORED)
+                        continue
+                    stored = os.path.splitext(entry.path)[1].lower() in COMPRESSED_EXTENSIONS
+                    self._entry_left = entry.size
+                    # Размер файла известен zipfile заранее, zip64 для больших файлов включается сам
+                    zf.write(
+                        entry.path, entry.arcname,
+                        compress_type=zipfile.ZIP_STORED if stored else compression,
+                        compresslevel=None if stored else self.level or None
+                    )
+                except InterruptedError:
+                    raise
+                except OSError as e:
+                    logger.warning(f"Файл пропущен при архивации {entry.path}: {e}")
+                    self.skipped += 1
+                finally:
+                    # Сжатый файл занимает в архиве меньше исходного - досчитываем остаток
+                    self.bytes_in += self._entry_left
+                    self._entry_left = 0
+
+    def _write_tar_zst(self, writer: _QueueWriter):
+        compressor = zstandard.ZstdCompressor(level=max(1, self.level), threads=-1)
+        with compressor.stream_writer(writer, closefd=False) as zst:
+            with tarfile.open(fileobj=zst, mode='w|') as tar:
+                for entry in self.entries:
+                    if self._cancelled.is_set():
+                        raise InterruptedError('Архивация отменена')
+                    try:
+                        info = tar.gettarinfo(entry.path, entry.arcname)
+                        if entry.is_dir:
+                            tar.addfile(info)
+                            continue
+                        with open(entry.path, 'rb') as src:
+                            tar.addfile(info, _CountingReader(src, self))
+                    except InterruptedError:
+                        raise
+                    except OSError as e:
+                        logger.warning(f"Файл пропущен при архивации {entry.path}: {e}")
+                        self.skipped += 1
+
+    def _produce(self):
+        writer = _QueueWriter(self)
+        try:
+            if self.format == 'tar.zst':
+                self._write_tar_zst(writer)
+            else:
+                self._write_zip(writer)
+            writer.close_buffer()
+            writer._push(None)
+        except InterruptedError:
+            pass
+        except Exception as e:
+            logger.error(f"Ошибка архивации: {e}")
+            try:
+                writer._push(e)
+            except InterruptedError:
+                pass
+
+    def cancel(self):
+        self._cancelled.set()
+
+    async def __aiter__(self):
+        self.consumed = True
+        if not self.entries:
+            await self.prepare()
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        producer = self._loop.run_in_executor(fs.get_executor(), self._produce)
+        shaper = get_shaper()
+        try:
+            while True:
+                item = await self._queue.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                await shaper.throttle(len(item), 'upload', self.user_id)
+                self.bytes_out += len(item)
+                if self.on_chunk:
+                    await self.on_chunk(len(item))
+                yield item
+        finally:
+            # Получатель остановился (ошибка отправки) - останавливаем поток архивации
+            self.cancel()
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            await producer
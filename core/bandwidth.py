@@ -0,0 +1,186 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = 'config.json'
+
+# Как часто проверять изменение config.json (сек)
+RELOAD_INTERVAL = 5.0
+
+# Настройки по умолчанию (байт/с, 0 - без ограничения)
+DEFAULT_LIMITS = {
+    'total_limit': 0,               # Общий канал для всех передач файлов
+    'download_limit': 0,            # Все скачивания
+    'upload_limit': 0,              # Все отправки
+    'per_user_download_limit': 0,   # Скачивания одного пользователя
+    'per_user_upload_limit': 0,     # Отправки одного пользователя
+    'control_reserve': 64 * 1024,   # Резерв общего канала для запросов к Telegram
+}
+
+# Минимальная скорость, ниже которой резерв не урезает лимит
+MIN_RATE = 16 * 1024
+
+# Через сколько секунд без передач ведро пользователя удаляется (если долг погашен)
+USER_IDLE_TIMEOUT = 60.0
+
+class TokenBucket:
+    """
+    Ведро токенов для ограничения скорости в байтах в секунду.
+    Запрос забирает токены сразу (уходя в долг) и возвращает время ожидания,
+    поэтому крупные блоки не блокируют ведро навсегда.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self._lock = threading.Lock()
+        self.rate = rate
+        self.capacity = burst or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def set_rate(self, rate: float, burst: Optional[float] = None):
+        """Изменение лимита без сброса накопленного долга"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+            self.capacity = burst or rate
+            self.tokens = min(self.tokens, self.capacity)
+
+    def _refill(self, now: float):
+        if self.rate > 0:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def idle(self, now: float, timeout: float) -> bool:
+        """Ведро не использовалось timeout секунд и снова полное - его можно удалить"""
+        with self._lock:
+            if now - self.updated < timeout:
+                return False
+            self._refill(now)
+            return self.rate <= 0 or self.tokens >= self.capacity
+
+    def reserve(self, nbytes: int) -> float:
+        """Забирает nbytes токенов, возвращает сколько секунд нужно подождать"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= nbytes
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+class BandwidthShaper:
+    """Общий, по направлениям и по пользователям лимит скорости передач"""
+
+    def __init__(self, limits: Optional[dict] = None):
+        self.limits = dict(DEFAULT_LIMITS)
+        self.total = TokenBucket(0)
+        self.directions = {'download': TokenBucket(0), 'upload': TokenBucket(0)}
+        self.users = {}
+        # Ведра пользователей создаются и удаляются и из потоков загрузчиков
+        self._users_lock = threading.Lock()
+        self._config_mtime = None
+        self._last_check = 0.0
+        self.apply(limits or {})
+
+    def apply(self, limits: dict):
+        """Применение лимитов (можно менять на лету)"""
+        self.limits = {**DEFAULT_LIMITS, **{k: v for k, v in limits.items() if k in DEFAULT_LIMITS}}
+        total = self.limits['total_limit']
+        if total > 0:
+            total = max(total - self.limits['control_reserve'], MIN_RATE)
+        self.total.set_rate(total)
+        self.directions['download'].set_rate(self.limits['download_limit'])
+        self.directions['upload'].set_rate(self.limits['upload_limit'])
+        with self._users_lock:
+            for (user_id, direction), bucket in self.users.items():
+                bucket.set_rate(self.limits[f'per_user_{direction}_limit'])
+        logger.info(f"Лимиты скорости: {self.limits}")
+
+    def reload_if_changed(self):
+        """Перечитывает секцию bandwidth из config.json, если файл изменился"""
+        now = time.monotonic()
+        if now - self._last_check < RELOAD_INTERVAL:
+            return
+        self._last_check = now
+        self._expire_users(now)
+        try:
+            mtime = os.path.getmtime(CONFIG_PATH)
+            if mtime == self._config_mtime:
+                return
+            self._config_mtime = mtime
+            with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+            self.apply(config.get('bandwidth', {}))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Не удалось перечитать лимиты скорости: {e}")
+
+    def _expire_users(self, now: float):
+        """
+        Удаление ведер неактивных пользователей. Удаляется только полное ведро:
+        новое создается полным, поэтому лимит от этого не меняется
+        """
+        with self._users_lock:
+            idle = [key for key, bucket in self.users.items() if bucket.idle(now, USER_IDLE_TIMEOUT)]
+            for key in idle:
+                del self.users[key]
+
+    def _user_bucket(self, user_id, direction: str) -> TokenBucket:
+        key = (user_id, direction)
+        with self._users_lock:
+            if key not in self.users:
+                self.users[key] = TokenBucket(self.limits[f'per_user_{direction}_limit'])
+            return self.users[key]
+
+    def reserve(self, nbytes: int, direction: str, user_id=None) -> float:
+        """Резервирует полосу во всех подходящих ведрах, возвращает задержку"""
+        self.reload_if_changed()
+        delays = [self.total.reserve(nbytes), self.directions[direction].reserve(nbytes)]
+        if user_id is not None:
+            delays.append(self._user_bucket(user_id, direction).reserve(nbytes))
+        return max(delays)
+
+    async def throttle(self, nbytes: int, direction: str, user_id=None):
+        """Асинхронное ожидание полосы для передачи nbytes"""
+        delay = self.reserve(nbytes, direction, user_id)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def throttle_sync(self, nbytes: int, direction: str, user_id=None):
+        """Блокирующее ожидание полосы (для передач в отдельных потоках)"""
+        delay = self.reserve(nbytes, direction, user_id)
+        if delay > 0:
+            time.sleep(delay)
+
+class ThrottledWriter:
+    """Обертка над файлом, ограничивающая скорость записи (для синхронных загрузчиков)"""
+
+    def __init__(self, f, direction: str = 'download', user_id=None):
+        self._f = f
+        self.direction = direction
+        self.user_id = user_id
+
+    def write(self, data) -> int:
+        get_shaper().throttle_sync(len(data), self.direction, self.user_id)
+        return self._f.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+_shaper = None
+
+def get_shaper() -> BandwidthShaper:
+    """Общий ограничитель скорости для всех модулей"""
+    global _shaper
+    if _shaper is None:
+        _shaper = BandwidthShaper()
+        _shaper.reload_if_changed()
+    return _shaper
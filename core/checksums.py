@@ -0,0 +1,84 @@
+import hashlib
+import re
+from typing import BinaryIO, Dict, Iterable, Optional, Tuple
+
+from core import fs
+
+# Поддерживаемые алгоритмы и длина их hex-дайджеста
+ALGORITHMS = {'sha256': 64, 'md5': 32}
+
+# Сколько байт накапливать перед записью на диск и подсчетом хеша в пуле
+WRITE_BATCH = 1024 * 1024
+
+class StreamingHasher:
+    """Инкрементальный подсчет нескольких хешей по мере поступления данных"""
+
+    def __init__(self, algorithms: Iterable[str] = ('sha256',)):
+        self._hashers = {name: hashlib.new(name) for name in algorithms}
+
+    def update(self, chunk: bytes):
+        for hasher in self._hashers.values():
+            hasher.update(chunk)
+
+    def hexdigests(self) -> Dict[str, str]:
+        return {name: hasher.hexdigest() for name, hasher in self._hashers.items()}
+
+class HashingWriter:
+    """
+    Запись потока в файл с попутным подсчетом хешей. Запись и хеширование -
+    блокирующие операции, поэтому они идут в общем пуле файловых операций
+    пакетами по WRITE_BATCH байт, а не на каждый блок из сети.
+    """
+
+    def __init__(self, f: BinaryIO, hasher: StreamingHasher, batch_size: int = WRITE_BATCH):
+        self.f = f
+        self.hasher = hasher
+        self.batch_size = batch_size
+        self._buffer = []
+        self._buffered = 0
+
+    def _write(self, data: bytes):
+        self.f.write(data)
+        self.hasher.update(data)
+
+    async def write(self, chunk: bytes):
+        self._buffer.append(chunk)
+        self._buffered += len(chunk)
+        if self._buffered >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        """Запись накопленного (обязательно после последнего блока)"""
+        if not self._buffer:
+            return
+        data = b''.join(self._buffer)
+        self._buffer = []
+        self._buffered = 0
+        await fs.run(self._write, data)
+
+def parse_expected_hash(value: str, algorithm: Optional[str] = None) -> Tuple[str, str]:
+    """
+    Разбор ожидаемого хеша. Алгоритм берется из аргумента или из префикса
+    вида sha256:<hex>, иначе определяется по длине.
+    """
+    if ':' in value and algorithm is None:
+        algorithm, value = value.split(':', 1)
+    value = value.strip().lower()
+    if not re.fullmatch(r'[0-9a-f]+', value):
+        raise ValueError("Хеш должен состоять из шестнадцатеричных символов")
+    if algorithm is None:
+        algorithm = next((name for name, length in ALGORITHMS.items() if length == len(value)), None)
+    algorithm = (algorithm or '').lower()
+    if algorithm not in ALGORITHMS:
+        raise ValueError("Поддерживаются только SHA-256 и MD5")
+    if len(value) != ALGORITHMS[algorithm]:
+        raise ValueError(f"Неверная длина хеша {algorithm.upper()}")
+    return algorithm, value
+
+def file_hexdigest(path: str, algorithm: str, chunk_size: int = 1024 * 1024) -> str:
+    """Хеш уже сохраненного файла"""
+    hasher = hashlib.new(algorithm)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
@@ -0,0 +1,230 @@
+import asyncio
+import logging
+import mmap
+import os
+import re
+import time
+from typing import List, NamedTuple, Optional, Tuple
+
+from core import fs
+
+logger = logging.getLogger(__name__)
+
+# Файлы больше этого размера не просматриваются
+MAX_FILE_SIZE = 100 * 1024 * 1024
+
+# Ограничения количества совпадений
+MAX_MATCHES_PER_FILE = 20
+MAX_RESULTS = 500
+
+# Сколько байт в начале файла проверять на признаки двоичного файла
+BINARY_SNIFF_SIZE = 8192
+
+# Длина строки совпадения в результатах
+MAX_LINE_LENGTH = 200
+
+# Файлы отправляются в процесс пачками, чтобы не платить за передачу каждого
+BATCH_FILES = 64
+BATCH_BYTES = 64 * 1024 * 1024
+
+class LineMatch(NamedTuple):
+    path: str
+    line_number: int
+    line: str
+
+def _search_file(path: str, regex, max_size: int, max_matches: int) -> Tuple[List[LineMatch], bool]:
+    """
+    Поиск в одном файле через mmap. Возвращает совпадения и признак,
+    что файл был просмотрен (False - пропущен как двоичный или недоступный).
+    """
+    try:
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0 or size > max_size:
+                return [], False
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if mm.find(b'\0', 0, BINARY_SNIFF_SIZE) != -1:
+                    return [], False
+                matches = []
+                line_number = 1
+                counted = 0
+                position = 0
+                while len(matches) < max_matches:
+                    found = regex.search(mm, position)
+                    if found is None:
+                        break
+                    start = mm.rfind(b'\n', 0, found.start()) + 1
+                    end = mm.find(b'\n', found.end())
+                    if end == -1:
+                        end = size
+                    line_number += mm[counted:start].count(b'\n')
+                    counted = start
+                    line = mm[start:min(end, start + MAX_LINE_LENGTH * 4)].decode('utf-8', errors='replace')
+                    matches.append(LineMatch(path, line_number, line.strip()[:MAX_LINE_LENGTH]))
+                    # Следующее совпадение ищем со следующей строки
+                    position = end + 1
+                return matches, True
+    except (OSError, ValueError):
+        return [], False
+
+def build_pattern(text: str, ignore_case: bool) -> bytes:
+    """
+    Регулярное выражение для поиска text в файлах UTF-8. re.IGNORECASE для bytes
+    не учитывает регистр только у ASCII, поэтому для каждой буквы перечисляются
+    ее варианты в UTF-8: «Ошибка» находит и «ошибка», и «ОШИБКА»
+    """
+    if not ignore_case:
+        return re.escape(text.encode('utf-8'))
+    parts = []
+    for char in text:
+        variants = sorted({char, char.lower(), char.upper()})
+        if len(variants) == 1:
+            parts.append(re.escape(char.encode('utf-8')))
+        else:
+            parts.append(b'(?:' + b'|'.join(re.escape(variant.encode('utf-8')) for variant in variants) + b')')
+    return b''.join(parts)
+
+def search_batch(paths: List[str], pattern: bytes, max_size: int,
+                 max_matches: int) -> Tuple[List[LineMatch], int, int, int]:
+    """
+    Поиск в пачке файлов (выполняется в процессе пула). Возвращает совпадения,
+    количество просмотренных файлов, их объем и число пропущенных (двоичных).
+    """
+    regex = re.compile(pattern)
+    results = []
+    scanned = 0
+    scanned_bytes = 0
+    for path in paths:
+        matches, searched = _search_file(path, regex, max_size, max_matches)
+        if searched:
+            scanned += 1
+            try:
+                scanned_bytes += os.path.getsize(path)
+            except OSError:
+                pass
+        results.extend(matches)
+    return results, scanned, scanned_bytes, len(paths) - scanned
+
+def _walk_batches(root: str, max_size: int, batches: list, state: 'ContentSearch') -> int:
+    """
+    Обход дерева (в потоке): файлы собираются в пачки по количеству и объему.
+    Возвращает количество пропущенных файлов (пустых и слишком больших)
+    """
+    batch, batch_bytes = [], 0
+    skipped = 0
+    stack = [root]
+    while stack and not state.cancelled:
+        path = stack.pop()
+        try:
+            with os.scandir(path) as it:
+                for item in it:
+                    try:
+                        if item.is_dir(follow_symlinks=False):
+                            stack.append(item.path)
+                            continue
+                        if not item.is_file(follow_symlinks=False):
+                            continue
+                        size = item.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        continue
+                    if size == 0 or size > max_size:
+                        skipped += 1
+                        continue
+                    batch.append(item.path)
+                    batch_bytes += size
+                    if len(batch) >= BATCH_FILES or batch_bytes >= BATCH_BYTES:
+                        batches.append(batch)
+                        batch, batch_bytes = [], 0
+        except OSError:
+            continue
+    if batch:
+        batches.append(batch)
+    return skipped
+
+class ContentSearch:
+    """
+    Поиск текста в файлах папки. Обход дерева идет в потоке, файлы
+    пачками просматриваются в пуле процессов; результаты накапливаются
+    по мере готовности, поиск можно отменить.
+    """
+
+    def __init__(self, root: str, text: str, ignore_case: bool = True,
+                 max_size: int = MAX_FILE_SIZE, max_results: int = MAX_RESULTS):
+        self.root = root
+        self.text = text
+        self.ignore_case = ignore_case
+        self.max_size = max_size
+        self.max_results = max_results
+        self.results: List[LineMatch] = []
+        self.files_scanned = 0
+        self.bytes_scanned = 0
+        self.skipped = 0
+        self.truncated = False
+        self.cancelled = False
+        self.done = False
+        # Текст ошибки, если поиск прерван
+        self.error: Optional[str] = None
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def cancel(self):
+        self.cancelled = True
+
+    async def run(self, on_progress=None):
+        """Выполняет поиск; on_progress(search) вызывается после каждой пачки"""
+        loop = asyncio.get_running_loop()
+        pattern = build_pattern(self.text, self.ignore_case)
+        batches = []
+        walker = loop.run_in_executor(fs.get_executor(), _walk_batches, self.root, self.max_size, batches, self)
+        pending = set()
+        limit = fs.PROCESS_WORKERS * 2
+        try:
+            while True:
+                # Пачки отправляются по мере обхода, в работе не больше limit
+                while batches and len(pending) < limit and not self.cancelled:
+                    pending.add(asyncio.ensure_future(fs.run_in_process(
+                        search_batch, batches.pop(0), pattern, self.max_size, MAX_MATCHES_PER_FILE
+                    )))
+                if self.cancelled or (walker.done() and not batches and not pending):
+                    break
+                wait_for = pending | ({walker} if not walker.done() else set())
+                if not wait_for:
+                    continue
+                done, _ = await asyncio.wait(wait_for, timeout=0.5, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    if future is walker:
+                        continue
+                    pending.discard(future)
+                    try:
+                        matches, scanned, scanned_bytes, skipped = future.result()
+                    except Exception as e:
+                        # Пачка не просмотрена: поиск прерывается, а не показывает неполный результат
+                        logger.error(f"Ошибка поиска в файлах: {e}")
+                        self.error = str(e)
+                        self.cancel()
+                        continue
+                    self.files_scanned += scanned
+                    self.bytes_scanned += scanned_bytes
+                    self.skipped += skipped
+                    room = self.max_results - len(self.results)
+                    if len(matches) > room:
+                        self.truncated = True
+                        self.cancel()
+                    self.results.extend(matches[:room])
+                if done and on_progress:
+                    await on_progress(self)
+        finally:
+            # Незапущенные пачки отменяются, уже выполняющиеся дорабатывают в фоне
+            for future in pending:
+                future.cancel()
+            self.cancelled = self.cancelled or not walker.done()
+            if walker.done():
+                # Счетчики меняются только в цикле событий, не из потока обхода
+                try:
+                    self.skipped += walker.result()
+                except Exception as e:
+                    logger.error(f"Ошибка обхода папки при поиске: {e}")
+            self.done = True
@@ -0,0 +1,242 @@
+import logging
+import mimetypes
+import os
+import re
+import shutil
+import uuid
+from pathlib import Path
+from typing import AsyncIterable, Awaitable, Callable, Optional
+
+import aiohttp
+from telegram.error import BadRequest, TelegramError
+
+from core import fs
+from core.bandwidth import get_shaper
+from core.progress import CountingStream
+from core.streams import CHUNK_SIZE, iter_file
+
+logger = logging.getLogger(__name__)
+
+# Лимит Telegram на отправку фото
+MAX_PHOTO_SIZE = 10 * 1024 * 1024
+
+# Лимит Bot API на скачивание файлов ботом (без локального сервера)
+MAX_RECEIVE_SIZE = 20 * 1024 * 1024
+
+# Таймауты запросов к Bot API: отправка большого файла с ограничением скорости
+# может идти часами, поэтому общего лимита нет - только на соединение и на
+# ожидание ответа (после загрузки сервер Telegram еще обрабатывает файл)
+API_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=300)
+
+# Символы, недопустимые в именах файлов (с учетом Windows)
+UNSAFE_NAME_CHARS = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+
+# Сигнатуры файлов: (смещение, байты, MIME-тип)
+SIGNATURES = [
+    (0, b'\xff\xd8\xff', 'image/jpeg'),
+    (0, b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (0, b'GIF87a', 'image/gif'),
+    (0, b'GIF89a', 'image/gif'),
+    (8, b'WEBP', 'image/webp'),
+    (0, b'\x1a\x45\xdf\xa3', 'video/x-matroska'),
+    (0, b'ID3', 'audio/mpeg'),
+    (0, b'\xff\xfb', 'audio/mpeg'),
+    (0, b'\xff\xf3', 'audio/mpeg'),
+    (0, b'OggS', 'audio/ogg'),
+    (0, b'fLaC', 'audio/flac'),
+    (8, b'WAVE', 'audio/wav'),
+    (0, b'%PDF', 'application/pdf'),
+    (0, b'PK\x03\x04', 'application/zip'),
+]
+
+# Контейнеры ISO BMFF (MP4, MOV, HEIC...) различаются основным брендом ftyp
+FTYP_BRANDS = {
+    b'isom': 'video/mp4', b'iso2': 'video/mp4', b'mp41': 'video/mp4', b'mp42': 'video/mp4',
+    b'avc1': 'video/mp4', b'dash': 'video/mp4', b'M4V ': 'video/mp4',
+    b'M4A ': 'audio/mp4', b'M4B ': 'audio/mp4',
+    b'qt  ': 'video/quicktime',
+    b'3gp4': 'video/3gpp', b'3gp5': 'video/3gpp', b'3gp6': 'video/3gpp', b'3g2a': 'video/3gpp2',
+    b'heic': 'image/heic', b'heix': 'image/heic', b'hevc': 'image/heic', b'mif1': 'image/heic',
+    b'msf1': 'image/heic', b'avif': 'image/avif', b'avis': 'image/avif',
+}
+
+# Способ отправки: (метод Bot API, имя поля с файлом)
+SEND_METHODS = {
+    'photo': ('sendPhoto', 'photo'),
+    'video': ('sendVideo', 'video'),
+    'audio': ('sendAudio', 'audio'),
+    'document': ('sendDocument', 'document'),
+}
+
+def sniff_mime(path: str) -> str:
+    """Определение MIME-типа по сигнатуре файла, затем по расширению"""
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(32)
+    except OSError:
+        header = b''
+    for offset, magic, mime in SIGNATURES:
+        if header[offset:offset + len(magic)] == magic:
+            return mime
+    if header[4:8] == b'ftyp' and header[8:12] in FTYP_BRANDS:
+        return FTYP_BRANDS[header[8:12]]
+    return mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+def media_kind(mime: str, size: int) -> str:
+    """Тип сообщения Telegram для MIME-типа"""
+    if mime in ('image/jpeg', 'image/png', 'image/webp') and size <= MAX_PHOTO_SIZE:
+        return 'photo'
+    if mime == 'video/mp4':
+        return 'video'
+    if mime in ('audio/mpeg', 'audio/mp4'):
+        return 'audio'
+    return 'document'
+
+def _file_stream(path: str, on_chunk: Optional[Callable[[int], Awaitable]], user_id):
+    """Поток файла для отправки; прогресс считается по фактически переданным блокам"""
+    stream = iter_file(path, user_id=user_id)
+    return CountingStream(stream, on_chunk) if on_chunk else stream
+
+async def send_file(bot, chat_id: int, path: str, caption: Optional[str] = None,
+                    on_chunk: Optional[Callable[[int], Awaitable]] = None,
+                    user_id=None, fields: Optional[dict] = None) -> dict:
+    """
+    Отправка файла в чат подходящим типом сообщения.
+    Файл передается потоком с диска; при локальном Bot API сервере
+    передается только путь к файлу. fields - дополнительные параметры
+    метода Bot API (например, title и performer для аудио).
+    """
+    size = os.path.getsize(path)
+    mime = sniff_mime(path)
+    kind = media_kind(mime, size)
+    if kind == 'document':
+        return await _send_as(bot, 'document', chat_id, path, mime, caption, on_chunk, user_id, fields)
+    try:
+        return await _send_as(bot, kind, chat_id, path, mime, caption, on_chunk, user_id, fields)
+    except BadRequest as e:
+        # Telegram не принял файл как фото или видео (кодек, размеры) - отправляем документом.
+        # Параметры медиа (duration, title...) документу не нужны
+        logger.warning(f"{SEND_METHODS[kind][0]} отклонил {path}: {e}, отправка документом")
+        return await _send_as(bot, 'document', chat_id, path, mime, caption, on_chunk, user_id, None)
+
+async def _send_as(bot, kind: str, chat_id: int, path: str, mime: str, caption: Optional[str],
+                   on_chunk: Optional[Callable[[int], Awaitable]], user_id, fields: Optional[dict]) -> dict:
+    method, field = SEND_METHODS[kind]
+    filename = os.path.basename(path)
+
+    if bot.local_mode:
+        # Локальный сервер читает файл сам по file:// URI
+        sender = getattr(bot, f"send_{kind}")
+        message = await sender(chat_id, Path(path), caption=caption, filename=filename, **(fields or {}))
+        return message.to_dict()
+
+    data = aiohttp.FormData()
+    data.add_field('chat_id', str(chat_id))
+    if caption:
+        data.add_field('caption', caption)
+    for name, value in (fields or {}).items():
+        data.add_field(name, str(value))
+    data.add_field(field, _file_stream(path, on_chunk, user_id), filename=filename, content_type=mime)
+    return await _call_bot_api(bot, method, data)
+
+async def send_stream(bot, chat_id: int, stream: AsyncIterable[bytes], filename: str,
+                      caption: Optional[str] = None, mime: str = 'application/octet-stream',
+                      fields: Optional[dict] = None) -> dict:
+    """
+    Отправка документа из потока байтов, размер которого заранее неизвестен
+    (например, архива, который создается во время отправки).
+    Ограничение скорости и учет прогресса - на стороне потока.
+    """
+    data = aiohttp.FormData()
+    data.add_field('chat_id', str(chat_id))
+    if caption:
+        data.add_field('caption', caption)
+    for name, value in (fields or {}).items():
+        data.add_field(name, str(value))
+    data.add_field('document', stream, filename=filename, content_type=mime)
+    return await _call_bot_api(bot, 'sendDocument', data)
+
+async def _call_bot_api(bot, method: str, data: aiohttp.FormData) -> dict:
+    async with aiohttp.ClientSession(timeout=API_TIMEOUT) as session:
+        async with session.post(f"{bot.base_url}/{method}", data=data) as response:
+            # Ошибки Telegram приходят в JSON, а прокси или nginx перед локальным
+            # сервером (502, 413) отвечают HTML-страницей
+            if response.content_type != 'application/json':
+                raise TelegramError(f"HTTP {response.status}")
+            try:
+                result = await response.json()
+            except ValueError:
+                raise TelegramError(f"HTTP {response.status}") from None
+    if not result.get('ok'):
+        description = result.get('description', 'Неизвестная ошибка Telegram')
+        if result.get('error_code') == 400:
+            raise BadRequest(description)
+        raise TelegramError(description)
+    return result['result']
+
+def safe_filename(name: Optional[str], default: str = 'file') -> str:
+    """Имя файла от пользователя без путей и недопустимых символов"""
+    name = UNSAFE_NAME_CHARS.sub('_', os.path.basename((name or '').replace('\\', '/'))).strip(' .')
+    return name[:200] or default
+
+def _link_or_copy(source: str, target: str) -> int:
+    """Жесткая ссылка на файл локального сервера, копия - если он на другой ФС"""
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+    return os.path.getsize(target)
+
+async def _download(bot, file_path: str, target: str,
+                    on_chunk: Optional[Callable[[int], Awaitable]], user_id) -> int:
+    """Скачивание файла с сервера Bot API блоками прямо на диск"""
+    shaper = get_shaper()
+    received = 0
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=60)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        async with session.get(f"{bot.base_file_url}/{file_path}") as response:
+            response.raise_for_status()
+            with open(target, 'wb') as f:
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    await shaper.throttle(len(chunk), 'download', user_id)
+                    await fs.run(f.write, chunk)
+                    received += len(chunk)
+                    if on_chunk:
+                        await on_chunk(len(chunk))
+    return received
+
+async def receive_file(bot, file_id: str, target: str,
+                       on_chunk: Optional[Callable[[int], Awaitable]] = None,
+                       user_id=None) -> int:
+    """
+    Сохранение файла из Telegram в target, возвращает размер.
+    Файл пишется во временный .part рядом с target и переименовывается
+    после полной загрузки, поэтому недокачанный файл никогда не лежит
+    под настоящим именем. При локальном Bot API сервере file_path - путь
+    на его диске: файл не копируется, а связывается жесткой ссылкой.
+    """
+    data = aiohttp.FormData()
+    data.add_field('file_id', file_id)
+    info = await _call_bot_api(bot, 'getFile', data)
+    file_path = info.get('file_path')
+    if not file_path:
+        raise TelegramError("Telegram не вернул путь к файлу")
+
+    temp_path = f"{target}.{uuid.uuid4().hex[:8]}.part"
+    try:
+        if bot.local_mode and os.path.isabs(file_path):
+            size = await fs.run(_link_or_copy, file_path, temp_path)
+            if on_chunk:
+                await on_chunk(size)
+        else:
+            size = await _download(bot, file_path, temp_path, on_chunk, user_id)
+        if info.get('file_size') and size != info['file_size']:
+            raise TelegramError("Файл получен не полностью")
+        await fs.run(os.replace, temp_path, target)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    return size
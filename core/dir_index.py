@@ -0,0 +1,290 @@
+import asyncio
+import errno
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+from core import fs, inotify
+from core.dir_reader import Entry, scan_entries
+from core.dir_size import DirSizeCache
+
+logger = logging.getLogger(__name__)
+
+# Количество элементов на странице листинга
+PAGE_SIZE = 30
+
+# Сколько папок держать в кэше (и под наблюдением inotify)
+MAX_CACHED_DIRS = 256
+
+# Бюджет памяти кэша листингов и примерная стоимость записи и индекса
+MEMORY_BUDGET = 32 * 1024 * 1024
+ENTRY_OVERHEAD = 200
+INDEX_OVERHEAD = 200
+
+SORT_KEYS = ('name', 'size', 'mtime')
+
+# Размер папки, которую еще не считали: при сортировке по размеру она идет в конце
+UNKNOWN_SIZE = -1
+
+def sort_entries(entries: List[Entry], sort: str) -> List[Entry]:
+    """
+    Сортировка: сначала папки, затем файлы; размер и дата - по убыванию.
+    По размеру папки и файлы идут вперемешку - у папок размер содержимого.
+    """
+    if sort == 'size':
+        key = lambda e: (-e.size, e.name.lower())
+    elif sort == 'mtime':
+        key = lambda e: (not e.is_dir, -e.mtime, e.name.lower())
+    else:
+        key = lambda e: (not e.is_dir, e.name.lower())
+    return sorted(entries, key=key)
+
+class DirectoryIndex:
+    """Отсортированный снимок содержимого папки"""
+
+    def __init__(self, path: str, mtime: int, sort: str, entries: List[Entry], sized_at: float = 0.0):
+        self.path = path
+        self.mtime = mtime
+        self.sort = sort
+        self.entries = entries
+        # Версия подсчитанных размеров папок (для сортировки по размеру)
+        self.sized_at = sized_at
+        self.dirs = sum(1 for e in entries if e.is_dir)
+        self.files = len(entries) - self.dirs
+        self.unsized = sum(1 for e in entries if e.size == UNKNOWN_SIZE)
+
+    @property
+    def pages(self) -> int:
+        return max(1, (len(self.entries) + PAGE_SIZE - 1) // PAGE_SIZE)
+
+    def page(self, number: int) -> List[Entry]:
+        number = min(max(number, 0), self.pages - 1)
+        return self.entries[number * PAGE_SIZE:(number + 1) * PAGE_SIZE]
+
+class _CachedDir:
+    """Снимок папки в кэше и построенные по нему индексы"""
+
+    __slots__ = ('mtime', 'with_stat', 'entries', 'indexes', 'nbytes', 'generation')
+
+    def __init__(self, mtime: int, with_stat: bool, entries: List[Entry], generation: int):
+        self.mtime = mtime
+        self.with_stat = with_stat
+        self.entries = entries
+        self.indexes = {}
+        self.generation = generation
+        self.nbytes = sum(ENTRY_OVERHEAD + len(e.name) + len(e.path) for e in entries)
+
+    def add_index(self, index: DirectoryIndex):
+        if index.sort not in self.indexes:
+            self.nbytes += INDEX_OVERHEAD + 8 * len(index.entries)
+        self.indexes[index.sort] = index
+
+class DirectoryIndexCache:
+    """
+    Кэш отсортированных листингов в пределах бюджета памяти.
+    Кэшированные папки наблюдаются через inotify: пока событий не было,
+    листинг отдается из памяти без обращения к диску, любое изменение
+    (в том числе размера файла внутри папки, которое mtime папки не меняет)
+    сбрасывает ровно эту папку. Без inotify или при исчерпании лимита
+    наблюдений актуальность проверяется по mtime папки.
+    """
+
+    def __init__(self, max_dirs: int = MAX_CACHED_DIRS, memory_budget: int = MEMORY_BUDGET,
+                 use_inotify: bool = True, dir_sizes: Optional[DirSizeCache] = None):
+        self.max_dirs = max_dirs
+        self.memory_budget = memory_budget
+        # Для сортировки по размеру у папок берется размер содержимого
+        self.dir_sizes = dir_sizes
+        self._lock = threading.Lock()
+        # path -> _CachedDir, порядок - LRU
+        self._dirs = OrderedDict()
+        self._nbytes = 0
+        # Наблюдения inotify: path -> wd и wd -> {path} (одна папка может быть доступна по разным путям)
+        self._watches = {}
+        self._watch_paths = {}
+        # Счетчик изменений папки, растет с каждым событием inotify
+        self._generations = {}
+        self._inotify = None
+        self._inotify_enabled = use_inotify and inotify.available()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # --- inotify ---
+
+    def _start_inotify(self) -> bool:
+        """Лениво создает дескриптор inotify и поток чтения событий"""
+        if self._inotify is None and self._inotify_enabled:
+            self._inotify = inotify.create()
+            if self._inotify is None:
+                self._inotify_enabled = False
+                return False
+            threading.Thread(target=self._read_events, name='dir-index-inotify', daemon=True).start()
+        return self._inotify is not None
+
+    def _read_events(self):
+        while self._inotify is not None and self._inotify.fd >= 0:
+            try:
+                events = list(self._inotify.read_events())
+            except OSError as e:
+                logger.error(f"Ошибка чтения событий inotify: {e}")
+                return
+            with self._lock:
+                for event in events:
+                    self._handle_event(event)
+
+    def _handle_event(self, event: inotify.Event):
+        if event.mask & inotify.IN_Q_OVERFLOW:
+            # Очередь ядра переполнена - часть событий потеряна, сбрасываем все
+            for path in self._generations:
+                self._generations[path] += 1
+            return
+        paths = self._watch_paths.get(event.wd, ())
+        for path in paths:
+            self._generations[path] = self._generations.get(path, 0) + 1
+            if event.mask & (inotify.IN_DELETE_SELF | inotify.IN_MOVE_SELF):
+                self._drop(path)
+        if event.mask & inotify.IN_IGNORED:
+            # Ядро само сняло наблюдение - дальше проверка по mtime
+            for path in self._watch_paths.pop(event.wd, ()):
+                self._watches.pop(path, None)
+
+    def _watch(self, path: str):
+        """Ставит наблюдение на папку (под блокировкой)"""
+        if path in self._watches or not self._start_inotify():
+            return
+        try:
+            wd = self._inotify.add_watch(path, inotify.DIR_CHANGES | inotify.IN_ONLYDIR)
+        except OSError as e:
+            if e.errno == errno.ENOSPC:
+                logger.warning("Достигнут лимит наблюдений inotify, для новых папок проверка по mtime")
+            return
+        self._watches[path] = wd
+        self._watch_paths.setdefault(wd, set()).add(path)
+
+    def _unwatch(self, path: str):
+        wd = self._watches.pop(path, None)
+        if wd is None:
+            return
+        paths = self._watch_paths.get(wd)
+        if paths is not None:
+            paths.discard(path)
+            if not paths:
+                del self._watch_paths[wd]
+                self._inotify.rm_watch(wd)
+
+    # --- кэш ---
+
+    def _drop(self, path: str):
+        cached = self._dirs.pop(path, None)
+        if cached is not None:
+            self._nbytes -= cached.nbytes
+
+    def _evict(self):
+        """Вытесняет самые давние папки сверх лимита количества и памяти"""
+        while self._dirs and (len(self._dirs) > self.max_dirs or
+                              (self._nbytes > self.memory_budget and len(self._dirs) > 1)):
+            path, cached = self._dirs.popitem(last=False)
+            self._nbytes -= cached.nbytes
+            self._unwatch(path)
+            self._generations.pop(path, None)
+            self.evictions += 1
+
+    def _fresh(self, path: str, cached: Optional[_CachedDir], mtime: Optional[int]) -> bool:
+        if cached is None:
+            return False
+        if path in self._watches:
+            return cached.generation == self._generations.get(path, 0)
+        return mtime is not None and cached.mtime == mtime
+
+    def _build(self, path: str, mtime: int, sort: str, entries: List[Entry], sized_at: float) -> DirectoryIndex:
+        if sort == 'size' and self.dir_sizes is not None:
+            # Только уже подсчитанные размеры: обход поддеревьев - по кнопке «Размер папки»
+            totals = self.dir_sizes.child_totals(path, [e.name for e in entries if e.is_dir])
+            entries = [e._replace(size=totals.get(e.path, UNKNOWN_SIZE)) if e.is_dir else e for e in entries]
+        return DirectoryIndex(path, mtime, sort, sort_entries(entries, sort), sized_at)
+
+    def get(self, path: str, sort: str = 'name') -> DirectoryIndex:
+        """Отсортированный индекс папки (блокирующий вызов)"""
+        if sort not in SORT_KEYS:
+            sort = 'name'
+        # Для сортировки по имени размер и дата не нужны - stat не вызывается
+        need_stat = sort != 'name'
+        sized_at = self.dir_sizes.updated if sort == 'size' and self.dir_sizes is not None else 0.0
+        mtime = None
+        with self._lock:
+            watched = path in self._watches
+        if not watched:
+            mtime = os.stat(path).st_mtime_ns
+        with self._lock:
+            cached = self._dirs.get(path)
+            if self._fresh(path, cached, mtime):
+                self._dirs.move_to_end(path)
+                index = cached.indexes.get(sort)
+                if index is not None and index.sized_at == sized_at:
+                    self.hits += 1
+                    return index
+                if cached.with_stat or not need_stat:
+                    self.hits += 1
+                    index = self._build(path, cached.mtime, sort, cached.entries, sized_at)
+                    self._nbytes -= cached.nbytes
+                    cached.add_index(index)
+                    self._nbytes += cached.nbytes
+                    self._evict()
+                    return index
+            self.misses += 1
+            # Наблюдение ставится до чтения, чтобы изменения во время чтения не потерялись
+            self._watch(path)
+            generation = self._generations.setdefault(path, 0)
+        try:
+            if mtime is None:
+                mtime = os.stat(path).st_mtime_ns
+            entries = scan_entries(path, need_stat)
+        except Exception:
+            with self._lock:
+                # Папка не прочитана: наблюдение снимается, если ее нет и в кэше
+                if path not in self._dirs:
+                    self._unwatch(path)
+                    self._generations.pop(path, None)
+            raise
+        index = self._build(path, mtime, sort, entries, sized_at)
+        cached = _CachedDir(mtime, need_stat, entries, generation)
+        cached.add_index(index)
+        with self._lock:
+            self._drop(path)
+            self._dirs[path] = cached
+            self._nbytes += cached.nbytes
+            self._evict()
+        return index
+
+    async def get_async(self, path: str, sort: str = 'name', executor=None) -> DirectoryIndex:
+        """Отсортированный индекс папки, построенный в пуле потоков"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor or fs.get_executor(), self.get, path, sort)
+
+    def invalidate(self, path: Optional[str] = None):
+        """Сброс кэша папки (или всего кэша)"""
+        with self._lock:
+            if path is None:
+                self._dirs.clear()
+                self._nbytes = 0
+                for generation_path in self._generations:
+                    self._generations[generation_path] += 1
+                return
+            self._drop(path)
+
+    def stats(self) -> dict:
+        """Статистика кэша листингов"""
+        with self._lock:
+            return {
+                'dirs': len(self._dirs),
+                'memory': self._nbytes,
+                'budget': self.memory_budget,
+                'watches': len(self._watches),
+                'inotify': self._inotify is not None or self._inotify_enabled,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
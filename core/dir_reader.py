@@ -0,0 +1,135 @@
+import asyncio
+import os
+from typing import AsyncIterator, Iterator, List, NamedTuple
+
+from core import fs
+
+# Сколько записей передавать из потока чтения за раз
+BATCH_SIZE = 512
+
+class Entry(NamedTuple):
+    name: str
+    path: str
+    is_dir: bool
+    size: int
+    mtime: float
+
+def read_batches(path: str, with_stat: bool = True, batch_size: int = BATCH_SIZE) -> Iterator[List[Entry]]:
+    """
+    Однопроходное чтение папки через os.scandir.
+    Тип записи берется из кэша DirEntry (d_type), stat вызывается только если
+    нужны размер и дата (на Windows они тоже уже есть в DirEntry).
+    """
+    batch = []
+    with os.scandir(path) as it:
+        for item in it:
+            try:
+                is_dir = item.is_dir()
+                if with_stat:
+                    stats = item.stat()
+                    entry = Entry(item.name, item.path, is_dir, 0 if is_dir else stats.st_size, stats.st_mtime)
+                else:
+                    entry = Entry(item.name, item.path, is_dir, 0, 0)
+            except OSError:
+                # Битая ссылка или нет прав - показываем как файл без размера
+                entry = Entry(item.name, item.path, False, 0, 0)
+            batch.append(entry)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+def scan_entries(path: str, with_stat: bool = True) -> List[Entry]:
+    """Все записи папки одним списком (блокирующий вызов)"""
+    entries = []
+    for batch in read_batches(path, with_stat):
+        entries.extend(batch)
+    return entries
+
+async def iter_directory(path: str, with_stat: bool = True, executor=None) -> AsyncIterator[List[Entry]]:
+    """
+    Асинхронный поток пачек записей папки. Чтение идет одной задачей
+    в пуле потоков, пачки передаются в цикл событий по мере готовности.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    done = object()
+
+    def worker():
+        try:
+            for batch in read_batches(path, with_stat):
+                loop.call_soon_threadsafe(queue.put_nowait, batch)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        loop.call_soon_threadsafe(queue.put_nowait, done)
+
+    future = loop.run_in_executor(executor or fs.get_executor(), worker)
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        await future
+
+if __name__ == '__main__':
+    # Сравнение с прежними способами чтения: python -m core.dir_reader [количество файлов]
+    import sys
+    import tempfile
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    pool = ThreadPoolExecutor(max_workers=4)
+
+    def listdir_isdir(path):
+        """Как в file_manager_linux: os.listdir и os.path.isdir на каждую запись"""
+        dirs, files = [], []
+        for item in os.listdir(path):
+            (dirs if os.path.isdir(os.path.join(path, item)) else files).append(item)
+        return dirs, files
+
+    async def sync_listdir_isdir(path):
+        return listdir_isdir(path)
+
+    async def gather_isdir(path):
+        """Как в file_manager_windows: отдельная задача пула на каждую запись"""
+        loop = asyncio.get_running_loop()
+        items = await loop.run_in_executor(pool, os.listdir, path)
+        dirs, files = [], []
+
+        async def process(item):
+            if await loop.run_in_executor(pool, os.path.isdir, os.path.join(path, item)):
+                dirs.append(item)
+            else:
+                files.append(item)
+
+        await asyncio.gather(*(process(item) for item in items))
+        return dirs, files
+
+    async def streamed(path, with_stat):
+        return [entry async for batch in iter_directory(path, with_stat, pool) for entry in batch]
+
+    async def main():
+        with tempfile.TemporaryDirectory() as path:
+            for i in range(count):
+                if i % 10 == 0:
+                    os.mkdir(os.path.join(path, f"dir_{i}"))
+                else:
+                    open(os.path.join(path, f"file_{i}.txt"), 'w').close()
+            print(f"Записей в папке: {count}")
+            for title, run in [
+                ("listdir + isdir", lambda: sync_listdir_isdir(path)),
+                ("listdir + gather(isdir)", lambda: gather_isdir(path)),
+                ("scandir (только тип)", lambda: streamed(path, False)),
+                ("scandir (тип и stat)", lambda: streamed(path, True)),
+            ]:
+                start = time.perf_counter()
+                await run()
+                print(f"{title:28} {time.perf_counter() - start:8.3f} сек")
+
+    asyncio.run(main())
@@ -0,0 +1,168 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from core import fs
+
+# Сколько секунд подсчитанный размер считается актуальным без повторной проверки
+FRESH_FOR = 30
+
+# Сколько папок держать в кэше
+MAX_CACHED_DIRS = 200000
+
+class _DirRecord:
+    """Содержимое одной папки: размер собственных файлов и список подпапок"""
+
+    __slots__ = ('mtime', 'own_bytes', 'own_files', 'subdirs', 'total', 'files', 'checked')
+
+    def __init__(self, mtime: int, own_bytes: int, own_files: int, subdirs: List[str]):
+        self.mtime = mtime
+        self.own_bytes = own_bytes
+        self.own_files = own_files
+        self.subdirs = subdirs
+        self.total = own_bytes
+        self.files = own_files
+        self.checked = 0.0
+
+class DirSizeCache:
+    """
+    Рекурсивные размеры папок (как du --apparent-size -x).
+    Для каждой папки кэшируются размер ее собственных файлов и подпапки,
+    ключ актуальности - mtime папки. Повторный подсчет обходит дерево
+    уровнями параллельно в общем пуле файловых операций, но перечитывает
+    только папки с изменившимся mtime, остальным достаточно одного stat;
+    итоги родителей пересчитываются снизу вверх из кэшированных частей.
+    Изменение размера файла без изменения состава папки mtime не меняет
+    и учитывается только после перечитывания папки.
+    """
+
+    def __init__(self, fresh_for: float = FRESH_FOR, max_dirs: int = MAX_CACHED_DIRS):
+        self.fresh_for = fresh_for
+        self.max_dirs = max_dirs
+        self._records = OrderedDict()
+        self._lock = threading.Lock()
+        # Идущие подсчеты: путь -> задача
+        self._running: Dict[str, asyncio.Future] = {}
+        # Время последнего подсчета: по нему листинги понимают, что размеры обновились
+        self.updated = 0.0
+
+    def _scan(self, path: str, device: int) -> Optional[_DirRecord]:
+        """Чтение одной папки (в потоке пула); None - папка недоступна или на другом диске"""
+        try:
+            stats = os.stat(path)
+        except OSError:
+            return None
+        if stats.st_dev != device:
+            return None
+        with self._lock:
+            record = self._records.get(path)
+        if record is not None and record.mtime == stats.st_mtime_ns:
+            return record
+        own_bytes = own_files = 0
+        subdirs = []
+        try:
+            with os.scandir(path) as it:
+                for item in it:
+                    try:
+                        if item.is_dir(follow_symlinks=False):
+                            subdirs.append(item.name)
+                        elif item.is_file(follow_symlinks=False):
+                            own_bytes += item.stat(follow_symlinks=False).st_size
+                            own_files += 1
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+        return _DirRecord(stats.st_mtime_ns, own_bytes, own_files, subdirs)
+
+    def _commit(self, path: str, order: List[str], records: Dict[str, _DirRecord],
+                settled: set, started: float):
+        """Итоги снизу вверх и запись в кэш (в потоке пула)"""
+        # Дети всегда идут в order позже родителя
+        now = time.monotonic()
+        for dir_path in reversed(order):
+            if dir_path in settled:
+                continue
+            record = records[dir_path]
+            record.total = record.own_bytes
+            record.files = record.own_files
+            for name in record.subdirs:
+                child = records.get(os.path.join(dir_path, name))
+                if child is not None:
+                    record.total += child.total
+                    record.files += child.files
+            record.checked = now
+
+        with self._lock:
+            for dir_path in order:
+                self._records[dir_path] = records[dir_path]
+                self._records.move_to_end(dir_path)
+            while len(self._records) > self.max_dirs:
+                self._records.popitem(last=False)
+            self.updated = now
+
+    async def _compute(self, path: str) -> _DirRecord:
+        with self._lock:
+            record = self._records.get(path)
+        if record is not None and time.monotonic() - record.checked < self.fresh_for:
+            return record
+
+        device = (await fs.stat(path)).st_dev
+        started = time.monotonic()
+        order = []
+        records = {}
+        # Поддеревья, недавно подсчитанные целиком, повторно не обходятся
+        settled = set()
+        level = [path]
+        while level:
+            # Папки одного уровня читаются параллельно в общем пуле файловых операций
+            scanned = await asyncio.gather(*(fs.run(self._scan, p, device) for p in level))
+            next_level = []
+            for dir_path, scanned_record in zip(level, scanned):
+                if scanned_record is None:
+                    continue
+                records[dir_path] = scanned_record
+                order.append(dir_path)
+                if dir_path != path and started - scanned_record.checked < self.fresh_for:
+                    settled.add(dir_path)
+                    continue
+                next_level.extend(os.path.join(dir_path, name) for name in scanned_record.subdirs)
+            level = next_level
+
+        await fs.run(self._commit, path, order, records, settled, started)
+        if path not in records:
+            raise PermissionError(f"Нет доступа к папке: {path}")
+        return records[path]
+
+    async def compute_async(self, path: str) -> _DirRecord:
+        """Подсчет размера папки с учетом кэша, не блокируя цикл событий"""
+        # Одновременный подсчет одного дерева из разных запросов не нужен
+        running = self._running.get(path)
+        if running is None:
+            running = asyncio.ensure_future(self._compute(path))
+            self._running[path] = running
+            running.add_done_callback(lambda _: self._running.pop(path, None))
+        return await asyncio.shield(running)
+
+    def child_totals(self, path: str, names: List[str]) -> Dict[str, int]:
+        """
+        Уже подсчитанные размеры подпапок: путь -> байты. Диск не читается -
+        папки, размер которых еще не считали, в результат не попадают.
+        """
+        totals = {}
+        with self._lock:
+            for name in names:
+                child_path = os.path.join(path, name)
+                child = self._records.get(child_path)
+                if child is not None and child.checked:
+                    totals[child_path] = child.total
+        return totals
+
+    def cached(self, path: str) -> Optional[_DirRecord]:
+        """Последний подсчитанный размер папки без обращения к диску"""
+        with self._lock:
+            record = self._records.get(path)
+        return record if record is not None and record.checked else None
@@ -0,0 +1,384 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+from telegram.error import TelegramError
+
+from core import fs, inotify
+from core.progress import format_size
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = 'config.json'
+
+DEFAULT_WATCH_PATH = 'dir_watches.json'
+
+# Сводка отправляется, когда в папках DEBOUNCE секунд не было событий,
+# но не позже MAX_DELAY секунд после первого события
+DEFAULT_DEBOUNCE = 10
+DEFAULT_MAX_DELAY = 60
+
+# Минимальный интервал между сводками (ограничение частоты сообщений)
+DEFAULT_MIN_INTERVAL = 60
+
+MAX_WATCHES = 50
+
+# Без inotify папки сравниваются с прошлым снимком раз в POLL_INTERVAL секунд;
+# с этим же интервалом повторно ставятся наблюдения за пропавшими папками
+POLL_INTERVAL = 30
+
+# Имен одной папки в сводке, остальные только считаются
+MAX_DIGEST_NAMES = 20
+MAX_MESSAGE_LENGTH = 4096
+
+WATCH_EVENTS = (inotify.IN_CREATE | inotify.IN_MOVED_TO | inotify.IN_CLOSE_WRITE | inotify.IN_DELETE
+                | inotify.IN_MOVED_FROM | inotify.IN_DELETE_SELF | inotify.IN_MOVE_SELF | inotify.IN_ONLYDIR)
+
+KIND_ICONS = {'new': "🆕", 'changed': "✏️", 'deleted': "🗑"}
+
+class WatchLimitError(Exception):
+    """Превышено число наблюдаемых папок"""
+
+class DirWatcher:
+    """
+    Уведомления об изменениях в выбранных папках. За папками следит
+    один дескриптор inotify в цикле событий (без inotify - сравнение
+    снимков папок). События копятся и отправляются получателям одной
+    сводкой, не чаще min_interval секунд. Список папок хранится в файле
+    и восстанавливается после перезапуска.
+    """
+
+    def __init__(self, path: str = DEFAULT_WATCH_PATH, recipients: Optional[List[int]] = None,
+                 debounce: float = DEFAULT_DEBOUNCE, max_delay: float = DEFAULT_MAX_DELAY,
+                 min_interval: float = DEFAULT_MIN_INTERVAL):
+        self.path = path
+        self.recipients = recipients or []
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.min_interval = min_interval
+        # папка -> {'added_by': ID пользователя, 'added': время}
+        self.watches: Dict[str, dict] = {}
+        self._wds: Dict[str, int] = {}
+        self._paths: Dict[int, str] = {}
+        self._snapshots: Dict[str, dict] = {}
+        # папка -> {имя: 'new' | 'changed' | 'deleted'}; заметки - о самой папке
+        self._pending: Dict[str, Dict[str, str]] = {}
+        self._notes: Dict[str, str] = {}
+        self._first_event = 0.0
+        self._last_event = 0.0
+        self._last_sent = 0.0
+        self._wake = None
+        self._inotify = None
+        self._started = False
+        self.sent = 0
+
+    @classmethod
+    def from_config(cls, config: dict) -> 'DirWatcher':
+        """Создание по секции dir_watch из config.json"""
+        settings = config.get('dir_watch', {})
+        recipients = []
+        for user_id in settings.get('recipients') or config.get('allowed_users', []):
+            try:
+                recipients.append(int(user_id))
+            except (TypeError, ValueError):
+                continue
+        return cls(
+            settings.get('path', DEFAULT_WATCH_PATH),
+            recipients,
+            settings.get('debounce', DEFAULT_DEBOUNCE),
+            settings.get('max_delay', DEFAULT_MAX_DELAY),
+            settings.get('min_interval', DEFAULT_MIN_INTERVAL),
+        )
+
+    def watched(self, path: str) -> bool:
+        return os.path.abspath(path) in self.watches
+
+    def active(self, path: str) -> bool:
+        """Наблюдение действует (папка существует и наблюдение поставлено)"""
+        path = os.path.abspath(path)
+        return path in self._wds or (self._inotify is None and path in self._snapshots)
+
+    # --- список папок ---
+
+    def load(self):
+        """Загрузка списка папок (блокирующий вызов)"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.watches = json.load(f).get('watches', {})
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Не удалось загрузить список наблюдаемых папок: {e}")
+
+    def save(self, watches: dict):
+        """Атомарное сохранение списка папок (блокирующий вызов)"""
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'watches': watches}, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Не удалось сохранить список наблюдаемых папок: {e}")
+
+    async def add(self, path: str, user_id=None):
+        """Добавление папки; OSError - папки нет, WatchLimitError - превышен лимит"""
+        path = os.path.abspath(path)
+        if path in self.watches:
+            return
+        if len(self.watches) >= MAX_WATCHES:
+            raise WatchLimitError(f"Можно наблюдать не больше {MAX_WATCHES} папок")
+        if not await fs.isdir(path):
+            raise OSError(f"Папка не найдена: {path}")
+        self.watches[path] = {'added_by': user_id, 'added': time.time()}
+        if self._started:
+            await self._activate(path)
+        await fs.run(self.save, dict(self.watches))
+
+    async def remove(self, path: str) -> bool:
+        path = os.path.abspath(path)
+        if self.watches.pop(path, None) is None:
+            return False
+        self._deactivate(path)
+        self._pending.pop(path, None)
+        self._notes.pop(path, None)
+        await fs.run(self.save, dict(self.watches))
+        return True
+
+    # --- наблюдения ---
+
+    async def _activate(self, path: str) -> bool:
+        """Постановка наблюдения; False - папка сейчас недоступна"""
+        if self._inotify is not None:
+            try:
+                wd = await fs.run(self._inotify.add_watch, path, WATCH_EVENTS)
+            except OSError as e:
+                # Пропавшая папка проверяется каждые POLL_INTERVAL секунд - без предупреждений в лог
+                logger.debug(f"Не удалось наблюдать за {path}: {e}")
+                return False
+            self._wds[path] = wd
+            self._paths[wd] = path
+            return True
+        try:
+            self._snapshots[path] = await fs.run(_snapshot, path)
+        except OSError as e:
+            logger.debug(f"Не удалось наблюдать за {path}: {e}")
+            return False
+        return True
+
+    def _deactivate(self, path: str):
+        self._snapshots.pop(path, None)
+        wd = self._wds.pop(path, None)
+        if wd is not None:
+            self._paths.pop(wd, None)
+            self._inotify.rm_watch(wd)
+
+    def _record(self, path: str, name: str, kind: str):
+        pending = self._pending.setdefault(path, {})
+        previous = pending.get(name)
+        if kind == 'deleted' and previous == 'new':
+            # Файл появился и исчез до сводки (например, временный .part)
+            del pending[name]
+        elif kind == 'changed' and previous in ('new', 'changed'):
+            pass
+        else:
+            pending[name] = kind
+        self._touch()
+
+    def _note(self, path: str, text: str):
+        self._notes[path] = text
+        self._touch()
+
+    def _touch(self):
+        now = time.monotonic()
+        if not self._first_event:
+            self._first_event = now
+        self._last_event = now
+        self._wake.set()
+
+    def _on_events(self):
+        for event in self._inotify.read_events():
+            if event.mask & inotify.IN_Q_OVERFLOW:
+                for path in self._wds:
+                    self._note(path, "⚠️ слишком много событий, часть пропущена")
+                continue
+            path = self._paths.get(event.wd)
+            if path is None:
+                continue
+            if event.mask & (inotify.IN_DELETE_SELF | inotify.IN_MOVE_SELF | inotify.IN_IGNORED):
+                # Наблюдение будет поставлено заново, когда папка появится
+                self._paths.pop(event.wd, None)
+                if event.mask & inotify.IN_MOVE_SELF:
+                    # Перемещенная папка остается под наблюдением ядра - снимаем его
+                    self._inotify.rm_watch(event.wd)
+                if self._wds.get(path) == event.wd:
+                    del self._wds[path]
+                    self._note(path, "⚠️ папка удалена или перемещена, наблюдение возобновится при ее появлении")
+                continue
+            name = event.name + ('/' if event.mask & inotify.IN_ISDIR else '')
+            if event.mask & (inotify.IN_CREATE | inotify.IN_MOVED_TO):
+                self._record(path, name, 'new')
+            elif event.mask & (inotify.IN_DELETE | inotify.IN_MOVED_FROM):
+                self._record(path, name, 'deleted')
+            elif event.mask & inotify.IN_CLOSE_WRITE:
+                self._record(path, name, 'changed')
+
+    async def _poll(self):
+        """Возобновление пропавших наблюдений, без inotify - сравнение снимков папок"""
+        while True:
+            await asyncio.sleep(POLL_INTERVAL)
+            for path in list(self.watches):
+                if self._inotify is not None:
+                    if path not in self._wds and await self._activate(path):
+                        self._note(path, "✅ папка снова доступна, наблюдение возобновлено")
+                    continue
+                previous = self._snapshots.get(path)
+                try:
+                    current = await fs.run(_snapshot, path)
+                except OSError:
+                    if previous is not None:
+                        del self._snapshots[path]
+                        self._note(path, "⚠️ папка недоступна, наблюдение возобновится при ее появлении")
+                    continue
+                self._snapshots[path] = current
+                if previous is None:
+                    continue
+                for name, record in current.items():
+                    if name not in previous:
+                        self._record(path, name, 'new')
+                    elif previous[name] != record:
+                        self._record(path, name, 'changed')
+                for name in previous.keys() - current.keys():
+                    self._record(path, name, 'deleted')
+
+    # --- сводки ---
+
+    def _flush_delay(self) -> float:
+        """Через сколько секунд можно отправлять сводку"""
+        now = time.monotonic()
+        ready = min(self._last_event + self.debounce, self._first_event + self.max_delay)
+        return max(ready, self._last_sent + self.min_interval) - now
+
+    def render(self, pending: Dict[str, Dict[str, str]], notes: Dict[str, str], sizes: Dict[str, int]) -> str:
+        lines = ["🔔 Изменения в папках"]
+        for path in sorted(pending.keys() | notes.keys()):
+            if not pending.get(path) and path not in notes:
+                continue
+            lines.append(f"\n📂 {path}")
+            if path in notes:
+                lines.append(notes[path])
+            events = pending.get(path, {})
+            counts = {kind: sum(1 for value in events.values() if value == kind) for kind in KIND_ICONS}
+            summary = ", ".join(f"{KIND_ICONS[kind]} {count}" for kind, count in counts.items() if count)
+            if summary:
+                lines.append(f"Итого: {summary}")
+            for name, kind in sorted(events.items())[:MAX_DIGEST_NAMES]:
+                size = sizes.get(os.path.join(path, name))
+                lines.append(f"{KIND_ICONS[kind]} {name}" + (f" ({format_size(size)})" if size is not None else ""))
+            if len(events) > MAX_DIGEST_NAMES:
+                lines.append(f"... и еще {len(events) - MAX_DIGEST_NAMES}")
+        text = "\n".join(lines)
+        if len(text) > MAX_MESSAGE_LENGTH:
+            text = text[:MAX_MESSAGE_LENGTH - 2] + "\n…"
+        return text
+
+    async def _flush(self, bot):
+        pending, notes = self._pending, self._notes
+        self._pending, self._notes = {}, {}
+        self._first_event = 0.0
+        # Пустая сводка бывает, если файл появился и исчез до отправки
+        if not any(pending.values()) and not notes:
+            return
+        new_files = [
+            os.path.join(path, name)
+            for path, events in pending.items()
+            for name, kind in sorted(events.items())[:MAX_DIGEST_NAMES]
+            if kind != 'deleted' and not name.endswith('/')
+        ]
+        text = self.render(pending, notes, await fs.run(_sizes, new_files))
+        self._last_sent = time.monotonic()
+        for chat_id in self.recipients:
+            try:
+                await bot.send_message(chat_id, text)
+                self.sent += 1
+            except TelegramError as e:
+                logger.warning(f"Не удалось отправить сводку изменений {chat_id}: {e}")
+
+    async def run(self, bot):
+        """Восстановление наблюдений и отправка сводок (до остановки бота)"""
+        self._wake = asyncio.Event()
+        await fs.run(self.load)
+        self._inotify = inotify.create(nonblocking=True)
+        if self._inotify is not None:
+            asyncio.get_running_loop().add_reader(self._inotify.fileno(), self._on_events)
+        self._started = True
+        for path in list(self.watches):
+            if not await self._activate(path):
+                self._note(path, "⚠️ папка недоступна, наблюдение возобновится при ее появлении")
+        poller = asyncio.get_running_loop().create_task(self._poll())
+        try:
+            while True:
+                await self._wake.wait()
+                delay = self._flush_delay()
+                if delay > 0:
+                    # Новые события продлевают ожидание, поэтому после сна проверяем снова
+                    await asyncio.sleep(delay)
+                    continue
+                self._wake.clear()
+                try:
+                    await self._flush(bot)
+                except Exception as e:
+                    logger.error(f"Ошибка отправки сводки изменений: {e}")
+        finally:
+            poller.cancel()
+            if self._inotify is not None:
+                asyncio.get_running_loop().remove_reader(self._inotify.fileno())
+                self._inotify.close()
+
+    def stats(self) -> dict:
+        return {
+            'watches': len(self.watches),
+            'active': sum(1 for path in self.watches if self.active(path)),
+            'inotify': self._inotify is not None,
+            'sent': self.sent,
+        }
+
+def _snapshot(path: str) -> Dict[str, tuple]:
+    """Имена записей папки с размером и временем изменения (без inotify)"""
+    result = {}
+    with os.scandir(path) as it:
+        for item in it:
+            try:
+                is_dir = item.is_dir(follow_symlinks=False)
+                stats = item.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            result[item.name + ('/' if is_dir else '')] = (stats.st_size, stats.st_mtime_ns) if not is_dir else ()
+    return result
+
+def _sizes(paths: List[str]) -> Dict[str, int]:
+    result = {}
+    for path in paths:
+        try:
+            result[path] = os.stat(path).st_size
+        except OSError:
+            continue
+    return result
+
+_watcher = None
+
+def get_dir_watcher(config: Optional[dict] = None) -> DirWatcher:
+    """Общий наблюдатель папок (при первом вызове создается по config или config.json)"""
+    global _watcher
+    if _watcher is None and config is not None:
+        _watcher = DirWatcher.from_config(config)
+    elif _watcher is None:
+        try:
+            with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
+                _watcher = DirWatcher.from_config(json.load(f))
+        except Exception as e:
+            logger.error(f"Не удалось прочитать настройки наблюдения за папками: {e}")
+            _watcher = DirWatcher()
+    return _watcher
@@ -0,0 +1,169 @@
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from typing import Optional
+
+from core.checksums import file_hexdigest
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = '.download_index.json'
+OBJECTS_DIRNAME = '.objects'
+PART_SUFFIX = '.part'
+
+# Кэши по корневым папкам загрузок
+_caches = {}
+
+def get_download_cache(root: str) -> 'DownloadCache':
+    """Возвращает кэш загрузок для папки (один экземпляр на папку)"""
+    key = os.path.abspath(root)
+    if key not in _caches:
+        _caches[key] = DownloadCache(root)
+    return _caches[key]
+
+class DownloadCache:
+    """
+    Индекс загрузок по URL с валидаторами (ETag, Last-Modified) и
+    контентно-адресуемым хранилищем: каждое содержимое хранится один раз
+    в .objects/<sha256[:2]>/<sha256>, а пользовательские имена файлов -
+    это жесткие ссылки на объект.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.index_path = os.path.join(root, INDEX_FILENAME)
+        self.objects_dir = os.path.join(root, OBJECTS_DIRNAME)
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self.entries = self._load()
+
+    def _load(self) -> dict:
+        """Загрузка индекса с диска"""
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            # Объекты могли быть удалены очисткой хранилища
+            return {
+                url: entry for url, entry in entries.items()
+                if os.path.exists(self.object_path(entry['sha256']))
+            }
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.error(f"Не удалось прочитать индекс загрузок {self.index_path}: {e}")
+            return {}
+
+    def save(self):
+        """Атомарное сохранение индекса"""
+        tmp_path = f"{self.index_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+        except Exception as e:
+            logger.error(f"Не удалось сохранить индекс загрузок: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def object_path(self, sha256: str) -> str:
+        """Путь к объекту в контентно-адресуемом хранилище"""
+        return os.path.join(self.objects_dir, sha256[:2], sha256)
+
+    def get(self, url: str) -> Optional[dict]:
+        """Запись индекса для URL, если объект еще существует на диске"""
+        entry = self.entries.get(url)
+        if entry and os.path.exists(self.object_path(entry['sha256'])):
+            return entry
+        return None
+
+    def conditional_headers(self, url: str) -> dict:
+        """Заголовки условного запроса для URL из индекса"""
+        entry = self.get(url)
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def new_part_path(self) -> str:
+        """Временный файл для скачивания (в той же ФС, что и хранилище)"""
+        return os.path.join(self.objects_dir, f"{uuid.uuid4().hex}{PART_SUFFIX}")
+
+    def store_object(self, part_path: str, sha256: str) -> str:
+        """Переносит скачанный файл в хранилище, дубликаты не сохраняются"""
+        path = self.object_path(sha256)
+        if os.path.exists(path):
+            os.remove(part_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(part_path, path)
+        return path
+
+    def link(self, sha256: str, filename: str) -> str:
+        """
+        Создает жесткую ссылку на объект под пользовательским именем.
+        Существующие файлы с другим содержимым не перезаписываются.
+        """
+        object_path = self.object_path(sha256)
+        name, ext = os.path.splitext(filename)
+        target = os.path.join(self.root, filename)
+        counter = 1
+        while os.path.exists(target):
+            if os.path.samefile(target, object_path):
+                return target
+            target = os.path.join(self.root, f"{name} ({counter}){ext}")
+            counter += 1
+        try:
+            os.link(object_path, target)
+        except OSError:
+            # ФС без поддержки жестких ссылок
+            shutil.copyfile(object_path, target)
+        return target
+
+    def record(self, url: str, sha256: str, size: int, filename: str,
+               etag: Optional[str] = None, last_modified: Optional[str] = None,
+               digests: Optional[dict] = None) -> dict:
+        """Добавляет или обновляет запись индекса для URL (digests - дополнительные хеши)"""
+        now = time.time()
+        entry = self.entries.get(url, {'created': now, 'files': []})
+        entry.update({
+            'url': url,
+            'etag': etag,
+            'last_modified': last_modified,
+            'size': size,
+            'sha256': sha256,
+            'last_used': now
+        })
+        if digests:
+            entry.update(digests)
+        if filename not in entry['files']:
+            entry['files'].append(filename)
+        self.entries[url] = entry
+        self.save()
+        return entry
+
+    def digest(self, entry: dict, algorithm: str) -> str:
+        """Хеш объекта записи; недостающие хеши считаются один раз и сохраняются"""
+        if not entry.get(algorithm):
+            entry[algorithm] = file_hexdigest(self.object_path(entry['sha256']), algorithm)
+            self.save()
+        return entry[algorithm]
+
+    def forget(self, url: str):
+        """Удаляет запись URL из индекса (объект остается, его удалит очистка хранилища)"""
+        if self.entries.pop(url, None) is not None:
+            self.save()
+
+    def touch(self, url: str, filename: Optional[str] = None):
+        """Отмечает повторное использование записи"""
+        entry = self.entries.get(url)
+        if not entry:
+            return
+        entry['last_used'] = time.time()
+        if filename and filename not in entry['files']:
+            entry['files'].append(filename)
+        self.save()
@@ -0,0 +1,426 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import mmap
+import os
+import secrets
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from core import fs
+from core.file_index import DEFAULT_EXCLUDE
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = 'config.json'
+
+# Сколько байт начала и конца файла хешируется на втором этапе
+PARTIAL_SIZE = 64 * 1024
+
+# Файлы до 2 * PARTIAL_SIZE хешируются целиком уже на втором этапе
+SMALL_FILE_SIZE = 2 * PARTIAL_SIZE
+
+# Размер куска mmap при полном хешировании
+HASH_CHUNK = 16 * 1024 * 1024
+
+# Файлы меньше min_size не сравниваются (по умолчанию пропускаются только пустые)
+DEFAULT_MIN_SIZE = 1
+DEFAULT_CACHE_PATH = 'duplicate_hashes.json.gz'
+
+# Записей в кэше хешей, самые старые вытесняются
+MAX_CACHE_ENTRIES = 500000
+
+# Файлы отправляются в процесс пачками, чтобы не платить за передачу каждого
+BATCH_FILES = 64
+BATCH_BYTES = 256 * 1024 * 1024
+
+STAGES = {
+    'walk': "📂 Обход папок",
+    'partial': "🔍 Хеш начала и конца файлов",
+    'full': "🔐 Полный хеш",
+}
+
+def hash_file(path: str, size: int, partial: bool) -> Optional[str]:
+    """
+    Хеш файла через mmap: при partial - первые и последние PARTIAL_SIZE байт,
+    иначе весь файл. None, если файл недоступен или изменил размер.
+    """
+    try:
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size != size:
+                return None
+            # blake2b быстрее sha256 и достаточно надежен для сравнения содержимого
+            hasher = hashlib.blake2b(digest_size=20)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if partial and size > SMALL_FILE_SIZE:
+                    hasher.update(mm[:PARTIAL_SIZE])
+                    hasher.update(mm[-PARTIAL_SIZE:])
+                else:
+                    if hasattr(mmap, 'MADV_SEQUENTIAL'):
+                        mm.madvise(mmap.MADV_SEQUENTIAL)
+                    view = memoryview(mm)
+                    try:
+                        for offset in range(0, size, HASH_CHUNK):
+                            hasher.update(view[offset:offset + HASH_CHUNK])
+                    finally:
+                        view.release()
+        return hasher.hexdigest()
+    except (OSError, ValueError):
+        return None
+
+def hash_batch(items: List[Tuple[str, int]], partial: bool) -> List[Optional[str]]:
+    """Хеши пачки файлов (выполняется в процессе пула)"""
+    return [hash_file(path, size, partial) for path, size in items]
+
+class FileInfo(NamedTuple):
+    path: str
+    size: int
+    mtime_ns: int
+    dev: int
+    ino: int
+
+    @property
+    def key(self) -> str:
+        """Ключ кэша хешей: тот же inode с тем же mtime - то же содержимое"""
+        return f"{self.dev}:{self.ino}:{self.mtime_ns}:{self.size}"
+
+class HashCache:
+    """
+    Кэш хешей файлов по (устройство, inode, mtime, размер): переименованный
+    или перемещенный в пределах диска файл повторно не читается.
+    Хранится на диске (gzip JSON), при переполнении вытесняются самые старые записи.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = MAX_CACHE_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        # key -> [хеш начала и конца, полный хеш]
+        self.entries: 'OrderedDict[str, list]' = OrderedDict()
+        self.loaded = False
+        self.changed = False
+
+    def load(self):
+        """Загрузка кэша с диска (блокирующий вызов)"""
+        self.loaded = True
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                self.entries = OrderedDict(json.load(f))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Не удалось загрузить кэш хешей: {e}")
+
+    def get(self, info: FileInfo, partial: bool) -> Optional[str]:
+        record = self.entries.get(info.key)
+        if record is None:
+            return None
+        # Маленький файл хешируется целиком уже на втором этапе
+        return record[0] if partial or info.size <= SMALL_FILE_SIZE else record[1]
+
+    def put(self, info: FileInfo, partial: bool, digest: str):
+        record = self.entries.setdefault(info.key, [None, None])
+        self.entries.move_to_end(info.key)
+        record[0 if partial or info.size <= SMALL_FILE_SIZE else 1] = digest
+        self.changed = True
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def snapshot(self) -> Optional[list]:
+        """Копия записей для сохранения в потоке, None - сохранять нечего"""
+        if not self.changed:
+            return None
+        self.changed = False
+        return list(self.entries.items())
+
+    def save(self, entries: Optional[list]):
+        """Атомарное сохранение снимка на диск (блокирующий вызов)"""
+        if entries is None:
+            return
+        tmp_path = self.path + '.tmp'
+        try:
+            with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=1) as f:
+                json.dump(entries, f, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Не удалось сохранить кэш хешей: {e}")
+
+class DuplicateGroup:
+    """Одинаковые файлы; первым идет самый старый - он остается при удалении и связывании"""
+
+    def __init__(self, digest: str, files: List[FileInfo]):
+        self.digest = digest
+        self.files = sorted(files, key=lambda info: (info.mtime_ns, info.path))
+        self.size = files[0].size
+        # 'delete' или 'link' после обработки
+        self.resolved: Optional[str] = None
+
+    @property
+    def keeper(self) -> FileInfo:
+        return self.files[0]
+
+    @property
+    def wasted(self) -> int:
+        return self.size * (len(self.files) - 1)
+
+    def resolve(self, action: str) -> Tuple[int, List[str]]:
+        """
+        Удаление копий (action='delete') или замена их жесткими ссылками
+        на первый файл (action='link'), блокирующий вызов. Файлы, изменившиеся
+        после поиска, пропускаются. Возвращает число обработанных и ошибки.
+        """
+        keeper = self.keeper
+        try:
+            stats = os.stat(keeper.path)
+        except OSError as e:
+            return 0, [f"{keeper.path}: {e.strerror}"]
+        if (stats.st_size, stats.st_mtime_ns) != (keeper.size, keeper.mtime_ns):
+            return 0, [f"{keeper.path}: файл изменился после поиска"]
+        done, errors = 0, []
+        for info in self.files[1:]:
+            try:
+                current = os.stat(info.path, follow_symlinks=False)
+                if (current.st_size, current.st_mtime_ns) != (info.size, info.mtime_ns):
+                    errors.append(f"{info.path}: файл изменился после поиска")
+                    continue
+                if action == 'delete':
+                    os.remove(info.path)
+                elif current.st_dev != stats.st_dev:
+                    errors.append(f"{info.path}: другой диск, жесткая ссылка невозможна")
+                    continue
+                else:
+                    # Ссылка создается рядом и атомарно заменяет копию
+                    temp_path = f"{info.path}.{secrets.token_hex(4)}.link"
+                    os.link(keeper.path, temp_path)
+                    try:
+                        os.replace(temp_path, info.path)
+                    except OSError:
+                        os.remove(temp_path)
+                        raise
+                done += 1
+            except OSError as e:
+                errors.append(f"{info.path}: {e.strerror or e}")
+        self.resolved = action
+        return done, errors
+
+def _walk(root: str, min_size: int, exclude: set, state: 'DuplicateSearch') -> Dict[int, List[FileInfo]]:
+    """Обход дерева (в потоке): файлы группируются по размеру"""
+    by_size: Dict[int, List[FileInfo]] = {}
+    stack = [root]
+    while stack and not state.cancelled:
+        path = stack.pop()
+        if path in exclude:
+            continue
+        try:
+            with os.scandir(path) as it:
+                for item in it:
+                    try:
+                        if item.is_dir(follow_symlinks=False):
+                            stack.append(item.path)
+                            continue
+                        if not item.is_file(follow_symlinks=False):
+                            continue
+                        stats = item.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    if stats.st_size < min_size:
+                        continue
+                    state.files_scanned += 1
+                    by_size.setdefault(stats.st_size, []).append(FileInfo(
+                        item.path, stats.st_size, stats.st_mtime_ns, stats.st_dev, stats.st_ino
+                    ))
+        except OSError:
+            continue
+    return by_size
+
+def _distinct_inodes(groups: List[List[FileInfo]], state: 'DuplicateSearch') -> List[List[FileInfo]]:
+    """
+    Жесткие ссылки на один inode - уже не дубликаты, из них остается одна.
+    На Windows DirEntry.stat не заполняет inode, он берется из os.stat (в потоке).
+    """
+    result = []
+    for group in groups:
+        seen = set()
+        files = []
+        for info in group:
+            if info.ino == 0:
+                try:
+                    stats = os.stat(info.path)
+                except OSError:
+                    continue
+                info = info._replace(dev=stats.st_dev, ino=stats.st_ino)
+            if (info.dev, info.ino) in seen:
+                state.linked += 1
+                continue
+            seen.add((info.dev, info.ino))
+            files.append(info)
+        if len(files) > 1:
+            result.append(files)
+    return result
+
+class DuplicateSearch:
+    """
+    Поиск одинаковых файлов в папке в три этапа: группировка по размеру,
+    хеш первых и последних 64 КБ, полный хеш. Каждый этап сравнивает только
+    совпавшие на предыдущем, хеширование идет в пуле процессов через mmap,
+    хеши кэшируются по inode и mtime. Поиск можно отменить.
+    """
+
+    def __init__(self, root: str, cache: HashCache, min_size: int = DEFAULT_MIN_SIZE):
+        self.root = root
+        self.cache = cache
+        self.min_size = max(1, min_size)
+        self.stage = 'walk'
+        self.files_scanned = 0
+        self.candidates = 0
+        self.linked = 0
+        self.files_hashed = 0
+        self.bytes_hashed = 0
+        self.cache_hits = 0
+        self.groups: List[DuplicateGroup] = []
+        self.cancelled = False
+        self.done = False
+        # Текст ошибки, если поиск прерван: результаты в этом случае неполные
+        self.error: Optional[str] = None
+        self.started = time.monotonic()
+        self.finished: Optional[float] = None
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def wasted(self) -> int:
+        return sum(group.wasted for group in self.groups if not group.resolved)
+
+    def cancel(self):
+        self.cancelled = True
+
+    async def _refine(self, groups: List[List[FileInfo]], partial: bool, on_progress) -> List[Tuple[str, List[FileInfo]]]:
+        """Разбиение групп по хешу; остаются подгруппы из двух и более файлов"""
+        digests: Dict[FileInfo, str] = {}
+        missing = []
+        for group in groups:
+            for info in group:
+                digest = self.cache.get(info, partial)
+                if digest is None:
+                    missing.append(info)
+                else:
+                    digests[info] = digest
+                    self.cache_hits += 1
+
+        # Пачки по количеству файлов и объему чтения
+        batches, batch, batch_bytes = [], [], 0
+        for info in missing:
+            batch.append(info)
+            batch_bytes += min(info.size, SMALL_FILE_SIZE) if partial else info.size
+            if len(batch) >= BATCH_FILES or batch_bytes >= BATCH_BYTES:
+                batches.append(batch)
+                batch, batch_bytes = [], 0
+        if batch:
+            batches.append(batch)
+
+        limit = fs.PROCESS_WORKERS * 2
+        pending: Dict[asyncio.Future, List[FileInfo]] = {}
+        queue = iter(batches)
+        try:
+            while True:
+                # В работе не больше limit пачек, чтобы отмена срабатывала быстро
+                while len(pending) < limit and not self.cancelled:
+                    batch = next(queue, None)
+                    if batch is None:
+                        break
+                    future = asyncio.ensure_future(fs.run_in_process(
+                        hash_batch, [(info.path, info.size) for info in batch], partial
+                    ))
+                    pending[future] = batch
+                if not pending:
+                    break
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    batch = pending.pop(future)
+                    try:
+                        results = future.result()
+                    except Exception as e:
+                        # Без результатов пачки группы неполные: поиск прерывается, а не
+                        # показывает «дубликатов нет»
+                        raise RuntimeError(f"Ошибка хеширования файлов: {e}") from e
+                    for info, digest in zip(batch, results):
+                        if digest is None:
+                            continue
+                        digests[info] = digest
+                        self.cache.put(info, partial, digest)
+                        self.files_hashed += 1
+                        self.bytes_hashed += min(info.size, SMALL_FILE_SIZE) if partial else info.size
+                if on_progress:
+                    await on_progress(self)
+        finally:
+            # Незапущенные пачки отменяются, уже выполняющиеся дорабатывают в фоне
+            for future in pending:
+                future.cancel()
+
+        refined = []
+        for group in groups:
+            by_digest: Dict[str, List[FileInfo]] = {}
+            for info in group:
+                if info in digests:
+                    by_digest.setdefault(digests[info], []).append(info)
+            refined.extend((digest, files) for digest, files in by_digest.items() if len(files) > 1)
+        return refined
+
+    async def run(self, on_progress=None):
+        """Выполняет поиск; on_progress(search) вызывается по мере хеширования"""
+        try:
+            if not self.cache.loaded:
+                await fs.run(self.cache.load)
+            by_size = await fs.run(_walk, self.root, self.min_size, set(DEFAULT_EXCLUDE), self)
+            candidates = await fs.run(
+                _distinct_inodes, [group for group in by_size.values() if len(group) > 1], self
+            )
+            self.candidates = sum(len(group) for group in candidates)
+            if self.cancelled:
+                return
+            if on_progress:
+                await on_progress(self)
+
+            self.stage = 'partial'
+            partial = await self._refine(candidates, True, on_progress)
+            if self.cancelled:
+                return
+            # Маленькие файлы уже сравнены целиком
+            confirmed = [item for item in partial if item[1][0].size <= SMALL_FILE_SIZE]
+            large = [files for _, files in partial if files[0].size > SMALL_FILE_SIZE]
+
+            self.stage = 'full'
+            confirmed.extend(await self._refine(large, False, on_progress))
+            if self.cancelled:
+                return
+            self.groups = sorted(
+                (DuplicateGroup(digest, files) for digest, files in confirmed),
+                key=lambda group: group.wasted, reverse=True
+            )
+        except Exception as e:
+            self.error = str(e)
+            raise
+        finally:
+            self.done = True
+            self.finished = time.monotonic()
+            await fs.run(self.cache.save, self.cache.snapshot())
+
+_cache = None
+
+def get_hash_cache(config: Optional[dict] = None) -> HashCache:
+    """Общий кэш хешей (при первом вызове создается по config или config.json)"""
+    global _cache
+    if _cache is None:
+        if config is None:
+            try:
+                with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
+                    config = json.load(f)
+            except Exception as e:
+                logger.error(f"Не удалось прочитать настройки поиска дубликатов: {e}")
+                config = {}
+        _cache = HashCache(config.get('duplicates', {}).get('cache_path', DEFAULT_CACHE_PATH))
+    return _cache
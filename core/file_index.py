@@ -0,0 +1,302 @@
+import asyncio
+import fnmatch
+import gzip
+import json
+import logging
+import os
+import re
+import time
+from array import array
+from bisect import bisect_right
+from typing import List, NamedTuple, Optional, Tuple
+
+from core import fs
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = 'config.json'
+
+# Настройки по умолчанию (секция file_index в config.json).
+# Индекс держится в памяти (около 200 байт на файл), поэтому по умолчанию
+# индексируется только домашняя папка, а не весь диск
+DEFAULT_ROOTS = ['~']
+DEFAULT_EXCLUDE = ['/proc', '/sys', '/dev', '/run']
+
+# Файловые системы, которые не обходятся, если смонтированы внутри корневой
+# папки индекса: виртуальные (их содержимое - не файлы) и сетевые (медленно
+# и нагружает сервер). Указанная явно корневая папка индексируется всегда
+DEFAULT_SKIP_FS = [
+    'proc', 'sysfs', 'devtmpfs', 'devpts', 'cgroup', 'cgroup2', 'securityfs', 'debugfs',
+    'tracefs', 'pstore', 'bpf', 'configfs', 'fusectl', 'mqueue', 'hugetlbfs', 'autofs',
+    'binfmt_misc', 'efivarfs', 'rpc_pipefs', 'nsfs',
+    'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', '9p', 'ceph', 'glusterfs', 'davfs', 'afs',
+    'fuse.sshfs', 'fuse.rclone', 'fuse.s3fs', 'fuse.gvfsd-fuse', 'fuse.davfs2',
+]
+MOUNTS_PATH = '/proc/self/mounts'
+DEFAULT_INTERVAL = 3600
+DEFAULT_INDEX_PATH = 'file_index.json.gz'
+
+# Больше этого количества совпадений не собираем
+MAX_RESULTS = 1000
+
+GLOB_CHARS = re.compile(r'\[[^\]]*\]|[*?]')
+
+class Match(NamedTuple):
+    path: str
+    is_dir: bool
+
+class _Snapshot:
+    """
+    Поисковая структура: имена всех записей в нижнем регистре, склеенные
+    в одну строку через '\\n', и массивы смещений строк и родительских папок.
+    Подстрока ищется str.find по всей склейке (быстрый поиск в C),
+    позиция совпадения переводится в номер записи двоичным поиском.
+    """
+
+    def __init__(self, dirs: dict):
+        self.dir_paths = []
+        names = []
+        self.parents = array('I')
+        self.kinds = bytearray()
+        for dir_id, (path, (_, files, subdirs)) in enumerate(dirs.items()):
+            self.dir_paths.append(path)
+            for kind, group in ((1, subdirs), (0, files)):
+                names.extend(group)
+                self.parents.extend([dir_id] * len(group))
+                self.kinds.extend([kind] * len(group))
+        self.names = '\n'.join(names) + '\n'
+        self.lower = self.names.lower()
+        # Смещения начала каждой строки; у lower() длина может отличаться, поэтому свои смещения
+        self.offsets = self._line_offsets(self.names)
+        self.lower_offsets = self.offsets if len(self.lower) == len(self.names) else self._line_offsets(self.lower)
+        self.count = len(names)
+
+    @staticmethod
+    def _line_offsets(text: str) -> array:
+        offsets = array('q', [0])
+        position = text.find('\n')
+        while position != -1 and position + 1 < len(text):
+            offsets.append(position + 1)
+            position = text.find('\n', position + 1)
+        return offsets
+
+    def entry(self, entry_id: int) -> Match:
+        start = self.offsets[entry_id]
+        name = self.names[start:self.names.index('\n', start)]
+        path = os.path.join(self.dir_paths[self.parents[entry_id]], name)
+        return Match(path, bool(self.kinds[entry_id]))
+
+    def _lower_name(self, entry_id: int) -> str:
+        start = self.lower_offsets[entry_id]
+        return self.lower[start:self.lower.index('\n', start)]
+
+    def _find(self, literal: str):
+        """Номера записей, в имени которых есть подстрока (в нижнем регистре)"""
+        position = self.lower.find(literal)
+        while position != -1:
+            entry_id = bisect_right(self.lower_offsets, position) - 1
+            yield entry_id
+            # Следующий поиск - со следующей строки, чтобы не дублировать запись
+            if entry_id + 1 >= self.count:
+                return
+            position = self.lower.find(literal, self.lower_offsets[entry_id + 1])
+
+    def search(self, pattern: str, limit: int = MAX_RESULTS) -> Tuple[List[Match], bool]:
+        """
+        Поиск по именам без учета регистра: подстрока или шаблон glob (* ? []).
+        Для шаблона сначала ищется его самая длинная буквальная часть,
+        полное сопоставление выполняется только для найденных кандидатов.
+        Возвращает совпадения и признак, что их было больше limit.
+        """
+        pattern = pattern.lower()
+        if not GLOB_CHARS.search(pattern):
+            candidates, check = self._find(pattern), None
+        else:
+            literal = max(GLOB_CHARS.split(pattern), key=len)
+            check = re.compile(fnmatch.translate(pattern)).match
+            candidates = self._find(literal) if literal else range(self.count)
+        results = []
+        for entry_id in candidates:
+            if check is not None and not check(self._lower_name(entry_id)):
+                continue
+            if len(results) >= limit:
+                return results, True
+            results.append(self.entry(entry_id))
+        return results, False
+
+def _skipped_mounts(skip_fs: set) -> set:
+    """Точки монтирования файловых систем из skip_fs (только Linux, иначе пусто)"""
+    mounts = set()
+    try:
+        with open(MOUNTS_PATH, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 3 and fields[2] in skip_fs:
+                    # Пробелы и спецсимволы в пути записаны восьмеричными кодами (\040)
+                    mounts.add(re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), fields[1]))
+    except OSError:
+        pass
+    return mounts
+
+class FileIndex:
+    """
+    Фоновый индекс имен файлов в заданных корневых папках.
+    Для каждой папки хранится (mtime, файлы, подпапки); при обновлении
+    папка с прежним mtime не перечитывается, достаточно одного stat,
+    поэтому повторный обход большого дерева дешевый. Виртуальные и сетевые
+    файловые системы внутри корневых папок пропускаются. Индекс сохраняется
+    на диск и после перезапуска доступен сразу.
+    """
+
+    def __init__(self, roots: Optional[List[str]] = None, exclude: Optional[List[str]] = None,
+                 interval: int = DEFAULT_INTERVAL, index_path: str = DEFAULT_INDEX_PATH,
+                 skip_fs: Optional[List[str]] = None):
+        self.roots = [os.path.abspath(os.path.expanduser(root)) for root in (roots or DEFAULT_ROOTS)]
+        self.exclude = {os.path.abspath(path) for path in (exclude if exclude is not None else DEFAULT_EXCLUDE)}
+        self.skip_fs = set(skip_fs if skip_fs is not None else DEFAULT_SKIP_FS)
+        self.interval = interval
+        self.index_path = index_path
+        # path -> (mtime_ns, [файлы], [подпапки])
+        self._dirs = {}
+        self._snapshot = None
+        self._task = None
+        self.updated = 0.0
+        self.scanned_dirs = 0
+        self.building = False
+
+    @classmethod
+    def from_config(cls, config: dict) -> 'FileIndex':
+        """Создание по секции file_index из config.json"""
+        settings = config.get('file_index', {})
+        return cls(
+            settings.get('roots', DEFAULT_ROOTS),
+            settings.get('exclude', DEFAULT_EXCLUDE),
+            settings.get('interval', DEFAULT_INTERVAL),
+            settings.get('path', DEFAULT_INDEX_PATH),
+            settings.get('skip_fs', DEFAULT_SKIP_FS),
+        )
+
+    @property
+    def ready(self) -> bool:
+        return self._snapshot is not None
+
+    @property
+    def count(self) -> int:
+        return self._snapshot.count if self._snapshot else 0
+
+    def load(self):
+        """Загрузка сохраненного индекса (блокирующий вызов)"""
+        try:
+            with gzip.open(self.index_path, 'rt', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.error(f"Не удалось загрузить индекс файлов: {e}")
+            return
+        if data.get('roots') != self.roots:
+            # Корневые папки изменились - строим заново
+            return
+        self._dirs = {path: tuple(record) for path, record in data['dirs'].items()}
+        self.updated = data.get('updated', 0.0)
+        self._snapshot = _Snapshot(self._dirs)
+
+    def save(self):
+        """Атомарное сохранение индекса на диск (блокирующий вызов)"""
+        tmp_path = self.index_path + '.tmp'
+        try:
+            with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=1) as f:
+                json.dump({'roots': self.roots, 'updated': self.updated, 'dirs': self._dirs},
+                          f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, self.index_path)
+        except Exception as e:
+            logger.error(f"Не удалось сохранить индекс файлов: {e}")
+
+    def refresh(self) -> int:
+        """
+        Инкрементальный обход корневых папок (блокирующий вызов).
+        Возвращает количество перечитанных папок.
+        """
+        old_dirs = self._dirs
+        dirs = {}
+        rescanned = 0
+        # Список монтирований читается на каждом обходе: сетевые диски подключаются и отключаются
+        skipped = _skipped_mounts(self.skip_fs) - set(self.roots)
+        stack = list(reversed(self.roots))
+        while stack:
+            path = stack.pop()
+            if path in self.exclude or path in skipped or path in dirs:
+                continue
+            try:
+                mtime = os.stat(path).st_mtime_ns
+                record = old_dirs.get(path)
+                if record is None or record[0] != mtime:
+                    files, subdirs = [], []
+                    with os.scandir(path) as it:
+                        for item in it:
+                            try:
+                                is_dir = item.is_dir(follow_symlinks=False)
+                            except OSError:
+                                is_dir = False
+                            (subdirs if is_dir else files).append(item.name)
+                    record = (mtime, files, subdirs)
+                    rescanned += 1
+            except OSError:
+                # Нет прав или папка исчезла во время обхода
+                continue
+            dirs[path] = record
+            self.scanned_dirs = len(dirs)
+            stack.extend(os.path.join(path, name) for name in reversed(record[2]))
+        changed = rescanned or len(dirs) != len(old_dirs)
+        self._dirs = dirs
+        if changed or self._snapshot is None:
+            self._snapshot = _Snapshot(dirs)
+        self.updated = time.time()
+        if changed:
+            self.save()
+        return rescanned
+
+    def search(self, pattern: str, limit: int = MAX_RESULTS) -> Tuple[List[Match], bool]:
+        """Поиск по готовому снимку индекса"""
+        if self._snapshot is None:
+            return [], False
+        return self._snapshot.search(pattern, limit)
+
+    async def run(self):
+        """Загрузка с диска и фоновое обновление каждые interval секунд"""
+        await fs.run(self.load)
+        while True:
+            self.building = True
+            try:
+                started = time.monotonic()
+                rescanned = await fs.run(self.refresh)
+                logger.info(
+                    f"Индекс файлов обновлен: {self.count} записей, перечитано папок: {rescanned}, "
+                    f"{time.monotonic() - started:.1f} сек"
+                )
+            except Exception as e:
+                logger.error(f"Ошибка обновления индекса файлов: {e}")
+            finally:
+                self.building = False
+            await asyncio.sleep(self.interval)
+
+    def ensure_started(self):
+        """Запуск фонового обновления в текущем цикле событий (однократно)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+_index = None
+
+def get_file_index(config: Optional[dict] = None) -> FileIndex:
+    """Общий индекс файлов (при первом вызове создается по config или config.json)"""
+    global _index
+    if _index is None and config is not None:
+        _index = FileIndex.from_config(config)
+    elif _index is None:
+        try:
+            with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
+                _index = FileIndex.from_config(json.load(f))
+        except Exception as e:
+            logger.error(f"Не удалось прочитать настройки индекса файлов: {e}")
+            _index = FileIndex()
+    return _index
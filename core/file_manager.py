@@ -0,0 +1,1207 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
+from telegram.ext import CommandHandler, CallbackQueryHandler, MessageHandler, filters
+
+from core import delivery, file_ops, fs, split
+from core.archive import ArchiveStream
+from core.content_search import ContentSearch
+from core.dir_index import UNKNOWN_SIZE, DirectoryIndexCache
+from core.dir_size import DirSizeCache
+from core.dir_watch import WatchLimitError, get_dir_watcher
+from core.duplicates import STAGES, DuplicateSearch, get_hash_cache
+from core.file_index import get_file_index
+from core.file_ops import FileJob, JobLimitError, get_file_jobs
+from core.path_store import PathStore
+from core.platforms import Platform
+from core.progress import ProgressReporter, ThrottledEditor, format_duration, format_size, format_transfer_stats
+from core.storage import get_storage_manager
+from core.tail import LogTail, TailLimitError, get_tail_watcher
+from core.text_view import BinaryFileError, TextViewCache, render_page
+from core.thumbnails import get_thumbnail_cache, is_image
+from core.uploader import UploadResult, get_uploader
+
+logger = logging.getLogger(__name__)
+
+# Результатов поиска на странице
+FIND_PAGE_SIZE = 20
+
+# Совпадений поиска по содержимому на странице
+GREP_PAGE_SIZE = 10
+
+# Групп дубликатов на странице и путей, показываемых в группе
+DUPS_PAGE_SIZE = 5
+DUPS_PATHS_SHOWN = 5
+
+# Действия с группой дубликатов
+DUPS_ACTIONS = {'link': "🔗 Заменить копии жесткими ссылками", 'delete': "🗑 Удалить копии"}
+
+# Варианты сортировки листинга
+SORT_LABELS = {'name': '🔤 Имя', 'size': '📦 Размер', 'mtime': '🕒 Дата'}
+
+# Кнопки навигации не попадают под защиту от спама
+NAVIGATION_PREFIXES = (
+    "files_list", "files_roots", "files_noop", "files_open:", "files_page:", "files_sort:",
+    "files_view:", "files_find:", "files_grep:", "files_sel", "files_clip_clear",
+    "files_dups:", "files_dups_ask:"
+)
+
+SPAM_MESSAGE = "Подождите немного перед следующей командой!"
+
+# Кнопки, которые меняют файлы на сервере или следят за ними: только для allowed_users
+PROTECTED_PREFIXES = (
+    "files_batch", "files_paste:", "files_dups_do:", "files_tail:", "files_watch:", "files_unwatch:",
+    "files_upload:"
+)
+
+# Сколько секунд после нажатия «Загрузить сюда» (или после последнего файла)
+# отправленные боту документы сохраняются в выбранную папку
+UPLOAD_TTL = 10 * 60
+
+# Прием документов - в отдельной группе обработчиков, чтобы не перехватывать
+# документы у других модулей, когда загрузка в папку не включена
+UPLOAD_HANDLER_GROUP = 1
+
+ACCESS_DENIED_MESSAGE = "⛔ У вас нет доступа к этому действию"
+
+def pagination_rows(prefix: str, page: int, pages: int):
+    """Кнопки перехода по страницам (callback_data - prefix:номер_страницы)"""
+    rows = [[
+        InlineKeyboardButton("⏮", callback_data=f"{prefix}:0"),
+        InlineKeyboardButton("◀️", callback_data=f"{prefix}:{max(page - 1, 0)}"),
+        InlineKeyboardButton(f"{page + 1}/{pages}", callback_data="files_noop"),
+        InlineKeyboardButton("▶️", callback_data=f"{prefix}:{min(page + 1, pages - 1)}"),
+        InlineKeyboardButton("⏭", callback_data=f"{prefix}:{pages - 1}")
+    ]]
+    if pages > 10:
+        rows.append([
+            InlineKeyboardButton("⏪ -10", callback_data=f"{prefix}:{max(page - 10, 0)}"),
+            InlineKeyboardButton("+10 ⏩", callback_data=f"{prefix}:{min(page + 10, pages - 1)}")
+        ])
+    return rows
+
+def selection_rows(context, path_id: str):
+    """Кнопки выбора нескольких файлов и вставки скопированного"""
+    rows = []
+    if context.user_data.get('selecting'):
+        count = len(context.user_data.get('selection', ()))
+        rows.append([
+            InlineKeyboardButton(f"📋 Копировать ({count})", callback_data="files_batch:copy"),
+            InlineKeyboardButton(f"✂️ Переместить ({count})", callback_data="files_batch:move"),
+            InlineKeyboardButton(f"🗑 Удалить ({count})", callback_data="files_batch:delete")
+        ])
+        rows.append([
+            InlineKeyboardButton(f"🗜 Скачать архивом ({count})", callback_data="files_batch:archive"),
+            InlineKeyboardButton("✖️ Отменить выбор", callback_data="files_select_done")
+        ])
+    else:
+        rows.append([InlineKeyboardButton("☑️ Выбрать несколько", callback_data="files_select")])
+    clipboard = context.user_data.get('clipboard')
+    if clipboard:
+        operation, paths = clipboard
+        rows.append([
+            InlineKeyboardButton(f"📥 Вставить сюда ({len(paths)})", callback_data=f"files_paste:{path_id}"),
+            InlineKeyboardButton("✖️ Очистить", callback_data="files_clip_clear")
+        ])
+    return rows
+
+def render_grep(search: ContentSearch, page: int = 0):
+    """Текст и кнопки страницы результатов поиска по содержимому"""
+    pages = max(1, (len(search.results) + GREP_PAGE_SIZE - 1) // GREP_PAGE_SIZE)
+    page = min(max(page, 0), pages - 1)
+
+    if not search.done:
+        status = "⏳ Идет поиск"
+    elif search.error:
+        status = f"❌ Поиск прерван ({search.error})"
+    elif search.truncated:
+        status = f"✅ Показаны первые {len(search.results)} совпадений"
+    elif search.cancelled:
+        status = "⏹ Поиск остановлен"
+    else:
+        status = "✅ Поиск завершен"
+    lines = [
+        f"🔎 «{search.text}» в {search.root}",
+        f"{status}: файлов {search.files_scanned} ({format_size(search.bytes_scanned)}), "
+        f"пропущено {search.skipped}, {format_duration(search.elapsed)}",
+        f"Совпадений: {len(search.results)}",
+    ]
+    for match in search.results[page * GREP_PAGE_SIZE:(page + 1) * GREP_PAGE_SIZE]:
+        lines.append(f"\n📄 {match.path}:{match.line_number}\n{match.line}")
+
+    keyboard = []
+    if pages > 1:
+        keyboard.extend(pagination_rows("files_grep", page, pages))
+    if not search.done:
+        keyboard.append([InlineKeyboardButton("⏹ Остановить", callback_data="files_grep_cancel")])
+    return "\n".join(lines)[:4096], InlineKeyboardMarkup(keyboard) if keyboard else None
+
+def render_duplicates(search: DuplicateSearch, page: int = 0):
+    """Текст и кнопки страницы результатов поиска дубликатов"""
+    pages = max(1, (len(search.groups) + DUPS_PAGE_SIZE - 1) // DUPS_PAGE_SIZE)
+    page = min(max(page, 0), pages - 1)
+
+    if not search.done:
+        status = STAGES[search.stage]
+    elif search.error:
+        status = f"❌ Поиск прерван ({search.error})"
+    elif search.cancelled:
+        status = "⏹ Поиск остановлен"
+    else:
+        status = "✅ Поиск завершен"
+    lines = [
+        f"👯 Дубликаты в {search.root}",
+        f"{status}: файлов {search.files_scanned}, одного размера {search.candidates}, "
+        f"прочитано {format_size(search.bytes_hashed)} (из кэша: {search.cache_hits}), "
+        f"{format_duration(search.elapsed)}",
+    ]
+    if search.done and not search.cancelled and not search.error:
+        lines.append(f"Групп: {len(search.groups)}, лишнего места: {format_size(search.wasted)}")
+
+    keyboard = []
+    for number in range(page * DUPS_PAGE_SIZE, min((page + 1) * DUPS_PAGE_SIZE, len(search.groups))):
+        group = search.groups[number]
+        resolved = {'link': " · 🔗 связаны", 'delete': " · 🗑 копии удалены"}.get(group.resolved, "")
+        lines.append(f"\n#{number + 1} 👯 {len(group.files)} × {format_size(group.size)}{resolved}")
+        for index, info in enumerate(group.files[:DUPS_PATHS_SHOWN]):
+            lines.append(f"{'⭐' if index == 0 else '•'} {info.path}")
+        if len(group.files) > DUPS_PATHS_SHOWN:
+            lines.append(f"... и еще {len(group.files) - DUPS_PATHS_SHOWN}")
+        if not group.resolved:
+            keyboard.append([
+                InlineKeyboardButton(f"🔗 #{number + 1}", callback_data=f"files_dups_ask:link:{number}"),
+                InlineKeyboardButton(f"🗑 #{number + 1}", callback_data=f"files_dups_ask:delete:{number}")
+            ])
+    if pages > 1:
+        keyboard.extend(pagination_rows("files_dups", page, pages))
+    if not search.done:
+        keyboard.append([InlineKeyboardButton("⏹ Остановить", callback_data="files_dups_cancel")])
+    return "\n".join(lines)[:4096], InlineKeyboardMarkup(keyboard) if keyboard else None
+
+async def upload_to_file_host(file_path: str, update: Update, context) -> Optional[UploadResult]:
+    """Загрузка файла на файлообменник с прогрессом, возвращает ссылку и сервис"""
+    progress_message = None
+    try:
+        filename = os.path.basename(file_path)
+        loading_messages = context.application.bot_data.get('loading_messages', ["Загрузка файла..."])
+        progress_message = await update.callback_query.message.reply_text("⏳ Загрузка файла началась...")
+        reporter = ProgressReporter(
+            progress_message, f"⏳ Загрузка файла: {filename}", await fs.getsize(file_path),
+            metric='upload_external',
+            # Каждые 15 секунд меняем сообщение
+            footer=lambda tracker: f"💭 {loading_messages[int(tracker.elapsed / 15) % len(loading_messages)]}"
+        )
+        result = await get_uploader(context.bot_data.get('config')).upload_file(
+            file_path, on_chunk=reporter, user_id=update.effective_user.id,
+            on_retry=lambda host: reporter.restart(f"⏳ Загрузка файла: {filename} (повтор: {host})")
+        )
+        if result:
+            await reporter.finish(
+                f"✅ Загрузка завершена!\n"
+                f"[{'█' * 10}] 100%\n"
+                f"📁 Файл: {filename}\n"
+                f"⏱ Время: {format_duration(reporter.tracker.elapsed)}"
+            )
+            await asyncio.sleep(2)
+        else:
+            reporter.close(ok=False)
+        await progress_message.delete()
+        return result
+    except Exception as e:
+        logger.error(f"Ошибка загрузки на файлообменник: {e}")
+        if progress_message:
+            await progress_message.delete()
+    return None
+
+async def handle_file_download(update: Update, context, file_path: str) -> None:
+    """Отправка файла: напрямую, частями или через файлообменник, папки - архивом"""
+    if await fs.isdir(file_path):
+        await send_archive(update, context, [file_path])
+        return
+    try:
+        file_size = await fs.getsize(file_path)
+        config = context.bot_data.get('config', {})
+        max_file_size = config.get('max_file_size', 50 * 1024 * 1024)
+
+        if file_size > max_file_size and config.get('large_file_mode') == split.MODE_SPLIT \
+                and split.can_split(file_size, max_file_size):
+            await send_parts(update, context, file_path, max_file_size)
+        elif file_size > max_file_size:
+            result = await upload_to_file_host(file_path, update, context)
+            if result:
+                await update.callback_query.message.reply_text(
+                    f"✅ Файл успешно загружен на {result.host}!\n"
+                    f"📎 Ссылка для скачивания (действительна 30 минут):\n{result.link}"
+                )
+            else:
+                await update.callback_query.message.reply_text(
+                    "❌ Не удалось загрузить файл. Пожалуйста, попробуйте позже."
+                )
+        else:
+            progress_message = await update.callback_query.message.reply_text(
+                "📤 Отправляем файл напрямую...\n"
+                f"[{'_' * 10}] 0%"
+            )
+            reporter = ProgressReporter(
+                progress_message, "📤 Отправляем файл...", file_size, metric='upload_telegram'
+            )
+            try:
+                await delivery.send_file(
+                    context.bot, update.effective_chat.id, file_path,
+                    on_chunk=reporter, user_id=update.effective_user.id
+                )
+                reporter.close()
+            except Exception:
+                reporter.close(ok=False)
+                raise
+            finally:
+                await progress_message.delete()
+
+    except Exception as e:
+        await update.callback_query.message.reply_text(f"❌ Ошибка при отправке файла: {str(e)}")
+
+async def send_parts(update: Update, context, file_path: str, part_size: int) -> None:
+    """Отправка большого файла частями с манифестом и скриптом сборки"""
+    filename = os.path.basename(file_path)
+    status_message = await update.callback_query.message.reply_text(f"✂️ Отправка частями: {filename}")
+    reporter = ProgressReporter(
+        status_message, f"✂️ Отправка частями: {filename}", await fs.getsize(file_path), metric='upload_telegram'
+    )
+    try:
+        manifest = await split.send_in_parts(
+            context.bot, update.effective_chat.id, file_path, part_size,
+            on_chunk=reporter, user_id=update.effective_user.id
+        )
+    except Exception:
+        reporter.close(ok=False)
+        raise
+    await reporter.finish(
+        f"✅ Файл {filename} отправлен частями: {len(manifest['parts'])}\n"
+        f"🔐 SHA-256: {manifest['sha256']}"
+    )
+
+async def send_archive(update: Update, context, paths: list) -> None:
+    """Отправка папок и файлов архивом, который создается во время отправки"""
+    config = context.bot_data.get('config', {})
+    settings = config.get('archive', {})
+    max_file_size = config.get('max_file_size', 50 * 1024 * 1024)
+    user_id = update.effective_user.id
+    status_message = await update.callback_query.message.reply_text("🗜 Подготовка архива...")
+    try:
+        archive = ArchiveStream(
+            paths, settings.get('format', 'zip'), settings.get('compression_level', 6), user_id=user_id
+        )
+        await archive.prepare()
+        to_telegram = archive.estimated_size <= max_file_size
+        reporter = ProgressReporter(
+            status_message, f"🗜 Архивация и отправка: {archive.filename}", archive.total_in,
+            metric='upload_telegram' if to_telegram else 'upload_external'
+        )
+
+        # Архив создается во время отправки: на каждую попытку загрузки нужен новый поток
+        streams = [archive]
+
+        def next_archive():
+            if streams[-1].consumed:
+                streams.append(streams[-1].fresh())
+            return streams[-1]
+
+        async def report(nbytes):
+            # Прогресс по прочитанным исходным данным: размер архива заранее неизвестен
+            await reporter(streams[-1].bytes_in - reporter.tracker.done)
+
+        archive.on_chunk = report
+        if to_telegram:
+            await delivery.send_stream(context.bot, update.effective_chat.id, archive, archive.filename)
+            reporter.close()
+            await status_message.delete()
+        else:
+            result = await get_uploader(config).upload_stream(
+                next_archive, archive.filename,
+                on_retry=lambda host: reporter.restart(f"🗜 Архивация и загрузка: {archive.filename} (повтор: {host})")
+            )
+            if result:
+                await reporter.finish(
+                    f"✅ Архив {archive.filename} загружен на {result.host} ({len(archive.entries)} объектов)\n"
+                    f"📎 Ссылка для скачивания (действительна 30 минут):\n{result.link}"
+                )
+            else:
+                await reporter.finish("❌ Не удалось загрузить архив. Пожалуйста, попробуйте позже.", ok=False)
+    except Exception as e:
+        if 'reporter' in locals():
+            reporter.close(ok=False)
+        logger.error(f"Ошибка при отправке архива: {e}")
+        await status_message.edit_text(f"❌ Ошибка при отправке архива: {str(e)}")
+
+async def send_thumbnail(update: Update, context, path: str) -> None:
+    """Превью изображения под карточкой файла"""
+    cache = get_thumbnail_cache(context.bot_data.get('config'))
+    thumbnail = await cache.get_async(path)
+    if thumbnail is None:
+        return
+    # Превью предыдущего файла убираем, чтобы не засорять чат
+    previous = context.user_data.pop('thumbnail_message', None)
+    if previous is not None:
+        try:
+            await previous.delete()
+        except Exception:
+            pass
+    caption = f"🖼 {os.path.basename(path)}"
+    try:
+        if thumbnail.file_id:
+            sent = await update.callback_query.message.reply_photo(thumbnail.file_id, caption=caption)
+        else:
+            with open(thumbnail.path, 'rb') as f:
+                sent = await update.callback_query.message.reply_photo(f, caption=caption)
+            cache.remember(thumbnail.key, sent.photo[-1].file_id)
+    except Exception as e:
+        logger.warning(f"Не удалось отправить превью {path}: {e}")
+        return
+    context.user_data['thumbnail_message'] = sent
+
+async def start_file_job(update: Update, context, operation: str, paths: list, destination=None) -> None:
+    """Запуск копирования, перемещения или удаления с прогрессом в отдельном сообщении"""
+    job = FileJob(operation, paths, destination, update.effective_user.id)
+    cancel_markup = InlineKeyboardMarkup([
+        [InlineKeyboardButton("⏹ Отменить", callback_data=f"files_job_cancel:{job.id}")]
+    ])
+    message = await update.callback_query.message.reply_text(job.render(), reply_markup=cancel_markup)
+    editor = ThrottledEditor(message)
+
+    async def on_progress(current):
+        if editor.ready():
+            await editor.update(current.render(), cancel_markup)
+
+    async def on_done(current):
+        await editor.finish(current.render())
+
+    try:
+        get_file_jobs().start(job, on_progress, on_done)
+    except JobLimitError as e:
+        await message.edit_text(f"❌ {str(e)}")
+
+async def reply(update: Update, text: str, reply_markup=None) -> None:
+    """Ответ на кнопку заменой сообщения, на команду - новым сообщением"""
+    if update.callback_query:
+        await update.callback_query.message.edit_text(text, reply_markup=reply_markup)
+    else:
+        await update.message.reply_text(text, reply_markup=reply_markup)
+
+class FileManager:
+    """
+    Файловый менеджер: листинг папок, карточки и просмотр файлов, отправка
+    и прием файлов, поиск, групповые операции и слежение за файлами.
+
+    Особенности ОС (корневые папки, владелец файла, запуск файла) берутся
+    из адаптера Platform, блокирующие обращения к файловой системе идут
+    через общий пул core.fs. spam_interval - минимальный интервал между
+    командами пользователя в секундах (0 - без ограничения).
+    """
+
+    def __init__(self, platform: Platform, command: str = 'files', tail_command: str = 'tail',
+                 spam_interval: float = 0):
+        self.platform = platform
+        self.command = command
+        self.tail_command_name = tail_command
+        self.spam_interval = spam_interval
+        self.last_command_time: Dict[int, float] = {}
+        # Хранилище коротких ID путей (у каждого пользователя свое)
+        self.path_store = PathStore()
+        # Кэш рекурсивных размеров папок и отсортированных листингов
+        self.dir_sizes = DirSizeCache()
+        self.dir_index_cache = DirectoryIndexCache(dir_sizes=self.dir_sizes)
+        # Открытые для просмотра текстовые файлы
+        self.text_views = TextViewCache()
+
+    def store_path(self, path: str, user_id=None) -> str:
+        """Сохраняет путь и возвращает его ID"""
+        return self.path_store.store(path, user_id)
+
+    def get_path(self, path_id: str, user_id=None) -> Optional[str]:
+        """Получает путь по его ID"""
+        return self.path_store.get(path_id, user_id)
+
+    def check_spam(self, user_id: int, command_type: str = "command") -> bool:
+        """
+        Проверка на спам
+        command_type:
+            - "command" - основные команды (требуют задержки)
+            - "navigation" - навигация (без задержки)
+        """
+        if command_type == "navigation" or not self.spam_interval:
+            return False
+        current_time = time.time()
+        if current_time - self.last_command_time.get(user_id, 0) < self.spam_interval:
+            return True
+        self.last_command_time[user_id] = current_time
+        return False
+
+    @staticmethod
+    def upload_dir(context) -> Optional[str]:
+        """Папка, в которую сейчас сохраняются отправленные боту документы"""
+        target = context.user_data.get('upload_dir')
+        if not target:
+            return None
+        path, expires = target
+        if time.monotonic() > expires:
+            context.user_data.pop('upload_dir', None)
+            return None
+        return path
+
+    def check_access(self, update: Update, context) -> bool:
+        """Проверка, что пользователь указан в allowed_users"""
+        config = context.bot_data.get('config') or {}
+        return str(update.effective_user.id) in config.get('allowed_users', [])
+
+    # --- листинг ---
+
+    async def list_roots(self, update: Update, context) -> None:
+        """Список корневых папок (дисков)"""
+        user_id = update.effective_user.id
+        context.user_data['listing'] = (None, 0)
+        roots = await fs.run(self.platform.roots)
+        keyboard = [
+            [InlineKeyboardButton(f"💿 Диск {root}", callback_data=f"files_open:{self.store_path(root, user_id)}")]
+            for root in roots
+        ]
+        await reply(update, "Выберите диск:", InlineKeyboardMarkup(keyboard))
+
+    async def list_directory(self, update: Update, context, path=None, page: int = 0):
+        """Отображение содержимого директории (постранично)"""
+        if path is None:
+            roots = await fs.run(self.platform.roots)
+            if len(roots) != 1:
+                await self.list_roots(update, context)
+                return
+            path = roots[0]
+
+        user_id = update.effective_user.id
+        sort = context.user_data.get('sort', 'name')
+        try:
+            index = await self.dir_index_cache.get_async(path, sort)
+            page = min(max(page, 0), index.pages - 1)
+            context.user_data['listing'] = (path, page)
+            path_id = self.store_path(path, user_id)
+            selecting = context.user_data.get('selecting', False)
+            selection = context.user_data.get('selection', set())
+            keyboard = []
+
+            # Папки идут первыми, затем файлы
+            for entry in index.page(page):
+                entry_id = self.store_path(entry.path, user_id)
+                if entry.is_dir:
+                    if sort != 'size':
+                        label = f"📁 {entry.name}"
+                    elif entry.size == UNKNOWN_SIZE:
+                        label = f"📁 {entry.name} (?)"
+                    else:
+                        label = f"📁 {entry.name} ({format_size(entry.size)})"
+                else:
+                    icon = "🖼" if is_image(entry.name) else "📄"
+                    label = f"{icon} {entry.name} ({format_size(entry.size)})" if sort == 'size' else f"{icon} {entry.name}"
+                if selecting:
+                    mark = "✅" if entry.path in selection else "⬜"
+                    keyboard.append([InlineKeyboardButton(f"{mark} {label}", callback_data=f"files_sel:{entry_id}")])
+                else:
+                    keyboard.append([InlineKeyboardButton(label, callback_data=f"files_open:{entry_id}")])
+
+            if index.pages > 1:
+                keyboard.extend(pagination_rows(f"files_page:{path_id}", page, index.pages))
+
+            keyboard.append([
+                InlineKeyboardButton(
+                    f"{'✅ ' if key == sort else ''}{label}",
+                    callback_data=f"files_sort:{path_id}:{key}"
+                )
+                for key, label in SORT_LABELS.items()
+            ])
+
+            keyboard.append([
+                InlineKeyboardButton("📊 Размер папки", callback_data=f"files_du:{path_id}"),
+                InlineKeyboardButton("🗜 Скачать архивом", callback_data=f"files_download:{path_id}")
+            ])
+            watched = get_dir_watcher(context.bot_data.get('config')).watched(path)
+            keyboard.append([InlineKeyboardButton(
+                "🔕 Не уведомлять об изменениях" if watched else "🔔 Уведомлять об изменениях",
+                callback_data=f"files_watch:{path_id}"
+            )])
+            keyboard.append([InlineKeyboardButton(
+                "⏹ Не сохранять сюда файлы" if self.upload_dir(context) == path else "📥 Загрузить сюда",
+                callback_data=f"files_upload:{path_id}"
+            )])
+            keyboard.extend(selection_rows(context, path_id))
+
+            # Кнопка "Вверх", если мы не в корне; из корня - к списку дисков, если их несколько
+            parent = os.path.dirname(path)
+            if parent != path:
+                parent_id = self.store_path(parent, user_id)
+                keyboard.append([InlineKeyboardButton("⬆️ Вверх", callback_data=f"files_open:{parent_id}")])
+            elif len(await fs.run(self.platform.roots)) > 1:
+                keyboard.append([InlineKeyboardButton("💿 Диски", callback_data="files_roots")])
+
+            text = f"📂 Текущая папка: {path}\nПапок: {index.dirs}, файлов: {index.files}"
+            size_record = self.dir_sizes.cached(path)
+            if size_record is not None:
+                text += f"\n📦 Размер: {format_size(size_record.total)} (всего файлов: {size_record.files})"
+            if index.unsized:
+                text += f"\n❔ Размер папок еще не подсчитан ({index.unsized}) - нажмите «📊 Размер папки»"
+            if index.pages > 1:
+                text += f"\nСтраница {page + 1} из {index.pages}"
+
+            await reply(update, text, InlineKeyboardMarkup(keyboard))
+
+        except Exception as e:
+            await reply(update, f"❌ Ошибка при чтении директории: {str(e)}")
+
+    async def refresh_listing(self, update: Update, context):
+        """Повторный показ текущей страницы листинга"""
+        path, page = context.user_data.get('listing', (None, 0))
+        await self.list_directory(update, context, path, page)
+
+    # --- файлы ---
+
+    async def show_file(self, update: Update, context, path: str, path_id: str) -> None:
+        """Карточка файла"""
+        stats = await fs.stat(path)
+        lines = [
+            f"📄 Файл: {os.path.basename(path)}",
+            f"📦 Размер: {format_size(stats.st_size)}",
+        ] + self.platform.file_details(stats)
+
+        keyboard = [
+            [
+                InlineKeyboardButton("⬇️ Скачать", callback_data=f"files_download:{path_id}"),
+                InlineKeyboardButton("▶️ Запустить", callback_data=f"files_launch:{path_id}")
+            ],
+            [
+                InlineKeyboardButton("👁 Просмотр", callback_data=f"files_view:{path_id}:start"),
+                InlineKeyboardButton("📡 Следить", callback_data=f"files_tail:{path_id}")
+            ],
+            [InlineKeyboardButton("📂 Назад", callback_data="files_list")]
+        ]
+        await update.callback_query.message.edit_text("\n".join(lines), reply_markup=InlineKeyboardMarkup(keyboard))
+        if is_image(path):
+            await send_thumbnail(update, context, path)
+
+    async def show_text_page(self, update: Update, context, path_id: str, position: str) -> None:
+        """Страница текстового файла с кнопками листания"""
+        query = update.callback_query
+        path = self.get_path(path_id, update.effective_user.id)
+        if not path:
+            await query.answer("Ошибка: путь не найден", show_alert=True)
+            return
+        try:
+            page = await self.text_views.page_async(path, position)
+        except BinaryFileError as e:
+            await query.answer(f"❌ {e}", show_alert=True)
+            return
+        except (OSError, ValueError) as e:
+            await query.answer(f"Ошибка при чтении: {str(e)}", show_alert=True)
+            return
+
+        navigation = []
+        if not page.at_start:
+            navigation.append(InlineKeyboardButton("⏮ В начало", callback_data=f"files_view:{path_id}:start"))
+            navigation.append(InlineKeyboardButton("◀️", callback_data=f"files_view:{path_id}:b{page.start}"))
+        if not page.at_end:
+            navigation.append(InlineKeyboardButton("▶️", callback_data=f"files_view:{path_id}:{page.end}"))
+            navigation.append(InlineKeyboardButton("В конец ⏭", callback_data=f"files_view:{path_id}:end"))
+        keyboard = [navigation] if navigation else []
+        keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data=f"files_open:{path_id}")])
+        await query.edit_message_text(
+            render_page(page, os.path.basename(path)),
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode='HTML'
+        )
+
+    async def start_tail(self, update: Update, context, path: str) -> None:
+        """Слежение за дописываемым файлом в отдельном сообщении"""
+        reply_to = update.callback_query.message if update.callback_query else update.message
+        message = await reply_to.reply_text(f"📡 Подготовка слежения: {os.path.basename(path)}")
+        watcher = get_tail_watcher()
+        tail = LogTail(path, message, update.effective_user.id)
+        try:
+            await fs.run(tail.start_position)
+            watcher.start(tail)
+        except (TailLimitError, OSError, ValueError) as e:
+            await message.edit_text(f"❌ Не удалось начать слежение: {str(e)}")
+            return
+        stop_markup = InlineKeyboardMarkup([
+            [InlineKeyboardButton("⏹ Остановить", callback_data=f"files_tail_stop:{tail.id}")]
+        ])
+        context.application.create_task(watcher.follow(tail, stop_markup))
+
+    async def tail_command(self, update: Update, context):
+        """Команда /tail <путь>: слежение за файлом"""
+        if not self.check_access(update, context):
+            await update.message.reply_text(ACCESS_DENIED_MESSAGE)
+            return
+        if self.check_spam(update.effective_user.id, "command"):
+            await update.message.reply_text(SPAM_MESSAGE)
+            return
+        if not context.args:
+            await update.message.reply_text(
+                "📡 Использование: /tail <путь к файлу>\n"
+                f"Или кнопка «Следить» в карточке файла в /{self.command}"
+            )
+            return
+        path = ' '.join(context.args)
+        if not await fs.isfile(path):
+            await update.message.reply_text("❌ Файл не найден")
+            return
+        await self.start_tail(update, context, path)
+
+    async def receive_document(self, update: Update, context):
+        """
+        Документ, отправленный боту, сохраняется в папку, выбранную кнопкой
+        «📥 Загрузить сюда». Без выбранной папки документ не трогаем - он может
+        быть адресован другому модулю
+        """
+        directory = self.upload_dir(context)
+        if not directory or not self.check_access(update, context):
+            return
+        # Каждый файл продлевает прием: несколько файлов подряд уходят в ту же папку
+        context.user_data['upload_dir'] = (directory, time.monotonic() + UPLOAD_TTL)
+        document = update.message.document
+        size = document.file_size or 0
+        user_id = update.effective_user.id
+        if size > delivery.MAX_RECEIVE_SIZE and not context.bot.local_mode:
+            await update.message.reply_text(
+                f"❌ Telegram позволяет ботам скачивать файлы не больше {format_size(delivery.MAX_RECEIVE_SIZE)}"
+            )
+            return
+        storage = get_storage_manager(context.bot_data.get('config'))
+        try:
+            problem = await fs.run(storage.check_space, directory, size)
+        except OSError as e:
+            problem = str(e)
+        if problem:
+            await update.message.reply_text(f"❌ Файл не сохранен: {problem}")
+            return
+
+        name = delivery.safe_filename(document.file_name, f"file_{document.file_unique_id}")
+        target = await fs.run(file_ops.unique_path, directory, name)
+        message = await update.message.reply_text(f"📥 Сохранение: {name}")
+        reporter = ProgressReporter(message, f"📥 Сохранение: {name}", size, metric='download_telegram')
+        try:
+            size = await delivery.receive_file(context.bot, document.file_id, target, on_chunk=reporter, user_id=user_id)
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении файла {target}: {e}")
+            await reporter.finish(f"❌ Не удалось сохранить файл: {str(e)}", ok=False)
+            return
+        keyboard = [[
+            InlineKeyboardButton("📄 Открыть", callback_data=f"files_open:{self.store_path(target, user_id)}"),
+            InlineKeyboardButton("📂 Папка", callback_data=f"files_open:{self.store_path(directory, user_id)}")
+        ]]
+        await reporter.finish(
+            f"✅ Сохранено: {target}\n📦 Размер: {format_size(size)}",
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+
+    # --- поиск ---
+
+    async def find_files(self, update: Update, context, pattern: str):
+        """Поиск по индексу имен файлов"""
+        file_index = get_file_index(context.bot_data.get('config'))
+        file_index.ensure_started()
+        if not file_index.ready:
+            await update.message.reply_text(
+                f"⏳ Индекс файлов еще строится (просмотрено папок: {file_index.scanned_dirs}), "
+                f"попробуйте позже"
+            )
+            return
+        # Поиск по миллиону имен занимает заметное время - не на цикле событий
+        results, truncated = await fs.run(file_index.search, pattern)
+        context.user_data['find'] = (pattern, results, truncated)
+        await self.show_find_results(update, context, 0)
+
+    async def show_find_results(self, update: Update, context, page: int = 0):
+        """Страница результатов поиска"""
+        query = update.callback_query
+        if 'find' not in context.user_data:
+            await query.answer("Результаты поиска устарели, повторите поиск", show_alert=True)
+            return
+        pattern, results, truncated = context.user_data['find']
+        user_id = update.effective_user.id
+        pages = max(1, (len(results) + FIND_PAGE_SIZE - 1) // FIND_PAGE_SIZE)
+        page = min(max(page, 0), pages - 1)
+
+        keyboard = []
+        for match in results[page * FIND_PAGE_SIZE:(page + 1) * FIND_PAGE_SIZE]:
+            icon = "📁" if match.is_dir else "📄"
+            keyboard.append([InlineKeyboardButton(
+                f"{icon} {match.path}",
+                callback_data=f"files_open:{self.store_path(match.path, user_id)}"
+            )])
+        if pages > 1:
+            keyboard.extend(pagination_rows("files_find", page, pages))
+
+        if not results:
+            text = f"🔍 По запросу «{pattern}» ничего не найдено"
+        else:
+            count = f"{len(results)}+" if truncated else str(len(results))
+            text = f"🔍 Найдено по запросу «{pattern}»: {count}"
+            if pages > 1:
+                text += f"\nСтраница {page + 1} из {pages}"
+
+        await reply(update, text, InlineKeyboardMarkup(keyboard) if keyboard else None)
+
+    async def grep_files(self, update: Update, context, text: str):
+        """Поиск текста в файлах текущей папки (в фоне, с выводом по мере нахождения)"""
+        root = context.user_data.get('listing', (None, 0))[0]
+        if root is None:
+            await update.message.reply_text(f"📂 Сначала откройте папку для поиска в /{self.command}")
+            return
+        previous = context.user_data.get('grep')
+        if previous and not previous.done:
+            previous.cancel()
+
+        search = ContentSearch(root, text)
+        context.user_data['grep'] = search
+        status_text, reply_markup = render_grep(search)
+        message = await update.message.reply_text(status_text, reply_markup=reply_markup)
+        editor = ThrottledEditor(message)
+
+        async def on_progress(current):
+            if editor.ready():
+                await editor.update(*render_grep(current))
+
+        async def run():
+            try:
+                await search.run(on_progress)
+            except Exception as e:
+                logger.error(f"Ошибка поиска по содержимому: {e}")
+            await editor.finish(*render_grep(search))
+
+        # Поиск идет отдельной задачей, чтобы кнопка остановки обрабатывалась сразу
+        context.application.create_task(run())
+
+    async def find_duplicates(self, update: Update, context, root: str):
+        """Поиск одинаковых файлов в папке (в фоне, с прогрессом по этапам)"""
+        if not await fs.isdir(root):
+            await update.message.reply_text("❌ Папка не найдена")
+            return
+        previous = context.user_data.get('dups')
+        if previous and not previous.done:
+            previous.cancel()
+
+        config = context.bot_data.get('config', {})
+        search = DuplicateSearch(
+            root, get_hash_cache(config), config.get('duplicates', {}).get('min_size', 1)
+        )
+        context.user_data['dups'] = search
+        status_text, reply_markup = render_duplicates(search)
+        message = await update.message.reply_text(status_text, reply_markup=reply_markup)
+        editor = ThrottledEditor(message)
+
+        async def on_progress(current):
+            if editor.ready():
+                await editor.update(*render_duplicates(current))
+
+        async def run():
+            try:
+                await search.run(on_progress)
+            except Exception as e:
+                logger.error(f"Ошибка поиска дубликатов: {e}")
+            await editor.finish(*render_duplicates(search))
+
+        # Поиск идет отдельной задачей, чтобы кнопка остановки обрабатывалась сразу
+        context.application.create_task(run())
+
+    async def show_watches(self, update: Update, context):
+        """Список папок, об изменениях в которых приходят уведомления"""
+        watcher = get_dir_watcher(context.bot_data.get('config'))
+        user_id = update.effective_user.id
+        if not watcher.watches:
+            await reply(
+                update,
+                "🔔 Уведомления об изменениях не настроены\n"
+                f"Откройте папку в /{self.command} и нажмите «🔔 Уведомлять об изменениях»"
+            )
+            return
+        lines = [f"🔔 Папки под наблюдением: {len(watcher.watches)}"]
+        keyboard = []
+        for path in sorted(watcher.watches):
+            lines.append(f"{'👁' if watcher.active(path) else '⚠️'} {path}")
+            keyboard.append([InlineKeyboardButton(
+                f"❌ {path}", callback_data=f"files_unwatch:{self.store_path(path, user_id)}"
+            )])
+        await reply(update, "\n".join(lines), InlineKeyboardMarkup(keyboard))
+
+    async def show_stats(self, update: Update, context):
+        """Статистика хранилища ID путей и кэша листингов"""
+        stats = self.path_store.stats()
+        cache = self.dir_index_cache.stats()
+        file_index = get_file_index(context.bot_data.get('config'))
+        watches = get_dir_watcher(context.bot_data.get('config')).stats()
+        await update.message.reply_text(
+            f"📊 Хранилище путей\n"
+            f"👥 Пользователей: {stats['users']}\n"
+            f"🔑 Записей: {stats['entries']}\n"
+            f"💾 Память: {format_size(stats['memory'])}\n"
+            f"✅ Попаданий: {stats['hits']}, ❌ промахов: {stats['misses']}\n"
+            f"🧹 Вытеснено: {stats['evictions']}\n\n"
+            f"📂 Кэш листингов\n"
+            f"🗂 Папок: {cache['dirs']}, 👁 наблюдений: {cache['watches']}"
+            f"{'' if cache['inotify'] else ' (inotify недоступен, проверка по mtime)'}\n"
+            f"💾 Память: {format_size(cache['memory'])} из {format_size(cache['budget'])}\n"
+            f"✅ Попаданий: {cache['hits']}, ❌ промахов: {cache['misses']}\n"
+            f"🧹 Вытеснено: {cache['evictions']}\n\n"
+            f"🔍 Индекс файлов: {file_index.count} записей"
+            f"{' (обновляется)' if file_index.building else ''}\n"
+            f"🔔 Наблюдаемых папок: {watches['watches']} (действует: {watches['active']}), "
+            f"сводок отправлено: {watches['sent']}"
+            f"{format_transfer_stats()}"
+        )
+
+    # --- обработчики ---
+
+    async def files_command(self, update: Update, context):
+        """Команда для запуска файлового менеджера"""
+        if self.check_spam(update.effective_user.id, "command"):
+            await update.message.reply_text(SPAM_MESSAGE)
+            return
+        if context.args and context.args[0] == 'stats':
+            await self.show_stats(update, context)
+            return
+        if context.args and context.args[0] == 'find':
+            if len(context.args) < 2:
+                await update.message.reply_text(
+                    f"🔍 Использование: /{self.command} find <шаблон>\n"
+                    f"Подстрока имени или шаблон с * и ?, например: /{self.command} find *.log"
+                )
+                return
+            await self.find_files(update, context, ' '.join(context.args[1:]))
+            return
+        if context.args and context.args[0] == 'grep':
+            if len(context.args) < 2:
+                await update.message.reply_text(
+                    f"🔎 Использование: /{self.command} grep <текст>\n"
+                    "Поиск текста в файлах открытой папки и ее подпапках"
+                )
+                return
+            await self.grep_files(update, context, ' '.join(context.args[1:]))
+            return
+        if context.args and context.args[0] == 'watch':
+            await self.show_watches(update, context)
+            return
+        if context.args and context.args[0] == 'dups':
+            root = ' '.join(context.args[1:]) or context.user_data.get('listing', (None, 0))[0]
+            if not root:
+                await update.message.reply_text(
+                    f"👯 Использование: /{self.command} dups <папка>\n"
+                    "Без пути - поиск одинаковых файлов в открытой папке и ее подпапках"
+                )
+                return
+            await self.find_duplicates(update, context, root)
+            return
+        await self.list_directory(update, context)
+
+    async def handle_button(self, update: Update, context):
+        """Обработчик нажатия кнопки модуля"""
+        query = update.callback_query
+        try:
+            if query.data.startswith(PROTECTED_PREFIXES) and not self.check_access(update, context):
+                await query.answer(ACCESS_DENIED_MESSAGE, show_alert=True)
+                return
+            command_type = "navigation" if query.data.startswith(NAVIGATION_PREFIXES) else "command"
+            if self.check_spam(update.effective_user.id, command_type):
+                await query.answer(SPAM_MESSAGE, show_alert=True)
+                return
+            await self._dispatch(update, context)
+        except Exception as e:
+            logger.error(f"Ошибка в handle_button: {str(e)}")
+            await query.answer(f"Произошла ошибка: {str(e)}", show_alert=True)
+
+    async def _dispatch(self, update: Update, context):
+        query = update.callback_query
+        data = query.data
+        user_id = update.effective_user.id
+
+        if data == "files_list":
+            current_path = context.user_data.get('current_path')
+            if current_path and await fs.isfile(current_path):
+                current_path = os.path.dirname(current_path)
+            # Возвращаемся на ту же страницу листинга
+            listing_path, page = context.user_data.get('listing', (None, 0))
+            await self.list_directory(update, context, current_path, page if listing_path == current_path else 0)
+
+        elif data == "files_roots":
+            await self.list_roots(update, context)
+
+        elif data == "files_noop":
+            await query.answer()
+
+        elif data.startswith("files_page:"):
+            _, path_id, page = data.split(":")
+            path = self.get_path(path_id, user_id)
+            if not path:
+                await query.answer("Ошибка: путь не найден", show_alert=True)
+                return
+            await self.list_directory(update, context, path, int(page))
+
+        elif data.startswith("files_find:"):
+            await self.show_find_results(update, context, int(data.split(":", 1)[1]))
+
+        elif data == "files_grep_cancel":
+            search = context.user_data.get('grep')
+            if search and not search.done:
+                search.cancel()
+                await query.answer("⏹ Поиск останавливается")
+            else:
+                await query.answer()
+
+        elif data.startswith("files_grep:"):
+            search = context.user_data.get('grep')
+            if not search:
+                await query.answer("Результаты поиска устарели, повторите поиск", show_alert=True)
+                return
+            text, reply_markup = render_grep(search, int(data.split(":", 1)[1]))
+            await query.message.edit_text(text, reply_markup=reply_markup)
+
+        elif data == "files_dups_cancel":
+            search = context.user_data.get('dups')
+            if search and not search.done:
+                search.cancel()
+                await query.answer("⏹ Поиск останавливается")
+            else:
+                await query.answer()
+
+        elif data.startswith(("files_dups:", "files_dups_ask:", "files_dups_do:")):
+            search = context.user_data.get('dups')
+            if not search or not search.done:
+                await query.answer("Результаты поиска устарели, повторите поиск", show_alert=True)
+                return
+            if data.startswith("files_dups:"):
+                text, reply_markup = render_duplicates(search, int(data.split(":", 1)[1]))
+                await query.message.edit_text(text, reply_markup=reply_markup)
+                return
+            kind, action, number = data.split(":")
+            number = int(number)
+            if action not in DUPS_ACTIONS or number >= len(search.groups):
+                await query.answer("Группа не найдена", show_alert=True)
+                return
+            group = search.groups[number]
+            back = f"files_dups:{number // DUPS_PAGE_SIZE}"
+            if group.resolved:
+                await query.answer("Группа уже обработана", show_alert=True)
+            elif kind == "files_dups_ask":
+                keyboard = [[
+                    InlineKeyboardButton("✅ Да", callback_data=f"files_dups_do:{action}:{number}"),
+                    InlineKeyboardButton("❌ Отмена", callback_data=back)
+                ]]
+                await query.message.edit_text(
+                    f"{DUPS_ACTIONS[action]} ({len(group.files) - 1}, {format_size(group.wasted)})?\n"
+                    f"⭐ Останется: {group.keeper.path}",
+                    reply_markup=InlineKeyboardMarkup(keyboard)
+                )
+                return
+            else:
+                done, errors = await fs.run(group.resolve, action)
+                message = f"✅ Обработано копий: {done}"
+                if errors:
+                    message += f"\n❌ Ошибок: {len(errors)}\n" + "\n".join(errors[:3])
+                await query.answer(message[:200], show_alert=True)
+            text, reply_markup = render_duplicates(search, number // DUPS_PAGE_SIZE)
+            await query.message.edit_text(text, reply_markup=reply_markup)
+
+        elif data.startswith("files_watch:"):
+            path = self.get_path(data.split(":", 1)[1], user_id)
+            if not path:
+                await query.answer("Ошибка: путь не найден", show_alert=True)
+                return
+            watcher = get_dir_watcher(context.bot_data.get('config'))
+            if watcher.watched(path):
+                await watcher.remove(path)
+                await query.answer("🔕 Уведомления об изменениях в папке отключены")
+            else:
+                try:
+                    await watcher.add(path, user_id)
+                except (WatchLimitError, OSError) as e:
+                    await query.answer(f"❌ {str(e)}", show_alert=True)
+                    return
+                await query.answer(
+                    "🔔 Новые, измененные и удаленные файлы будут приходить сводкой. "
+                    f"Список папок - /{self.command} watch", show_alert=True
+                )
+            await self.refresh_listing(update, context)
+
+        elif data.startswith("files_upload:"):
+            path = self.get_path(data.split(":", 1)[1], user_id)
+            if not path or not await fs.isdir(path):
+                await query.answer("Ошибка: папка не найдена", show_alert=True)
+                return
+            if self.upload_dir(context) == path:
+                context.user_data.pop('upload_dir', None)
+                await query.answer("⏹ Файлы больше не сохраняются в эту папку")
+            else:
+                context.user_data['upload_dir'] = (path, time.monotonic() + UPLOAD_TTL)
+                await query.answer(
+                    f"📥 Отправляйте файлы боту - они сохранятся в {path}.\n"
+                    f"Прием выключится через {UPLOAD_TTL // 60} минут после последнего файла",
+                    show_alert=True
+                )
+            await self.refresh_listing(update, context)
+
+        elif data.startswith("files_unwatch:"):
+            path = self.get_path(data.split(":", 1)[1], user_id)
+            if path:
+                await get_dir_watcher(context.bot_data.get('config')).remove(path)
+            await self.show_watches(update, context)
+
+        elif data == "files_select":
+            context.user_data['selecting'] = True
+            await self.refresh_listing(update, context)
+
+        elif data.startswith("files_sel:"):
+            path = self.get_path(data.split(":", 1)[1], user_id)
+            if not path:
+                await query.answer("Ошибка: путь не найден", show_alert=True)
+                return
+            selection = context.user_data.setdefault('selection', set())
+            if path in selection:
+                selection.discard(path)
+            else:
+                selection.add(path)
+            await self.refresh_listing(update, context)
+
+        elif data == "files_select_done":
+            context.user_data['selecting'] = False
+            context.user_data['selection'] = set()
+            await self.refresh_listing(update, context)
+
+        elif data.startswith("files_batch:"):
+            operation = data.split(":", 1)[1]
+            selection = sorted(context.user_data.get('selection', ()))
+            if not selection:
+                await query.answer("Ничего не выбрано", show_alert=True)
+                return
+            if operation == 'delete':
+                names = "\n".join(f"• {os.path.basename(path) or path}" for path in selection[:10])
+                more = f"\n... и еще {len(selection) - 10}" if len(selection) > 10 else ""
+                keyboard = [[
+                    InlineKeyboardButton("✅ Удалить", callback_data="files_batch_delete"),
+                    InlineKeyboardButton("❌ Отмена", callback_data="files_select")
+                ]]
+                await query.message.edit_text(
+                    f"🗑 Удалить выбранное ({len(selection)})?\n{names}{more}",
+                    reply_markup=InlineKeyboardMarkup(keyboard)
+                )
+                return
+            if operation == 'archive':
+                # Выбор сохраняется: после скачивания можно сделать с ним что-то еще
+                await send_archive(update, context, selection)
+                return
+            context.user_data['clipboard'] = (operation, selection)
+            context.user_data['selecting'] = False
+            context.user_data['selection'] = set()
+            await query.answer("Откройте папку назначения и нажмите «Вставить сюда»", show_alert=True)
+            await self.refresh_listing(update, context)
+
+        elif data == "files_batch_delete":
+            selection = sorted(context.user_data.get('selection', ()))
+            context.user_data['selecting'] = False
+            context.user_data['selection'] = set()
+            if selection:
+                await start_file_job(update, context, 'delete', selection)
+            await self.refresh_listing(update, context)
+
+        elif data.startswith("files_paste:"):
+            destination = self.get_path(data.split(":", 1)[1], user_id)
+            clipboard = context.user_data.pop('clipboard', None)
+            if not destination or not clipboard:
+                await query.answer("Нечего вставлять", show_alert=True)
+                return
+            operation, paths = clipboard
+            await start_file_job(update, context, operation, paths, destination)
+            await self.refresh_listing(update, context)
+
+        elif data == "files_clip_clear":
+            context.user_data.pop('clipboard', None)
+            await self.refresh_listing(update, context)
+
+        elif data.startswith("files_job_cancel:"):
+            if get_file_jobs().cancel(data.split(":", 1)[1], user_id):
+                await query.answer("⏹ Операция останавливается")
+            else:
+                await query.answer("Операция уже завершена", show_alert=True)
+
+        elif data.startswith("files_du:"):
+            path_id = data.split(":", 1)[1]
+            path = self.get_path(path_id, user_id)
+            if not path:
+                await query.answer("Ошибка: путь не найден", show_alert=True)
+                return
+            await query.answer("⏳ Подсчет размера папки...")
+            try:
+                await self.dir_sizes.compute_async(path)
+            except Exception as e:
+                await query.message.edit_text(f"❌ Ошибка при подсчете размера: {str(e)}")
+                return
+            listing_path, page = context.user_data.get('listing', (None, 0))
+            await self.list_directory(update, context, path, page if listing_path == path else 0)
+
+        elif data.startswith("files_sort:"):
+            _, path_id, sort = data.split(":")
+            path = self.get_path(path_id, user_id)
+            if not path:
+                await query.answer("Ошибка: путь не найден", show_alert=True)
+                return
+            context.user_data['sort'] = sort
+            await self.list_directory(update, context, path)
+
+        elif data.startswith("files_open:"):
+            path_id = data.split(":", 1)[1]
+            path = self.get_path(path_id, user_id)
+            if not path:
+                await query.answer("Ошибка: путь не найден", show_alert=True)
+                return
+            context.user_data['current_path'] = path
+            if await fs.isfile(path):
+                await self.show_file(update, context, path, path_id)
+            else:
+                await self.list_directory(update, context, path)
+
+        elif data.startswith("files_view:"):
+            _, path_id, position = data.split(":", 2)
+            await self.show_text_page(update, context, path_id, position)
+
+        elif data.startswith("files_tail:"):
+            path = self.get_path(data.split(":", 1)[1], user_id)
+            if not path:
+                await query.answer("Ошибка: файл не найден", show_alert=True)
+                return
+            await query.answer("📡 Слежение запущено")
+            await self.start_tail(update, context, path)
+
+        elif data.startswith("files_tail_stop:"):
+            if get_tail_watcher().stop(data.split(":", 1)[1], user_id):
+                await query.answer("⏹ Слежение остановлено")
+            else:
+                await query.answer("Слежение уже завершено", show_alert=True)
+
+        elif data.startswith("files_download:"):
+            path = self.get_path(data.split(":", 1)[1], user_id)
+            if path:
+                await handle_file_download(update, context, path)
+            else:
+                await query.answer("Ошибка: файл не найден", show_alert=True)
+
+        elif data.startswith("files_launch:"):
+            path = self.get_path(data.split(":", 1)[1], user_id)
+            if path:
+                success, message = await fs.run(self.platform.launch, path)
+                await query.answer(message, show_alert=True)
+            else:
+                await query.answer("Ошибка: файл не найден", show_alert=True)
+
+    def register_handlers(self, app):
+        """Регистрация обработчиков менеджера"""
+        app.add_handler(CommandHandler(self.command, self.files_command))
+        app.add_handler(CommandHandler(self.tail_command_name, self.tail_command))
+        app.add_handler(CallbackQueryHandler(self.handle_button, pattern="^files_"))
+        app.add_handler(MessageHandler(filters.Document.ALL, self.receive_document), group=UPLOAD_HANDLER_GROUP)
@@ -0,0 +1,406 @@
+import asyncio
+import errno
+import logging
+import os
+import secrets
+import shutil
+import sys
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from core import fs
+from core.progress import ProgressTracker, format_duration, format_size
+
+logger = logging.getLogger(__name__)
+
+# Сколько байт копировать за один системный вызов: шаг прогресса и проверки отмены
+COPY_CHUNK = 16 * 1024 * 1024
+
+# Буфер для копирования без copy_file_range/sendfile
+BUFFER_SIZE = 1024 * 1024
+
+# Файлы одной операции обрабатываются параллельно
+WORKERS = 4
+
+# Ограничение одновременных операций одного пользователя
+MAX_JOBS_PER_USER = 2
+
+# Как часто обновлять прогресс (секунды)
+REPORT_INTERVAL = 1.0
+
+OPERATIONS = {
+    'copy': '📋 Копирование',
+    'move': '✂️ Перемещение',
+    'delete': '🗑 Удаление',
+}
+
+# Ошибки, при которых ядро не умеет копировать этим способом - переходим к следующему
+FALLBACK_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EPERM, errno.EBADF}
+
+class JobCancelled(Exception):
+    """Операция отменена пользователем"""
+
+class JobLimitError(Exception):
+    """Превышено число одновременных операций"""
+
+def unique_path(directory: str, name: str) -> str:
+    """Свободное имя в папке: файл.txt, файл (1).txt, файл (2).txt..."""
+    path = os.path.join(directory, name)
+    stem, ext = os.path.splitext(name)
+    counter = 1
+    while os.path.lexists(path):
+        path = os.path.join(directory, f"{stem} ({counter}){ext}")
+        counter += 1
+    return path
+
+def _is_inside(path: str, root: str) -> bool:
+    """Лежит ли path внутри root (или совпадает с ним)"""
+    try:
+        return os.path.commonpath([root, path]) == root
+    except ValueError:
+        # Разные диски Windows
+        return False
+
+def _initial_mode() -> str:
+    if hasattr(os, 'copy_file_range'):
+        return 'copy_file_range'
+    if hasattr(os, 'sendfile') and sys.platform.startswith('linux'):
+        return 'sendfile'
+    return 'buffer'
+
+def _transfer(in_fd: int, out_fd: int, on_bytes: Optional[Callable[[int], None]],
+              cancelled: Optional[Callable[[], bool]]) -> int:
+    """
+    Копирование содержимого между дескрипторами без передачи данных через
+    пространство пользователя: copy_file_range (на Btrfs/XFS/NFS - клонирование
+    или копирование на стороне сервера), затем sendfile, иначе через буфер.
+    """
+    mode = _initial_mode()
+    copied = 0
+    while True:
+        if cancelled and cancelled():
+            raise JobCancelled()
+        try:
+            if mode == 'copy_file_range':
+                n = os.copy_file_range(in_fd, out_fd, COPY_CHUNK)
+            elif mode == 'sendfile':
+                n = os.sendfile(out_fd, in_fd, None, COPY_CHUNK)
+            else:
+                data = os.read(in_fd, BUFFER_SIZE)
+                n = len(data)
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(out_fd, view):]
+        except OSError as e:
+            if mode == 'buffer' or e.errno not in FALLBACK_ERRNOS:
+                raise
+            mode = 'sendfile' if mode == 'copy_file_range' and hasattr(os, 'sendfile') else 'buffer'
+            continue
+        if n == 0:
+            if copied == 0 and mode != 'buffer':
+                # Файлы вроде /proc/* сообщают нулевой размер - проверяем обычным чтением
+                mode = 'buffer'
+                continue
+            return copied
+        copied += n
+        if on_bytes:
+            on_bytes(n)
+
+def copy_file(source: str, target: str, on_bytes: Optional[Callable[[int], None]] = None,
+              cancelled: Optional[Callable[[], bool]] = None) -> int:
+    """
+    Копирование файла (блокирующий вызов): данные пишутся во временный .part
+    рядом с target, права и время изменения переносятся, затем файл
+    переименовывается. Символическая ссылка копируется как ссылка.
+    """
+    if os.path.islink(source):
+        os.symlink(os.readlink(source), target)
+        return 0
+    temp_path = f"{target}.{uuid.uuid4().hex[:8]}.part"
+    try:
+        with open(source, 'rb') as fsrc, open(temp_path, 'wb') as fdst:
+            copied = _transfer(fsrc.fileno(), fdst.fileno(), on_bytes, cancelled)
+        shutil.copystat(source, temp_path)
+        os.replace(temp_path, target)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    return copied
+
+class Task(NamedTuple):
+    # Исходный путь верхнего уровня (для ошибок и удаления после перемещения)
+    root: str
+    source: str
+    target: Optional[str]
+    size: int
+
+class FileJob:
+    """
+    Фоновая операция над несколькими файлами и папками: копирование,
+    перемещение (в пределах одной ФС - переименованием) или удаление.
+    Файлы обрабатываются несколькими потоками, прогресс считается по байтам
+    (для удаления - по файлам), операцию можно отменить между блоками.
+    """
+
+    def __init__(self, operation: str, sources: List[str], destination: Optional[str] = None,
+                 user_id=None, workers: int = WORKERS):
+        if operation not in OPERATIONS:
+            raise ValueError(f"Неизвестная операция: {operation}")
+        self.id = secrets.token_hex(4)
+        self.operation = operation
+        self.sources = [os.path.abspath(path) for path in sources]
+        self.destination = os.path.abspath(destination) if destination else None
+        self.user_id = user_id
+        self.workers = workers
+        self.total_files = 0
+        self.total_bytes = 0
+        self.done_files = 0
+        self.done_bytes = 0
+        self.renamed = 0
+        self.errors: List[Tuple[str, str]] = []
+        self.tracker = ProgressTracker()
+        self.planned = False
+        self.cancelled = False
+        self.done = False
+        self.started = time.monotonic()
+        self._dirs: List[str] = []
+        self._failed_roots = set()
+        self._lock = threading.Lock()
+
+    @property
+    def title(self) -> str:
+        return OPERATIONS[self.operation]
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def cancel(self):
+        self.cancelled = True
+
+    def _error(self, root: str, path: str, error):
+        self._failed_roots.add(root)
+        self.errors.append((path, error.strerror if isinstance(error, OSError) and error.strerror else str(error)))
+
+    def _on_bytes(self, n: int):
+        with self._lock:
+            self.done_bytes += n
+
+    def _walk(self, root: str, source: str, target: Optional[str], tasks: List[Task]):
+        """Файлы дерева source; для копирования папки назначения создаются сразу"""
+        if os.path.islink(source) or not os.path.isdir(source):
+            size = os.lstat(source).st_size
+            tasks.append(Task(root, source, target, size))
+            if self.operation != 'delete':
+                self.total_bytes += size
+            return
+        if target:
+            os.makedirs(target, exist_ok=True)
+            shutil.copystat(source, target)
+        self._dirs.append(source)
+        stack = [(source, target)]
+        while stack:
+            directory, target_dir = stack.pop()
+            try:
+                with os.scandir(directory) as it:
+                    items = list(it)
+            except OSError as e:
+                self._error(root, directory, e)
+                continue
+            for item in items:
+                item_target = os.path.join(target_dir, item.name) if target_dir else None
+                try:
+                    if item.is_dir(follow_symlinks=False):
+                        if item_target:
+                            os.makedirs(item_target, exist_ok=True)
+                            shutil.copystat(item.path, item_target)
+                        self._dirs.append(item.path)
+                        stack.append((item.path, item_target))
+                        continue
+                    size = item.stat(follow_symlinks=False).st_size
+                except OSError as e:
+                    self._error(root, item.path, e)
+                    continue
+                tasks.append(Task(root, item.path, item_target, size))
+                if self.operation != 'delete':
+                    self.total_bytes += size
+
+    def _plan(self) -> List[Task]:
+        """Список файлов для обработки (блокирующий вызов)"""
+        tasks = []
+        for source in self.sources:
+            if self.cancelled:
+                break
+            if not os.path.lexists(source):
+                self._error(source, source, "Не найден")
+                continue
+            if self.operation == 'delete':
+                try:
+                    self._walk(source, source, None, tasks)
+                except OSError as e:
+                    self._error(source, source, e)
+                continue
+
+            if os.path.isdir(source) and not os.path.islink(source) and \
+                    _is_inside(self.destination, source):
+                self._error(source, source, "Нельзя поместить папку в саму себя")
+                continue
+            if self.operation == 'move' and os.path.dirname(source) == self.destination:
+                # Уже на месте
+                continue
+            target = unique_path(self.destination, os.path.basename(source))
+            if self.operation == 'move':
+                try:
+                    # В пределах одной файловой системы перемещение - это переименование
+                    os.rename(source, target)
+                    self.renamed += 1
+                    continue
+                except OSError as e:
+                    if e.errno != errno.EXDEV:
+                        self._error(source, source, e)
+                        continue
+            try:
+                self._walk(source, source, target, tasks)
+            except OSError as e:
+                self._error(source, source, e)
+        self.total_files = len(tasks)
+        self.tracker = ProgressTracker(self.total_bytes)
+        self.planned = True
+        return tasks
+
+    def _process(self, task: Task):
+        """Обработка одного файла (в пуле потоков)"""
+        if self.operation == 'delete':
+            os.remove(task.source)
+        else:
+            copy_file(task.source, task.target, self._on_bytes, lambda: self.cancelled)
+            if self.operation == 'move':
+                os.remove(task.source)
+        with self._lock:
+            self.done_files += 1
+
+    def _finish(self):
+        """Удаление опустевших папок после удаления или перемещения между ФС"""
+        if self.operation == 'copy':
+            return
+        for directory in sorted(self._dirs, key=len, reverse=True):
+            root = next((s for s in self.sources if directory == s or directory.startswith(s + os.sep)), None)
+            if root in self._failed_roots:
+                continue
+            try:
+                os.rmdir(directory)
+            except OSError as e:
+                self._error(root or directory, directory, e)
+
+    def render(self) -> str:
+        """Текст сообщения о ходе операции"""
+        if self.done:
+            if self.cancelled:
+                status = "⏹ Отменено"
+            elif self.errors:
+                status = "⚠️ Завершено с ошибками"
+            else:
+                status = "✅ Готово"
+        else:
+            status = "⏳ Выполняется" if self.planned else "⏳ Подготовка списка файлов"
+        target = f" в {self.destination}" if self.destination else ""
+        lines = [f"{self.title}{target}", status]
+        if self.planned and self.total_files:
+            files = f"📄 Файлов: {self.done_files} из {self.total_files}"
+            if self.operation == 'delete' or self.done:
+                lines.append(files)
+            else:
+                # Полоса, объем, скорость и оставшееся время
+                lines.append(self.tracker.render(files))
+        if self.renamed:
+            lines.append(f"⚡ Перемещено переименованием: {self.renamed}")
+        if self.done:
+            copied = f", {format_size(self.done_bytes)}" if self.done_bytes else ""
+            lines.append(f"⏱ {format_duration(self.elapsed)}{copied}")
+        if self.errors:
+            lines.append(f"\n❌ Ошибок: {len(self.errors)}")
+            for path, message in self.errors[:5]:
+                lines.append(f"{path}: {message}" if path else message)
+        return "\n".join(lines)[:4096]
+
+    async def _report(self, on_progress: Callable[['FileJob'], Awaitable]):
+        """Периодическое обновление прогресса, в том числе внутри больших файлов"""
+        reported = 0
+        while not self.done:
+            await asyncio.sleep(REPORT_INTERVAL)
+            current = self.done_bytes
+            self.tracker.update(current - reported)
+            reported = current
+            await on_progress(self)
+
+    async def run(self, on_progress: Optional[Callable[['FileJob'], Awaitable]] = None):
+        """Выполнение операции; on_progress(job) вызывается раз в REPORT_INTERVAL"""
+        reporter = asyncio.ensure_future(self._report(on_progress)) if on_progress else None
+        try:
+            tasks = iter(await fs.run(self._plan))
+
+            async def worker():
+                # Общий итератор: каждый файл достается одному обработчику
+                for task in tasks:
+                    if self.cancelled:
+                        return
+                    try:
+                        await fs.run(self._process, task)
+                    except JobCancelled:
+                        return
+                    except OSError as e:
+                        self._error(task.root, task.source, e)
+
+            await asyncio.gather(*(worker() for _ in range(self.workers)))
+            if not self.cancelled:
+                await fs.run(self._finish)
+        except Exception as e:
+            logger.error(f"Ошибка файловой операции {self.operation}: {e}")
+            self.errors.append(('', str(e)))
+        finally:
+            self.done = True
+            if reporter:
+                reporter.cancel()
+
+class FileJobs:
+    """Активные файловые операции всех пользователей"""
+
+    def __init__(self):
+        self.jobs: Dict[str, FileJob] = {}
+
+    def start(self, job: FileJob, on_progress=None, on_done=None) -> asyncio.Task:
+        """Запуск операции отдельной задачей; on_done(job) - после завершения"""
+        if sum(1 for j in self.jobs.values() if j.user_id == job.user_id) >= MAX_JOBS_PER_USER:
+            raise JobLimitError(f"Можно выполнять не больше {MAX_JOBS_PER_USER} операций одновременно")
+        self.jobs[job.id] = job
+
+        async def run():
+            try:
+                await job.run(on_progress)
+                if on_done:
+                    await on_done(job)
+            finally:
+                self.jobs.pop(job.id, None)
+
+        return asyncio.get_running_loop().create_task(run())
+
+    def cancel(self, job_id: str, user_id=None) -> bool:
+        job = self.jobs.get(job_id)
+        if job is None or (user_id is not None and job.user_id != user_id):
+            return False
+        job.cancel()
+        return True
+
+_jobs = None
+
+def get_file_jobs() -> FileJobs:
+    """Общий список файловых операций"""
+    global _jobs
+    if _jobs is None:
+        _jobs = FileJobs()
+    return _jobs
@@ -0,0 +1,71 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Потоков для блокирующих файловых операций: диски и сетевые ФС отвечают
+# с задержками, поэтому потоков больше, чем ядер
+WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+# Процессов для вычислений (хеши, поиск в файлах, превью): работа упирается
+# в процессор и диск, поэтому больше четырех не нужно
+PROCESS_WORKERS = max(1, min(4, os.cpu_count() or 1))
+
+_executor = None
+_process_pool = None
+
+def get_executor() -> ThreadPoolExecutor:
+    """Общий пул потоков файловых операций всех модулей"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='fs')
+    return _executor
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Общий пул процессов для вычислений (создается при первом использовании)"""
+    global _process_pool
+    if _process_pool is None:
+        # spawn: дочерние процессы не наследуют потоки и цикл событий бота
+        _process_pool = ProcessPoolExecutor(
+            max_workers=PROCESS_WORKERS, mp_context=multiprocessing.get_context('spawn')
+        )
+    return _process_pool
+
+async def run_in_process(func, *args):
+    """
+    Выполнение func в общем пуле процессов. Если процесс пула завершился
+    аварийно (BrokenProcessPool), пул заменяется новым для следующих вызовов
+    """
+    global _process_pool
+    pool = get_process_pool()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, func, *args)
+    except BrokenProcessPool:
+        if _process_pool is pool:
+            _process_pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+        raise
+
+async def run(func, *args, **kwargs):
+    """Выполнение блокирующей файловой операции в общем пуле, не блокируя цикл событий"""
+    if kwargs:
+        func = functools.partial(func, *args, **kwargs)
+        args = ()
+    return await asyncio.get_running_loop().run_in_executor(get_executor(), func, *args)
+
+async def stat(path: str) -> os.stat_result:
+    return await run(os.stat, path)
+
+async def isfile(path: str) -> bool:
+    return await run(os.path.isfile, path)
+
+async def isdir(path: str) -> bool:
+    return await run(os.path.isdir, path)
+
+async def exists(path: str) -> bool:
+    return await run(os.path.exists, path)
+
+async def getsize(path: str) -> int:
+    return await run(os.path.getsize, path)
@@ -0,0 +1,122 @@
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import struct
+import sys
+from typing import Iterator, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+# Флаги событий (linux/inotify.h)
+IN_ACCESS = 0x00000001
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_UNMOUNT = 0x00002000
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+# Значения из заголовков Linux: os.O_NONBLOCK нет на Windows, а модуль должен импортироваться везде
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# Любое изменение списка записей папки или их атрибутов
+DIR_CHANGES = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+               | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+class Event(NamedTuple):
+    wd: int
+    mask: int
+    cookie: int
+    name: str
+
+def _load_libc():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+_libc = _load_libc()
+
+def available() -> bool:
+    """Есть ли inotify на этой платформе"""
+    return _libc is not None
+
+class Inotify:
+    """
+    Тонкая обертка над inotify через ctypes (без внешних зависимостей).
+    Дескриптор можно читать блокирующе из отдельного потока (read_events)
+    или подключить к циклу событий через loop.add_reader(fileno(), ...)
+    при nonblocking=True.
+    """
+
+    def __init__(self, nonblocking: bool = False):
+        if _libc is None:
+            raise OSError(errno.ENOSYS, 'inotify недоступен')
+        flags = IN_CLOEXEC | (IN_NONBLOCK if nonblocking else 0)
+        self.fd = _libc.inotify_init1(flags)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+    def fileno(self) -> int:
+        return self.fd
+
+    def add_watch(self, path: str, mask: int) -> int:
+        """Добавляет наблюдение, возвращает дескриптор (wd)"""
+        wd = _libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def rm_watch(self, wd: int):
+        # Ошибку игнорируем: наблюдение могло быть снято ядром (IN_IGNORED)
+        _libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self, size: int = 64 * 1024) -> Iterator[Event]:
+        """Читает и разбирает пачку событий"""
+        try:
+            data = os.read(self.fd, size)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            yield Event(wd, mask, cookie, os.fsdecode(name))
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+def create(nonblocking: bool = False) -> Optional[Inotify]:
+    """Экземпляр Inotify или None, если inotify недоступен или исчерпан лимит"""
+    if _libc is None:
+        return None
+    try:
+        return Inotify(nonblocking)
+    except OSError as e:
+        logger.warning(f"inotify недоступен: {e}")
+        return None
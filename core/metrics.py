@@ -0,0 +1,74 @@
+import threading
+from typing import Dict
+
+class TransferStats:
+    """Счетчики передач одного вида"""
+
+    __slots__ = ('bytes', 'transfers', 'failures', 'seconds', 'active')
+
+    def __init__(self):
+        self.bytes = 0
+        self.transfers = 0
+        self.failures = 0
+        self.seconds = 0.0
+        self.active = 0
+
+class Metrics:
+    """
+    Метрики передачи файлов в памяти процесса: объем, количество
+    завершенных и неудачных передач, средняя скорость по видам
+    (upload_telegram, upload_external и т.д., host:<имя> - по файлообменникам).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, TransferStats] = {}
+
+    def _get(self, kind: str) -> TransferStats:
+        if kind not in self._stats:
+            self._stats[kind] = TransferStats()
+        return self._stats[kind]
+
+    def transfer_started(self, kind: str):
+        with self._lock:
+            self._get(kind).active += 1
+
+    def add_bytes(self, kind: str, nbytes: int):
+        with self._lock:
+            self._get(kind).bytes += nbytes
+
+    def transfer_finished(self, kind: str, seconds: float, ok: bool = True):
+        with self._lock:
+            stats = self._get(kind)
+            stats.active = max(stats.active - 1, 0)
+            stats.seconds += seconds
+            if ok:
+                stats.transfers += 1
+            else:
+                stats.failures += 1
+
+    def transfer_aborted(self, kind: str):
+        """Передача отменена без результата (например, проигравшая в гонке загрузок)"""
+        with self._lock:
+            stats = self._get(kind)
+            stats.active = max(stats.active - 1, 0)
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Копия счетчиков для вывода"""
+        with self._lock:
+            return {
+                kind: {
+                    'bytes': stats.bytes,
+                    'transfers': stats.transfers,
+                    'failures': stats.failures,
+                    'active': stats.active,
+                    'average_speed': stats.bytes / stats.seconds if stats.seconds > 0 else 0.0,
+                }
+                for kind, stats in self._stats.items()
+            }
+
+_metrics = Metrics()
+
+def get_metrics() -> Metrics:
+    """Общие метрики передачи файлов"""
+    return _metrics
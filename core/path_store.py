@@ -0,0 +1,94 @@
+import secrets
+import sys
+import time
+from collections import OrderedDict
+from typing import Optional
+
+# Ограничения хранилища по умолчанию
+MAX_ENTRIES_PER_USER = 5000
+ENTRY_TTL = 6 * 3600
+
+# Длина ID в hex-символах (callback_data Telegram ограничена 64 байтами)
+ID_LENGTH = 10
+
+class PathStore:
+    """
+    Короткие ID для путей в callback_data кнопок.
+    У каждого пользователя свое пространство ID: ограниченный LRU со сроком жизни
+    записей. ID случайные и проверяются на совпадение, поэтому коллизия не
+    может подменить путь; повторное сохранение пути возвращает прежний ID.
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES_PER_USER, ttl: float = ENTRY_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # user_id -> OrderedDict(path_id -> (path, время последнего использования))
+        self._ids = {}
+        # user_id -> {path: path_id}
+        self._paths = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _namespace(self, user_id):
+        if user_id not in self._ids:
+            self._ids[user_id] = OrderedDict()
+            self._paths[user_id] = {}
+        return self._ids[user_id], self._paths[user_id]
+
+    def _expire(self, user_id, now: float):
+        """Удаляет самые старые записи: просроченные и сверх лимита"""
+        ids, paths = self._namespace(user_id)
+        while ids:
+            path_id, (path, used) = next(iter(ids.items()))
+            if len(ids) <= self.max_entries and now - used <= self.ttl:
+                break
+            del ids[path_id]
+            paths.pop(path, None)
+            self.evictions += 1
+
+    def store(self, path: str, user_id=None) -> str:
+        """Сохраняет путь и возвращает его ID"""
+        now = time.monotonic()
+        ids, paths = self._namespace(user_id)
+        path_id = paths.get(path)
+        if path_id is None:
+            path_id = secrets.token_hex(ID_LENGTH // 2)
+            while path_id in ids:
+                path_id = secrets.token_hex(ID_LENGTH // 2)
+            paths[path] = path_id
+        ids[path_id] = (path, now)
+        ids.move_to_end(path_id)
+        self._expire(user_id, now)
+        return path_id
+
+    def get(self, path_id: str, user_id=None) -> Optional[str]:
+        """Получает путь по ID (None, если ID неизвестен или устарел)"""
+        now = time.monotonic()
+        ids, paths = self._namespace(user_id)
+        entry = ids.get(path_id)
+        if entry is None or now - entry[1] > self.ttl:
+            self.misses += 1
+            return None
+        self.hits += 1
+        ids[path_id] = (entry[0], now)
+        ids.move_to_end(path_id)
+        return entry[0]
+
+    def stats(self) -> dict:
+        """Статистика использования и приблизительный объем памяти"""
+        entries = sum(len(ids) for ids in self._ids.values())
+        memory = sum(
+            sys.getsizeof(ids) + sys.getsizeof(self._paths[user_id]) + sum(
+                sys.getsizeof(path_id) + sys.getsizeof(path) for path_id, (path, _) in ids.items()
+            )
+            for user_id, ids in self._ids.items()
+        )
+        return {
+            'users': len(self._ids),
+            'entries': entries,
+            'memory': memory,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
@@ -0,0 +1,79 @@
+import os
+import subprocess
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import List, Tuple
+
+try:
+    import pwd
+    import grp
+except ImportError:
+    # Windows
+    pwd = None
+    grp = None
+
+class Platform(ABC):
+    """
+    Особенности ОС для файлового менеджера: корневые папки, сведения
+    о владельце файла и запуск файла программой по умолчанию.
+    """
+
+    name = ''
+
+    @property
+    def title(self) -> str:
+        return f"Файловый менеджер ({self.name})"
+
+    def roots(self) -> List[str]:
+        """Корневые папки; если их несколько, сначала показывается их список"""
+        return ['/']
+
+    def file_details(self, stats: os.stat_result) -> List[str]:
+        """Строки карточки файла, зависящие от ОС"""
+        return [f"📅 Изменен: {datetime.fromtimestamp(stats.st_mtime).strftime('%Y-%m-%d %H:%M:%S')}"]
+
+    @abstractmethod
+    def launch(self, path: str) -> Tuple[bool, str]:
+        """Запуск файла программой по умолчанию (блокирующий вызов)"""
+
+class LinuxPlatform(Platform):
+    name = 'Linux'
+
+    def file_details(self, stats: os.stat_result) -> List[str]:
+        try:
+            owner = pwd.getpwuid(stats.st_uid).pw_name
+        except KeyError:
+            owner = str(stats.st_uid)
+        try:
+            group = grp.getgrgid(stats.st_gid).gr_name
+        except KeyError:
+            group = str(stats.st_gid)
+        return [
+            f"👤 Владелец: {owner}",
+            f"👥 Группа: {group}",
+            f"🔒 Права: {oct(stats.st_mode)[-3:]}",
+        ] + super().file_details(stats)
+
+    def launch(self, path: str) -> Tuple[bool, str]:
+        try:
+            subprocess.Popen(
+                ['xdg-open', path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                start_new_session=True
+            )
+            return True, "Файл успешно запущен"
+        except Exception as e:
+            return False, f"Ошибка при запуске файла: {str(e)}"
+
+class WindowsPlatform(Platform):
+    name = 'Windows'
+
+    def roots(self) -> List[str]:
+        # Диски перечисляются каждый раз: флешки и сетевые диски появляются и пропадают
+        return [f"{d}:\\" for d in "ABCDEFGHIJKLMNOPQRSTUVWXYZ" if os.path.exists(f"{d}:")]
+
+    def launch(self, path: str) -> Tuple[bool, str]:
+        try:
+            os.startfile(path)
+            return True, "Файл успешно запущен"
+        except Exception as e:
+            return False, f"Ошибка при запуске файла: {str(e)}"
@@ -0,0 +1,252 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, Optional
+
+from core.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+# Минимальный интервал между редактированиями сообщений в одном чате (сек)
+EDIT_INTERVAL = 2.0
+
+# Время, раньше которого в чат нельзя отправлять следующее редактирование
+_next_edit_time = {}
+
+def format_size(size: float) -> str:
+    """Форматирование размера в байтах"""
+    for unit in ['Б', 'КБ', 'МБ', 'ГБ']:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} ТБ"
+
+def format_duration(seconds: float) -> str:
+    """Форматирование длительности"""
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds} сек"
+    if seconds < 3600:
+        return f"{seconds // 60} мин {seconds % 60} сек"
+    return f"{seconds // 3600} ч {seconds % 3600 // 60} мин"
+
+class ProgressTracker:
+    """Учет переданных байт, мгновенной и средней скорости и оставшегося времени"""
+
+    def __init__(self, total: Optional[int] = None, window: float = 5.0):
+        self.total = total
+        self.done = 0
+        self.window = window
+        self.start_time = time.monotonic()
+        # Отсчеты (время, байт передано) за последние window секунд
+        self._samples = deque([(self.start_time, 0)])
+
+    def update(self, nbytes: int):
+        """Учитывает очередную порцию данных"""
+        self.done += nbytes
+        now = time.monotonic()
+        self._samples.append((now, self.done))
+        while len(self._samples) > 2 and now - self._samples[0][0] > self.window:
+            self._samples.popleft()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start_time
+
+    @property
+    def average_speed(self) -> float:
+        """Средняя скорость с начала передачи (байт/с)"""
+        elapsed = self.elapsed
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def speed(self) -> float:
+        """Мгновенная скорость за последнее окно (байт/с)"""
+        first_time, first_done = self._samples[0]
+        last_time, last_done = self._samples[-1]
+        if last_time - first_time < 1.0:
+            return self.average_speed
+        return (last_done - first_done) / (last_time - first_time)
+
+    @property
+    def percent(self) -> Optional[float]:
+        if not self.total:
+            return None
+        return min(self.done / self.total * 100, 100.0)
+
+    @property
+    def eta(self) -> Optional[float]:
+        """Оставшееся время в секундах по мгновенной скорости"""
+        if not self.total:
+            return None
+        speed = self.speed or self.average_speed
+        if speed <= 0:
+            return None
+        return max(self.total - self.done, 0) / speed
+
+    def render(self, title: str) -> str:
+        """Текст сообщения с прогрессом"""
+        lines = [title]
+        percent = self.percent
+        if percent is not None:
+            filled = int(percent / 10)
+            lines.append(f"[{'█' * filled}{'_' * (10 - filled)}] {percent:.1f}%")
+            lines.append(f"📦 {format_size(self.done)} из {format_size(self.total)}")
+        else:
+            lines.append(f"📦 {format_size(self.done)}")
+        lines.append(
+            f"⚡ {format_size(self.speed)}/с (в среднем {format_size(self.average_speed)}/с)"
+        )
+        eta = self.eta
+        lines.append(f"⏱ Осталось: {format_duration(eta) if eta is not None else 'неизвестно'}")
+        return "\n".join(lines)
+
+class ThrottledEditor:
+    """
+    Редактирование сообщения с ограничением частоты по чату.
+    Промежуточные обновления, не попавшие в окно, отбрасываются -
+    отправляется только последний актуальный текст.
+    """
+
+    def __init__(self, message, min_interval: float = EDIT_INTERVAL, parse_mode: Optional[str] = None):
+        self.message = message
+        self.chat_id = message.chat_id
+        self.min_interval = min_interval
+        self.parse_mode = parse_mode
+        self._last = None
+        self._pending = None
+
+    def _reserve_slot(self) -> float:
+        """Резервирует ближайшее окно для редактирования, возвращает задержку"""
+        now = time.monotonic()
+        slot = max(now, _next_edit_time.get(self.chat_id, 0))
+        _next_edit_time[self.chat_id] = slot + self.min_interval
+        return slot - now
+
+    def ready(self) -> bool:
+        """Можно ли редактировать сообщение прямо сейчас"""
+        return time.monotonic() >= _next_edit_time.get(self.chat_id, 0)
+
+    async def wait_ready(self):
+        """Ожидание окна для редактирования в этом чате"""
+        delay = _next_edit_time.get(self.chat_id, 0) - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def update(self, text: str, reply_markup=None):
+        """Обновляет сообщение, если в чате не исчерпан лимит редактирований"""
+        self._pending = (text, reply_markup)
+        if not self.ready():
+            return
+        self._reserve_slot()
+        await self._edit()
+
+    async def finish(self, text: str, reply_markup=None):
+        """Гарантированно показывает финальный текст, дожидаясь окна"""
+        self._pending = (text, reply_markup)
+        delay = self._reserve_slot()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await self._edit()
+
+    async def _edit(self):
+        pending = self._pending
+        self._pending = None
+        if pending is None or pending == self._last:
+            return
+        text, reply_markup = pending
+        try:
+            await self.message.edit_text(text, reply_markup=reply_markup, parse_mode=self.parse_mode)
+            self._last = pending
+        except Exception as e:
+            logger.error(f"Ошибка при обновлении прогресса: {e}")
+
+class CountingStream:
+    """
+    Обертка асинхронного потока байтов для FormData и отправки в Telegram.
+    Блок учитывается после того, как получатель забрал его и запросил
+    следующий, то есть по фактически переданным байтам, а не прочитанным.
+    """
+
+    def __init__(self, stream: AsyncIterable[bytes], on_chunk: Callable[[int], Awaitable]):
+        self.stream = stream
+        self.on_chunk = on_chunk
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self.stream:
+            yield chunk
+            await self.on_chunk(len(chunk))
+
+class ProgressReporter:
+    """
+    Прогресс передачи в сообщении: вызывается с количеством переданных байт
+    (как on_chunk), считает скорость и оставшееся время, обновляет сообщение
+    с учетом лимита редактирований и пишет объем в метрики.
+    footer(tracker) - дополнительная строка под прогрессом.
+    """
+
+    def __init__(self, message, title: str, total: Optional[int] = None, metric: Optional[str] = None,
+                 footer: Optional[Callable[[ProgressTracker], str]] = None):
+        self.tracker = ProgressTracker(total)
+        self.editor = ThrottledEditor(message)
+        self.title = title
+        self.metric = metric
+        self.footer = footer
+        self._finished = False
+        if metric:
+            get_metrics().transfer_started(metric)
+
+    def render(self) -> str:
+        text = self.tracker.render(self.title)
+        if self.footer:
+            text += f"\n\n{self.footer(self.tracker)}"
+        return text
+
+    async def __call__(self, nbytes: int):
+        self.tracker.update(nbytes)
+        if self.metric:
+            get_metrics().add_bytes(self.metric, nbytes)
+        if self.editor.ready():
+            await self.editor.update(self.render())
+
+    def restart(self, title: Optional[str] = None):
+        """Повторная передача с начала (например, на другой файлообменник)"""
+        self.tracker = ProgressTracker(self.tracker.total)
+        if title:
+            self.title = title
+
+    def close(self, ok: bool = True):
+        """Фиксирует завершение передачи в метриках (однократно)"""
+        if self.metric and not self._finished:
+            get_metrics().transfer_finished(self.metric, self.tracker.elapsed, ok)
+        self._finished = True
+
+    async def finish(self, text: str, ok: bool = True, reply_markup=None):
+        """Итоговое сообщение о передаче"""
+        self.close(ok)
+        await self.editor.finish(text, reply_markup)
+
+# Названия видов передач в статистике
+TRANSFER_TITLES = {
+    'upload_telegram': '📤 В Telegram',
+    'upload_external': '☁️ На файлообменник',
+    'download_telegram': '📥 Из Telegram',
+}
+
+def format_transfer_stats() -> str:
+    """Блок статистики передач файлов для /files stats (пусто, если передач не было)"""
+    snapshot = get_metrics().snapshot()
+    if not snapshot:
+        return ''
+    lines = ['\n\n📈 Передачи']
+    # Сначала общие виды передач, затем файлообменники
+    for kind, stats in sorted(snapshot.items(), key=lambda item: (item[0].startswith('host:'), item[0])):
+        active = f", ⏳ {stats['active']}" if stats['active'] else ''
+        title = f"🌐 {kind[5:]}" if kind.startswith('host:') else TRANSFER_TITLES.get(kind, kind)
+        lines.append(
+            f"{title}: {format_size(stats['bytes'])}, "
+            f"✅ {stats['transfers']}, ❌ {stats['failures']}{active}, "
+            f"⚡️ {format_size(int(stats['average_speed']))}/с"
+        )
+    return '\n'.join(lines)
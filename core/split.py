@@ -0,0 +1,106 @@
+import hashlib
+import json
+import os
+from typing import AsyncIterable, Awaitable, Callable, List, Optional, Tuple
+
+from core import delivery, fs
+from core.streams import iter_file
+
+# Способы отправки файлов больше max_file_size (параметр large_file_mode в config.json)
+MODE_EXTERNAL = 'external'
+MODE_SPLIT = 'split'
+
+# Больше частей не отправляем - такой файл уходит на файлообменник
+MAX_PARTS = 100
+
+# Скрипт сборки: проверяет контрольные суммы частей и всего файла
+JOIN_SCRIPT = '''#!/usr/bin/env python3
+"""Сборка файла из частей: python3 {script} [путь к {manifest}]"""
+import hashlib
+import json
+import os
+import sys
+
+manifest_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), {manifest!r})
+with open(manifest_path, encoding='utf-8') as f:
+    manifest = json.load(f)
+base = os.path.dirname(os.path.abspath(manifest_path))
+target = os.path.join(base, manifest['name'])
+whole = hashlib.sha256()
+with open(target + '.tmp', 'wb') as out:
+    for part in manifest['parts']:
+        digest = hashlib.sha256()
+        with open(os.path.join(base, part['name']), 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+                whole.update(chunk)
+                out.write(chunk)
+        if digest.hexdigest() != part['sha256']:
+            sys.exit('Часть повреждена: ' + part['name'])
+if whole.hexdigest() != manifest['sha256']:
+    sys.exit('Контрольная сумма файла не совпадает')
+os.replace(target + '.tmp', target)
+print('Готово: ' + target)
+'''
+
+def plan_parts(size: int, part_size: int) -> List[Tuple[int, int]]:
+    """Диапазоны частей файла: (смещение, длина)"""
+    return [(offset, min(part_size, size - offset)) for offset in range(0, size, part_size)]
+
+def can_split(size: int, part_size: int) -> bool:
+    """Разумно ли отправлять файл частями"""
+    return part_size > 0 and (size + part_size - 1) // part_size <= MAX_PARTS
+
+async def _hashed(stream: AsyncIterable[bytes], digests) -> AsyncIterable[bytes]:
+    """Поток байтов с подсчетом хешей по пути (хеширование в пуле потоков)"""
+    async for chunk in stream:
+        for digest in digests:
+            await fs.run(digest.update, chunk)
+        yield chunk
+
+async def _single(data: bytes) -> AsyncIterable[bytes]:
+    yield data
+
+async def send_in_parts(bot, chat_id: int, path: str, part_size: int,
+                        on_chunk: Optional[Callable[[int], Awaitable]] = None,
+                        user_id=None) -> dict:
+    """
+    Отправка файла последовательными частями не больше part_size.
+    Части читаются прямо из исходного файла по смещениям, без нарезки на диске.
+    После частей отправляются манифест с SHA-256 и скрипт сборки.
+    Возвращает манифест.
+    """
+    filename = os.path.basename(path)
+    size = os.path.getsize(path)
+    parts = plan_parts(size, part_size)
+    whole = hashlib.sha256()
+    manifest = {'name': filename, 'size': size, 'sha256': None, 'parts': []}
+
+    for number, (offset, length) in enumerate(parts, 1):
+        part_name = f"{filename}.{number:03d}"
+        digest = hashlib.sha256()
+        stream = iter_file(path, offset, length, on_chunk=on_chunk, user_id=user_id)
+        await delivery.send_stream(
+            bot, chat_id, _hashed(stream, (digest, whole)), part_name,
+            caption=f"📦 {filename}: часть {number} из {len(parts)}"
+        )
+        manifest['parts'].append({'name': part_name, 'size': length, 'sha256': digest.hexdigest()})
+    manifest['sha256'] = whole.hexdigest()
+
+    manifest_name = f"{filename}.manifest.json"
+    script_name = f"{filename}.join.py"
+    await delivery.send_stream(
+        bot, chat_id, _single(json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8')),
+        manifest_name, mime='application/json',
+        caption=f"🧾 Манифест {filename} (частей: {len(parts)}), SHA-256 {manifest['sha256']}"
+    )
+    await delivery.send_stream(
+        bot, chat_id, _single(JOIN_SCRIPT.format(script=script_name, manifest=manifest_name).encode('utf-8')),
+        script_name, mime='text/x-python',
+        caption=(
+            f"🔧 Сборка: сохраните части, манифест и скрипт в одну папку и выполните "
+            f"python3 {script_name}\n"
+            f"Без проверки сумм: cat {filename}.[0-9][0-9][0-9] > {filename}"
+        )
+    )
+    return manifest
@@ -0,0 +1,283 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import time
+from typing import Optional
+
+from core import fs
+from core.progress import format_size
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = 'config.json'
+
+# Настройки по умолчанию: размеры в байтах, возраст в секундах (0 - без ограничения)
+DEFAULT_FOLDERS = {
+    'downloads': {'max_size': 0, 'max_age': 0, 'per_user_max_size': 0},
+    'music': {'max_size': 0, 'max_age': 0, 'per_user_max_size': 0},
+}
+DEFAULT_INTERVAL = 600
+
+# Сколько места на диске оставлять свободным при сохранении файлов от пользователей
+DEFAULT_MIN_FREE_SPACE = 512 * 1024 * 1024
+
+# Недокачанные и временные файлы
+TEMP_SUFFIXES = ('.part', '.tmp', '.temp')
+
+# Незавершенные файлы старше этого возраста считаются брошенными и при работе бота
+STALE_TEMP_AGE = 24 * 3600
+
+# Недавно использованные файлы не удаляются, даже если квота превышена
+GRACE_PERIOD = 300
+
+# Служебные файлы, которые нельзя удалять
+PROTECTED_NAMES = {'.download_index.json', 'download_log.txt'}
+
+class StorageManager:
+    """
+    Учет занятого места в папках загрузок и фоновая очистка:
+    квоты по размеру папки и пользователя, максимальный возраст файлов,
+    удаление давно не использованных файлов (LRU) и брошенных временных файлов.
+    Подпапка с числовым именем (music/<chat_id>) считается папкой пользователя.
+    """
+
+    def __init__(self, folders: Optional[dict] = None, interval: int = DEFAULT_INTERVAL,
+                 min_free_space: int = DEFAULT_MIN_FREE_SPACE):
+        self.folders = {}
+        for path, limits in (folders or DEFAULT_FOLDERS).items():
+            self.folders[path] = {**DEFAULT_FOLDERS['downloads'], **limits}
+        self.interval = interval
+        self.min_free_space = min_free_space
+        self.usage = {}
+        self._pending_removals = set()
+
+    @classmethod
+    def from_config(cls, config: dict) -> 'StorageManager':
+        """Создание по секции storage из config.json"""
+        storage = config.get('storage', {})
+        folders = dict(storage.get('folders', DEFAULT_FOLDERS))
+        # Папка загрузок может быть переименована в основных настройках
+        download_folder = config.get('download_folder', 'downloads')
+        if download_folder != 'downloads' and 'downloads' in folders:
+            folders[download_folder] = folders.pop('downloads')
+        return cls(
+            folders,
+            storage.get('interval', DEFAULT_INTERVAL),
+            storage.get('min_free_space', DEFAULT_MIN_FREE_SPACE)
+        )
+
+    def touch(self, path: str):
+        """Отмечает использование файла (время доступа служит ключом LRU)"""
+        try:
+            stats = os.stat(path)
+            os.utime(path, (time.time(), stats.st_mtime))
+        except OSError:
+            pass
+
+    def discard(self, path: str):
+        """Удаляет файл, при ошибке повторяет попытку при следующей очистке"""
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except OSError as e:
+            logger.warning(f"Не удалось удалить {path}, повторим при очистке: {e}")
+            self._pending_removals.add(path)
+
+    def check_space(self, directory: str, size: int) -> Optional[str]:
+        """
+        Можно ли сохранить в папку файл размером size (блокирующий вызов):
+        None - можно, иначе причина отказа. Учитываются свободное место
+        на диске и квоты папки загрузок, если файл попадает в нее: для папки
+        пользователя - вместе с уже занятым им местом.
+        """
+        free = shutil.disk_usage(directory).free
+        if size + self.min_free_space > free:
+            return f"Недостаточно места на диске: свободно {format_size(free)}"
+        directory = os.path.abspath(directory)
+        for root, limits in self.folders.items():
+            root = os.path.abspath(root)
+            try:
+                if os.path.commonpath([root, directory]) != root:
+                    continue
+            except ValueError:
+                # Разные диски Windows
+                continue
+            if limits['max_size'] and size > limits['max_size']:
+                return f"Файл больше квоты папки {os.path.basename(root)} ({format_size(limits['max_size'])})"
+            if not limits['per_user_max_size'] or directory == root:
+                continue
+            # Папка пользователя - первая подпапка с числовым именем, как в _scan
+            user = os.path.relpath(directory, root).split(os.sep)[0]
+            if not user.isdigit():
+                continue
+            used = sum(group['size'] for group in self._scan(os.path.join(root, user)).values())
+            if used + size > limits['per_user_max_size']:
+                return (
+                    f"Превышена квота пользователя: занято {format_size(used)} "
+                    f"из {format_size(limits['per_user_max_size'])}"
+                )
+        return None
+
+    def _scan(self, root: str) -> dict:
+        """Группы жестких ссылок папки: inode -> пути, размер, время использования, владелец"""
+        groups = {}
+        for dirpath, dirnames, filenames in os.walk(root):
+            relative = os.path.relpath(dirpath, root)
+            first = relative.split(os.sep)[0]
+            user = first if first.isdigit() else None
+            for name in filenames:
+                if name in PROTECTED_NAMES:
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    stats = os.lstat(path)
+                except OSError:
+                    continue
+                key = (stats.st_dev, stats.st_ino)
+                group = groups.get(key)
+                if group is None:
+                    group = groups[key] = {
+                        'paths': [],
+                        'size': stats.st_size,
+                        'last_used': max(stats.st_atime, stats.st_mtime),
+                        'user': user,
+                        'temp': name.endswith(TEMP_SUFFIXES),
+                    }
+                group['paths'].append(path)
+        return groups
+
+    def _evict(self, group: dict) -> bool:
+        """Удаляет все ссылки на файл"""
+        removed = True
+        for path in group['paths']:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Не удалось удалить {path}: {e}")
+                removed = False
+        return removed
+
+    def _remove_empty_dirs(self, root: str):
+        for dirpath, dirnames, filenames in os.walk(root, topdown=False):
+            if dirpath != root and not os.listdir(dirpath):
+                try:
+                    os.rmdir(dirpath)
+                except OSError:
+                    pass
+
+    def _clean_folder(self, root: str, limits: dict, startup: bool = False) -> dict:
+        """Применяет квоты к одной папке, возвращает статистику"""
+        now = time.time()
+        groups = self._scan(root)
+        evicted = 0
+        freed = 0
+
+        def evict(group):
+            nonlocal evicted, freed
+            if self._evict(group):
+                evicted += 1
+                freed += group['size']
+                group['evicted'] = True
+
+        # Брошенные временные файлы: все при запуске, старые - при работе
+        for group in groups.values():
+            if group['temp'] and (startup or now - group['last_used'] > STALE_TEMP_AGE):
+                evict(group)
+
+        candidates = sorted(
+            (g for g in groups.values() if not g.get('evicted') and now - g['last_used'] > GRACE_PERIOD),
+            key=lambda g: g['last_used']
+        )
+
+        # Файлы старше допустимого возраста
+        if limits['max_age']:
+            for group in candidates:
+                if now - group['last_used'] > limits['max_age']:
+                    evict(group)
+
+        # Квота пользователя
+        users = {}
+        for group in groups.values():
+            if not group.get('evicted') and group['user']:
+                users[group['user']] = users.get(group['user'], 0) + group['size']
+        if limits['per_user_max_size']:
+            for group in candidates:
+                user = group['user']
+                if not group.get('evicted') and user and users[user] > limits['per_user_max_size']:
+                    evict(group)
+                    users[user] -= group['size']
+
+        # Квота папки
+        total = sum(g['size'] for g in groups.values() if not g.get('evicted'))
+        if limits['max_size']:
+            for group in candidates:
+                if total <= limits['max_size']:
+                    break
+                if not group.get('evicted'):
+                    evict(group)
+                    total -= group['size']
+                    if group['user']:
+                        users[group['user']] -= group['size']
+
+        if evicted:
+            self._remove_empty_dirs(root)
+        return {
+            'total': total,
+            'files': sum(1 for g in groups.values() if not g.get('evicted')),
+            'users': users,
+            'evicted': evicted,
+            'freed': freed,
+        }
+
+    def clean(self, startup: bool = False) -> dict:
+        """Полный проход очистки по всем папкам (блокирующий)"""
+        for path in list(self._pending_removals):
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+                self._pending_removals.discard(path)
+            except OSError as e:
+                logger.warning(f"Повторное удаление {path} не удалось: {e}")
+        for root, limits in self.folders.items():
+            if not os.path.isdir(root):
+                continue
+            try:
+                stats = self._clean_folder(root, limits, startup)
+            except Exception as e:
+                logger.error(f"Ошибка при очистке папки {root}: {e}")
+                continue
+            self.usage[root] = stats
+            if stats['evicted']:
+                logger.info(f"Очистка {root}: удалено файлов {stats['evicted']}, освобождено {stats['freed']} байт")
+        return self.usage
+
+    async def run(self):
+        """Фоновая очистка: сразу при запуске и затем каждые interval секунд"""
+        startup = True
+        while True:
+            try:
+                await fs.run(self.clean, startup)
+            except Exception as e:
+                logger.error(f"Ошибка фоновой очистки: {e}")
+            startup = False
+            await asyncio.sleep(self.interval)
+
+_manager = None
+
+def get_storage_manager(config: Optional[dict] = None) -> StorageManager:
+    """Общий менеджер хранилища (при первом вызове создается по config или config.json)"""
+    global _manager
+    if _manager is None and config is not None:
+        _manager = StorageManager.from_config(config)
+    elif _manager is None:
+        try:
+            with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
+                _manager = StorageManager.from_config(json.load(f))
+        except Exception as e:
+            logger.error(f"Не удалось прочитать настройки хранилища: {e}")
+            _manager = StorageManager()
+    return _manager
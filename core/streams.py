@@ -0,0 +1,33 @@
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from core import fs
+from core.bandwidth import get_shaper
+
+# Размер блока при чтении файлов для отправки
+CHUNK_SIZE = 256 * 1024
+
+async def iter_file(path: str, offset: int = 0, length: Optional[int] = None,
+                    chunk_size: int = CHUNK_SIZE,
+                    on_chunk: Optional[Callable[[int], Awaitable]] = None,
+                    user_id=None) -> AsyncIterator[bytes]:
+    """
+    Потоковое чтение файла (или его диапазона) для отправки блоками без загрузки в память.
+    Чтение выполняется в пуле потоков, чтобы не блокировать цикл событий,
+    скорость ограничивается общим лимитером отправок.
+    """
+    shaper = get_shaper()
+    remaining = length
+    with open(path, 'rb') as f:
+        if offset:
+            f.seek(offset)
+        while remaining is None or remaining > 0:
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+            chunk = await fs.run(f.read, size)
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            await shaper.throttle(len(chunk), 'upload', user_id)
+            if on_chunk:
+                await on_chunk(len(chunk))
+            yield chunk
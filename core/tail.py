@@ -0,0 +1,306 @@
+import asyncio
+import codecs
+import html
+import logging
+import os
+import secrets
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, Optional, Set
+
+from core import fs, inotify
+from core.progress import ThrottledEditor
+from core.text_view import BOM_ENCODINGS, detect_encoding
+
+logger = logging.getLogger(__name__)
+
+# Сколько строк помнить и сколько символов показывать в сообщении
+MAX_LINES = 200
+MESSAGE_CHARS = 3500
+
+# С какого объема от конца файла начинается слежение
+INITIAL_BYTES = 16 * 1024
+
+# Больше этого за одно обновление не читаем: при резком росте файла важен только хвост
+MAX_READ = 256 * 1024
+
+# Как часто обновлять сообщение (секунды); изменения между обновлениями объединяются
+EDIT_INTERVAL = 3.0
+
+# Слежение останавливается, если файл не менялся столько секунд
+IDLE_TIMEOUT = 10 * 60
+
+# Интервал проверки файлов, если inotify недоступен
+POLL_INTERVAL = 2.0
+
+# Ограничения одновременных слежений
+MAX_TAILS = 20
+MAX_TAILS_PER_USER = 3
+
+FILE_EVENTS = inotify.IN_MODIFY | inotify.IN_ATTRIB | inotify.IN_MOVE_SELF | inotify.IN_DELETE_SELF
+DIR_EVENTS = inotify.IN_CREATE | inotify.IN_MOVED_TO
+
+class TailLimitError(Exception):
+    """Превышено число одновременных слежений"""
+
+class LogTail:
+    """
+    Слежение за дописываемым файлом: читаются только новые байты,
+    последние строки хранятся в ограниченном кольце, сообщение
+    обновляется не чаще EDIT_INTERVAL (изменения за это время
+    объединяются в одно редактирование). Замена файла (ротация логов)
+    и усечение отслеживаются по inode и размеру.
+    """
+
+    def __init__(self, path: str, message, user_id=None, idle_timeout: float = IDLE_TIMEOUT):
+        self.id = secrets.token_hex(4)
+        self.path = path
+        self.name = os.path.basename(path)
+        self.user_id = user_id
+        self.idle_timeout = idle_timeout
+        self.editor = ThrottledEditor(message, min_interval=EDIT_INTERVAL, parse_mode='HTML')
+        self.lines = deque(maxlen=MAX_LINES)
+        self.partial = ''
+        self.received = 0
+        self.inode = None
+        self.offset = 0
+        self.decoder = None
+        self.stopped = False
+        self.stop_reason = None
+        self.last_change = time.monotonic()
+        self._changed = asyncio.Event()
+
+    def _open_at(self, stats: os.stat_result, offset: int):
+        """Начало чтения файла с offset (новый файл, ротация или усечение)"""
+        with open(self.path, 'rb') as f:
+            encoding = detect_encoding(f.read(INITIAL_BYTES))
+        self.decoder = codecs.getincrementaldecoder(BOM_ENCODINGS.get(encoding, (0, encoding))[1])(errors='replace')
+        self.inode = (stats.st_dev, stats.st_ino)
+        self.offset = max(offset, BOM_ENCODINGS.get(encoding, (0,))[0])
+        self.partial = ''
+
+    def start_position(self):
+        """Подготовка: последние строки файла (блокирующий вызов)"""
+        stats = os.stat(self.path)
+        start = max(stats.st_size - INITIAL_BYTES, 0)
+        self._open_at(stats, start)
+        self._read_new(skip_partial=start > 0)
+        # Новыми считаются только строки, дописанные после начала слежения
+        self.received = 0
+
+    def _append(self, data: bytes, skip_partial: bool = False):
+        text = self.partial + self.decoder.decode(data)
+        lines = text.split('\n')
+        self.partial = lines.pop()
+        if skip_partial and lines:
+            # Начали с середины строки - первая строка неполная
+            lines.pop(0)
+        self.lines.extend(line.rstrip('\r') for line in lines)
+        self.received += len(lines)
+
+    def _read_new(self, skip_partial: bool = False) -> bool:
+        """Чтение дописанных байт (блокирующий вызов); True - были изменения"""
+        try:
+            stats = os.stat(self.path)
+        except FileNotFoundError:
+            # Файл переименован при ротации, новый еще не создан
+            return False
+        changed = False
+        if (stats.st_dev, stats.st_ino) != self.inode:
+            self._open_at(stats, 0)
+            self.lines.append('--- файл заменен ---')
+            changed = True
+        elif stats.st_size < self.offset:
+            self._open_at(stats, 0)
+            self.lines.append('--- файл усечен ---')
+            changed = True
+        if stats.st_size > self.offset + MAX_READ:
+            # Слишком много нового: берем только хвост
+            self.offset = stats.st_size - MAX_READ
+            self.decoder.reset()
+            self.partial = ''
+            self.lines.append('--- пропущено ---')
+            skip_partial = True
+        if stats.st_size == self.offset:
+            return changed
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read(stats.st_size - self.offset)
+        self.offset += len(data)
+        self._append(data, skip_partial)
+        return True
+
+    def render(self) -> str:
+        """Текст сообщения: последние строки, которые помещаются в сообщение (parse_mode HTML)"""
+        shown = []
+        chars = 0
+        tail = list(self.lines) + ([self.partial] if self.partial else [])
+        for line in reversed(tail):
+            if chars + len(line) + 1 > MESSAGE_CHARS:
+                break
+            shown.append(line)
+            chars += len(line) + 1
+        if self.stopped:
+            status = f"⏹ {self.stop_reason}"
+        else:
+            status = f"📡 Обновлено {datetime.now().strftime('%H:%M:%S')}"
+        return (
+            f"📄 <b>{html.escape(self.name)}</b>\n"
+            f"{status} · новых строк: {self.received}\n"
+            f"<pre>{html.escape(chr(10).join(reversed(shown))) or ' '}</pre>"
+        )
+
+    def notify(self):
+        """Файл изменился (вызывается наблюдателем)"""
+        self._changed.set()
+
+    def stop(self, reason: str = "Слежение остановлено"):
+        self.stopped = True
+        self.stop_reason = reason
+        self._changed.set()
+
+    async def run(self, reply_markup=None, final_markup=None, on_rotate=None):
+        """Цикл слежения до остановки или простоя; on_rotate(tail) - файл заменен новым"""
+        await self.editor.finish(self.render(), reply_markup)
+        while not self.stopped:
+            idle_left = self.idle_timeout - (time.monotonic() - self.last_change)
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=max(idle_left, 0))
+            except asyncio.TimeoutError:
+                self.stop(f"Остановлено: файл не менялся {int(self.idle_timeout // 60)} мин")
+                break
+            # Изменения, пришедшие до окна редактирования, попадут в одно обновление
+            await self.editor.wait_ready()
+            if self.stopped:
+                break
+            self._changed.clear()
+            inode = self.inode
+            try:
+                changed = await fs.run(self._read_new)
+            except (OSError, ValueError) as e:
+                self.stop(f"Остановлено: ошибка чтения ({e})")
+                break
+            if self.inode != inode and on_rotate:
+                on_rotate(self)
+            if changed:
+                self.last_change = time.monotonic()
+                await self.editor.finish(self.render(), reply_markup)
+        await self.editor.finish(self.render(), final_markup)
+
+class TailWatcher:
+    """
+    Общий наблюдатель для всех слежений: один дескриптор inotify в цикле
+    событий, одно наблюдение на файл (и на его папку - для ротации)
+    независимо от числа слежений. Без inotify файлы проверяются опросом.
+    """
+
+    def __init__(self):
+        self.tails: Dict[str, LogTail] = {}
+        self._inotify = None
+        self._watches: Dict[int, Set[str]] = {}
+        self._tail_watches: Dict[str, tuple] = {}
+        self._poller = None
+
+    def _ensure_started(self):
+        if self._inotify is not None or self._poller is not None:
+            return
+        self._inotify = inotify.create(nonblocking=True)
+        if self._inotify is not None:
+            asyncio.get_running_loop().add_reader(self._inotify.fileno(), self._on_events)
+        else:
+            self._poller = asyncio.get_running_loop().create_task(self._poll())
+
+    def _on_events(self):
+        for event in self._inotify.read_events():
+            if event.mask & inotify.IN_Q_OVERFLOW:
+                for tail in self.tails.values():
+                    tail.notify()
+                continue
+            for tail_id in list(self._watches.get(event.wd, ())):
+                tail = self.tails.get(tail_id)
+                # События папки интересны только для имени отслеживаемого файла
+                if tail is not None and (not event.name or event.name == tail.name):
+                    tail.notify()
+            if event.mask & inotify.IN_IGNORED:
+                self._watches.pop(event.wd, None)
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(POLL_INTERVAL)
+            for tail in list(self.tails.values()):
+                tail.notify()
+
+    def _add(self, tail_id: str, path: str, mask: int) -> Optional[int]:
+        try:
+            wd = self._inotify.add_watch(path, mask)
+        except OSError as e:
+            logger.warning(f"Не удалось наблюдать за {path}: {e}")
+            return None
+        self._watches.setdefault(wd, set()).add(tail_id)
+        return wd
+
+    def _watch(self, tail: LogTail):
+        if self._inotify is None:
+            return
+        self._tail_watches[tail.id] = (
+            self._add(tail.id, tail.path, FILE_EVENTS),
+            self._add(tail.id, os.path.dirname(tail.path) or '.', DIR_EVENTS),
+        )
+
+    def _unwatch(self, tail_id: str):
+        for wd in self._tail_watches.pop(tail_id, ()):
+            users = self._watches.get(wd)
+            if users is None:
+                continue
+            users.discard(tail_id)
+            if not users:
+                del self._watches[wd]
+                self._inotify.rm_watch(wd)
+
+    def start(self, tail: LogTail) -> LogTail:
+        """Регистрация слежения (файл уже прочитан start_position)"""
+        if len(self.tails) >= MAX_TAILS:
+            raise TailLimitError("Слишком много слежений, остановите одно из них")
+        if sum(1 for t in self.tails.values() if t.user_id == tail.user_id) >= MAX_TAILS_PER_USER:
+            raise TailLimitError(f"Можно следить не больше чем за {MAX_TAILS_PER_USER} файлами одновременно")
+        self._ensure_started()
+        self.tails[tail.id] = tail
+        self._watch(tail)
+        return tail
+
+    def rewatch(self, tail: LogTail):
+        """Наблюдение за новым файлом после ротации"""
+        self._unwatch(tail.id)
+        self._watch(tail)
+
+    def finish(self, tail: LogTail):
+        self.tails.pop(tail.id, None)
+        if self._inotify is not None:
+            self._unwatch(tail.id)
+
+    async def follow(self, tail: LogTail, reply_markup=None, final_markup=None):
+        """Слежение до остановки; после ротации наблюдение переносится на новый файл"""
+        try:
+            await tail.run(reply_markup, final_markup, on_rotate=self.rewatch)
+        finally:
+            self.finish(tail)
+
+    def stop(self, tail_id: str, user_id=None) -> bool:
+        tail = self.tails.get(tail_id)
+        if tail is None or (user_id is not None and tail.user_id != user_id):
+            return False
+        tail.stop()
+        return True
+
+    def stats(self) -> dict:
+        return {'tails': len(self.tails), 'watches': len(self._watches), 'inotify': self._inotify is not None}
+
+_watcher = None
+
+def get_tail_watcher() -> TailWatcher:
+    """Общий наблюдатель слежений"""
+    global _watcher
+    if _watcher is None:
+        _watcher = TailWatcher()
+    return _watcher
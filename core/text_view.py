@@ -0,0 +1,309 @@
+import asyncio
+import codecs
+import html
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional
+
+from core import fs
+from core.progress import format_size
+
+try:
+    import charset_normalizer
+except ImportError:
+    charset_normalizer = None
+
+# Размер страницы: строк и символов (лимит сообщения Telegram 4096 с заголовком)
+PAGE_LINES = 40
+PAGE_CHARS = 3000
+
+# Больше байт на символ не бывает ни в одной поддерживаемой кодировке
+MAX_CHAR_BYTES = 4
+
+# Сколько байт просматривать для определения кодировки и двоичного файла
+SNIFF_SIZE = 64 * 1024
+
+# Шаг контрольных точек индекса строк
+INDEX_STEP = 1024 * 1024
+
+# Насколько индекс строк может дочитаться за один запрос страницы;
+# для более далеких позиций номер строки не показывается
+INDEX_BUDGET = 256 * 1024 * 1024
+
+# Сколько файлов держать в кэше
+MAX_CACHED_FILES = 32
+
+# Кодировки с BOM: длина метки и кодек для чтения текста после нее
+BOM_ENCODINGS = {'utf-8-sig': (3, 'utf-8'), 'utf-16-le': (2, 'utf-16-le'), 'utf-16-be': (2, 'utf-16-be')}
+
+# Кодировки, в которых перевод строки занимает два байта
+WIDE_NEWLINES = {'utf-16-le': b'\n\x00', 'utf-16-be': b'\x00\n'}
+
+class BinaryFileError(ValueError):
+    """Файл не похож на текстовый"""
+
+class Page(NamedTuple):
+    start: int
+    end: int
+    text: str
+    first_line: Optional[int]
+    total_lines: Optional[int]
+    size: int
+    encoding: str
+
+    @property
+    def at_start(self) -> bool:
+        return self.start <= BOM_ENCODINGS.get(self.encoding, (0,))[0]
+
+    @property
+    def at_end(self) -> bool:
+        return self.end >= self.size
+
+def detect_encoding(sample: bytes) -> str:
+    """Кодировка по началу файла: BOM, UTF-8, charset_normalizer (если установлен), cp1251"""
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if sample.startswith(codecs.BOM_UTF16_LE):
+        return 'utf-16-le'
+    if sample.startswith(codecs.BOM_UTF16_BE):
+        return 'utf-16-be'
+    if b'\0' in sample:
+        raise BinaryFileError("Бинарный файл")
+    try:
+        # Последний символ мог обрезаться границей выборки
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+    if charset_normalizer is not None:
+        best = charset_normalizer.from_bytes(sample).best()
+        if best is not None:
+            return best.encoding
+    return 'cp1251'
+
+class TextFile:
+    """
+    Текстовый файл для постраничного просмотра. Страницы читаются через mmap
+    по смещению в байтах, поэтому последняя страница файла любого размера
+    открывается сразу. Номера строк берутся из индекса контрольных точек
+    (число строк до каждого мегабайта), который достраивается по мере
+    просмотра. mmap открывается только на время чтения страницы, чтобы
+    не держать файл (в Windows открытый файл нельзя удалить).
+    """
+
+    def __init__(self, path: str, stats: os.stat_result):
+        self.path = path
+        self.mtime = stats.st_mtime_ns
+        self.size = stats.st_size
+        self.lock = threading.Lock()
+        with open(path, 'rb') as f:
+            sample = f.read(SNIFF_SIZE)
+            self.encoding = detect_encoding(sample)
+            self.newline = WIDE_NEWLINES.get(self.encoding, b'\n')
+            f.seek(max(self.size - len(self.newline), 0))
+            self.ends_with_newline = self.size >= len(self.newline) and f.read() == self.newline
+        self.origin, self.codec = BOM_ENCODINGS.get(self.encoding, (0, self.encoding))
+        # checkpoints[i] - число переводов строк до смещения i * INDEX_STEP
+        self.checkpoints: List[int] = [0]
+        # Число переводов строк во всем файле, когда индекс дошел до конца
+        self.newlines: Optional[int] = None
+
+    @property
+    def text_end(self) -> int:
+        """Конец последней строки: завершающий перевод строки не начинает новую"""
+        return self.size - len(self.newline) if self.ends_with_newline else self.size
+
+    @property
+    def total_lines(self) -> Optional[int]:
+        """Число строк, если индекс уже дочитан до конца файла"""
+        if self.newlines is None:
+            return None
+        return self.newlines + (0 if self.ends_with_newline else 1)
+
+    def _find(self, mm, start: int, end: int) -> int:
+        """Первый перевод строки в [start, end) (в UTF-16 только на границе символа)"""
+        position = mm.find(self.newline, start, end)
+        while position != -1 and (position - self.origin) % len(self.newline):
+            position = mm.find(self.newline, position + 1, end)
+        return position
+
+    def _find_back(self, mm, start: int, end: int) -> int:
+        """Последний перевод строки в [start, end)"""
+        position = mm.rfind(self.newline, start, end)
+        while position != -1 and (position - self.origin) % len(self.newline):
+            position = mm.rfind(self.newline, start, position + len(self.newline) - 1)
+        return position
+
+    def _char_boundary(self, mm, offset: int) -> int:
+        """Ближайшая граница символа не раньше offset"""
+        if len(self.newline) == 2:
+            return offset + (offset - self.origin) % 2
+        if self.codec == 'utf-8':
+            # Продолжения многобайтовых символов UTF-8 имеют вид 10xxxxxx
+            while offset < self.size and mm[offset] & 0xC0 == 0x80:
+                offset += 1
+        return offset
+
+    def _index_to(self, mm, chunk: int):
+        """Достраивает индекс строк до контрольной точки chunk (или до конца файла)"""
+        while len(self.checkpoints) <= chunk and self.newlines is None:
+            start = (len(self.checkpoints) - 1) * INDEX_STEP
+            count = self.checkpoints[-1] + mm[start:start + INDEX_STEP].count(self.newline)
+            if start + INDEX_STEP >= self.size:
+                self.newlines = count
+            else:
+                self.checkpoints.append(count)
+
+    def _line_number(self, mm, offset: int) -> Optional[int]:
+        """Номер строки (с 1), в которой находится offset; None - индекс еще не дошел"""
+        target = offset // INDEX_STEP
+        if self.newlines is None and (target - len(self.checkpoints) + 1) * INDEX_STEP > INDEX_BUDGET:
+            # Переход далеко вперед (например, в конец большого файла) индекс не строит
+            return None
+        self._index_to(mm, target)
+        if self.newlines is None and (self.size - (len(self.checkpoints) - 1) * INDEX_STEP) <= INDEX_BUDGET:
+            # До конца файла недалеко: досчитываем, чтобы показать общее число строк
+            self._index_to(mm, self.size // INDEX_STEP + 1)
+        base = target * INDEX_STEP
+        return self.checkpoints[target] + mm[base:offset].count(self.newline) + 1
+
+    def _decode(self, data: bytes) -> str:
+        return data.decode(self.codec, errors='replace').rstrip('\r')
+
+    def _page_after(self, mm, start: int, stop: Optional[int] = None) -> Page:
+        """Страница вперед от start (начала строки или продолжения длинной строки) не дальше stop"""
+        lines = []
+        chars = 0
+        position = start
+        stop = self.text_end if stop is None else min(stop, self.text_end)
+        while position < stop and len(lines) < PAGE_LINES:
+            # Строку читаем не дальше объема страницы, гигантские строки не декодируются целиком
+            limit = min(self.size, position + (PAGE_CHARS - chars) * MAX_CHAR_BYTES)
+            # Граница stop может приходиться на середину длинной строки
+            clipped = stop < self.text_end and limit >= stop
+            if clipped:
+                limit = stop
+            found = self._find(mm, position, limit)
+            line_end = found if found != -1 else limit
+            text = self._decode(mm[position:line_end])
+            if (found == -1 and limit < self.size and not clipped) or chars + len(text) > PAGE_CHARS:
+                if lines:
+                    break
+                # Одна очень длинная строка: показываем кусок, продолжение - на следующей странице
+                line_end = self._char_boundary(mm, min(self.size, position + PAGE_CHARS))
+                lines.append(self._decode(mm[position:line_end]))
+                position = line_end
+                break
+            lines.append(text)
+            chars += len(text) + 1
+            position = line_end + len(self.newline) if found != -1 else line_end
+        return Page(start, position, '\n'.join(lines), self._line_number(mm, start),
+                    self.total_lines, self.size, self.encoding)
+
+    def _page_before(self, mm, end: int) -> Page:
+        """Страница из строк, которые заканчиваются перед end"""
+        width = len(self.newline)
+        if end < self.size and end > self.origin and mm[end - width:end] != self.newline:
+            # end - середина длинной строки: предыдущая страница - предыдущий кусок этой строки
+            start = self._char_boundary(mm, max(self.origin, end - PAGE_CHARS))
+            found = self._find_back(mm, start, end)
+            return self._page_after(mm, found + width if found != -1 else start, end)
+        line_end = end - width if end - width >= self.origin and mm[end - width:end] == self.newline else end
+        start = end
+        chars = 0
+        for _ in range(PAGE_LINES):
+            if start <= self.origin:
+                break
+            search_from = max(self.origin, line_end - (PAGE_CHARS - chars) * MAX_CHAR_BYTES)
+            found = self._find_back(mm, search_from, line_end)
+            line_start = found + width if found != -1 else search_from
+            text = self._decode(mm[line_start:line_end])
+            if (found == -1 and search_from > self.origin) or chars + len(text) > PAGE_CHARS:
+                if start == end:
+                    # Хвост очень длинной строки
+                    start = self._char_boundary(mm, max(self.origin, line_end - PAGE_CHARS))
+                break
+            chars += len(text) + 1
+            start = line_start
+            line_end = line_start - width
+        # Страница заканчивается ровно там, где начинается следующая
+        return self._page_after(mm, start, end)
+
+    def _read(self, method, offset: int) -> Page:
+        with self.lock:
+            if self.size <= self.origin:
+                return Page(self.origin, self.size, '', 1, 1, self.size, self.encoding)
+            with open(self.path, 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    return method(mm, offset)
+
+    def page_after(self, start: int) -> Page:
+        """Страница с границы, полученной из предыдущей страницы (блокирующий вызов)"""
+        return self._read(self._page_after, min(max(start, self.origin), self.text_end))
+
+    def page_before(self, end: int) -> Page:
+        """Предыдущая страница перед смещением end (блокирующий вызов)"""
+        return self._read(self._page_before, min(max(end, self.origin), self.size))
+
+    def last_page(self) -> Page:
+        """Последняя страница, без чтения остального файла (блокирующий вызов)"""
+        return self._read(lambda mm, _: self._page_before(mm, self.size), self.size)
+
+class TextViewCache:
+    """Открытые для просмотра файлы по (устройство, inode); запись обновляется при смене mtime или размера"""
+
+    def __init__(self, max_files: int = MAX_CACHED_FILES):
+        self.max_files = max_files
+        self._files = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> TextFile:
+        """Файл для просмотра (блокирующий вызов); BinaryFileError для двоичных файлов"""
+        stats = os.stat(path)
+        key = (stats.st_dev, stats.st_ino)
+        with self._lock:
+            text_file = self._files.get(key)
+            if text_file is not None and text_file.mtime == stats.st_mtime_ns and text_file.size == stats.st_size:
+                self._files.move_to_end(key)
+                return text_file
+        text_file = TextFile(path, stats)
+        with self._lock:
+            self._files[key] = text_file
+            while len(self._files) > self.max_files:
+                self._files.popitem(last=False)
+        return text_file
+
+    def page(self, path: str, position: str) -> Page:
+        """
+        Страница по позиции из кнопки: 'start', 'end', '<смещение>' - вперед
+        от смещения, 'b<смещение>' - предыдущая страница (блокирующий вызов)
+        """
+        text_file = self.get(path)
+        if position == 'end':
+            return text_file.last_page()
+        if position.startswith('b'):
+            return text_file.page_before(int(position[1:]))
+        return text_file.page_after(0 if position == 'start' else int(position))
+
+    async def page_async(self, path: str, position: str, executor=None) -> Page:
+        """Страница файла без блокировки цикла событий"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor or fs.get_executor(), self.page, path, position)
+
+def render_page(page: Page, name: str) -> str:
+    """Текст сообщения со страницей файла (parse_mode HTML)"""
+    if page.first_line is not None:
+        last_line = page.first_line + max(page.text.count('\n'), 0)
+        position = f"Строки {page.first_line}–{last_line}"
+        if page.total_lines is not None:
+            position += f" из {page.total_lines}"
+    else:
+        position = f"Позиция {format_size(page.start)}"
+    percent = page.end * 100 // page.size if page.size else 100
+    return (
+        f"📄 <b>{html.escape(name)}</b>\n"
+        f"📍 {position} · {percent}% · {format_size(page.size)} · {page.encoding}\n"
+        f"<pre>{html.escape(page.text) or ' '}</pre>"
+    )
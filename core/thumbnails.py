@@ -0,0 +1,211 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional
+
+from core import fs
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+    ImageOps = None
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = 'config.json'
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tif', '.tiff'}
+
+# Сторона превью в пикселях и качество JPEG
+THUMBNAIL_SIZE = 320
+JPEG_QUALITY = 80
+
+# Общий объем кэша превью на диске
+MAX_CACHE_SIZE = 64 * 1024 * 1024
+
+# Изображения больше этого не уменьшаем
+MAX_SOURCE_SIZE = 100 * 1024 * 1024
+
+# Сколько неудачных файлов помнить, чтобы не пытаться снова
+MAX_FAILED = 1000
+
+def is_image(name: str) -> bool:
+    return os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+
+def thumbnail_key(path: str, stats: os.stat_result) -> str:
+    """Ключ превью: путь, время изменения и размер файла"""
+    raw = f"{os.path.abspath(path)}\0{stats.st_mtime_ns}\0{stats.st_size}"
+    return hashlib.sha1(raw.encode('utf-8', 'surrogateescape')).hexdigest()
+
+def _render(src: str, dst: str, size: int) -> int:
+    """Создание превью (выполняется в пуле процессов); возвращает размер файла превью"""
+    with Image.open(src) as image:
+        # Для JPEG декодирование сразу в уменьшенном масштабе
+        image.draft('RGB', (size, size))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size))
+        if image.mode in ('RGBA', 'LA', 'P'):
+            # Прозрачные области - на белом фоне
+            rgba = image.convert('RGBA')
+            image = Image.new('RGB', rgba.size, 'white')
+            image.paste(rgba, mask=rgba.getchannel('A'))
+        elif image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        tmp_path = f"{dst}.{os.getpid()}.tmp"
+        try:
+            image.save(tmp_path, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+            os.replace(tmp_path, dst)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return os.path.getsize(dst)
+
+class Thumbnail(NamedTuple):
+    key: str
+    path: str
+    # file_id уже отправленного превью - повторно файл не загружается
+    file_id: Optional[str]
+
+class ThumbnailCache:
+    """
+    Кэш превью изображений на диске: <папка>/<sha1>.jpg, ключ - путь,
+    время изменения и размер исходного файла. Превью создаются в пуле
+    процессов, при превышении объема удаляются давно не использованные
+    (порядок хранится во времени изменения файлов превью).
+    """
+
+    def __init__(self, path: str = 'thumbnails', max_size: int = MAX_CACHE_SIZE,
+                 size: int = THUMBNAIL_SIZE):
+        self.dir = path
+        self.max_size = max_size
+        self.size = size
+        self.entries: 'OrderedDict[str, int]' = OrderedDict()
+        self.total = 0
+        self.file_ids: Dict[str, str] = {}
+        self._failed: 'OrderedDict[str, None]' = OrderedDict()
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._loaded = False
+
+    @classmethod
+    def from_config(cls, config: dict) -> 'ThumbnailCache':
+        section = config.get('thumbnails', {})
+        return cls(
+            path=section.get('path', 'thumbnails'),
+            max_size=section.get('max_size', MAX_CACHE_SIZE),
+            size=section.get('size', THUMBNAIL_SIZE)
+        )
+
+    @property
+    def available(self) -> bool:
+        return Image is not None
+
+    def file_path(self, key: str) -> str:
+        return os.path.join(self.dir, f"{key}.jpg")
+
+    def _load(self):
+        """Восстановление порядка LRU по существующим превью"""
+        self._loaded = True
+        os.makedirs(self.dir, exist_ok=True)
+        found = []
+        with os.scandir(self.dir) as it:
+            for item in it:
+                if not item.name.endswith('.jpg'):
+                    continue
+                try:
+                    stats = item.stat()
+                except OSError:
+                    continue
+                found.append((stats.st_mtime, item.name[:-4], stats.st_size))
+        for _, key, size in sorted(found):
+            self.entries[key] = size
+            self.total += size
+
+    def _touch(self, key: str):
+        self.entries.move_to_end(key)
+        try:
+            os.utime(self.file_path(key))
+        except OSError:
+            pass
+
+    def _add(self, key: str, size: int):
+        self.entries[key] = size
+        self.total += size
+        while self.total > self.max_size and len(self.entries) > 1:
+            old_key, old_size = self.entries.popitem(last=False)
+            self.total -= old_size
+            try:
+                os.remove(self.file_path(old_key))
+            except OSError:
+                pass
+
+    def _fail(self, key: str):
+        self._failed[key] = None
+        if len(self._failed) > MAX_FAILED:
+            self._failed.popitem(last=False)
+
+    def remember(self, key: str, file_id: str):
+        """Сохранение file_id отправленного превью"""
+        self.file_ids[key] = file_id
+
+    async def get_async(self, path: str) -> Optional[Thumbnail]:
+        """Превью изображения или None (не изображение, нет Pillow, ошибка)"""
+        if not self.available or not is_image(path):
+            return None
+        try:
+            stats = await fs.run(os.stat, path)
+            if not self._loaded:
+                await fs.run(self._load)
+        except OSError as e:
+            logger.warning(f"Превью недоступно для {path}: {e}")
+            return None
+        if stats.st_size == 0 or stats.st_size > MAX_SOURCE_SIZE:
+            return None
+        key = thumbnail_key(path, stats)
+        if key in self._failed:
+            return None
+        if key in self.entries:
+            self._touch(key)
+            return Thumbnail(key, self.file_path(key), self.file_ids.get(key))
+        if key in self.file_ids:
+            return Thumbnail(key, self.file_path(key), self.file_ids[key])
+
+        # Одно и то же превью не создается дважды параллельно
+        future = self._pending.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fs.run_in_process(
+                _render, path, self.file_path(key), self.size
+            ))
+            self._pending[key] = future
+            future.add_done_callback(lambda _: self._pending.pop(key, None))
+        try:
+            size = await asyncio.shield(future)
+        except Exception as e:
+            logger.warning(f"Не удалось создать превью {path}: {e}")
+            self._fail(key)
+            return None
+        if key not in self.entries:
+            self._add(key, size)
+        return Thumbnail(key, self.file_path(key), None)
+
+    def stats(self) -> dict:
+        return {'count': len(self.entries), 'size': self.total, 'sent': len(self.file_ids)}
+
+_cache = None
+
+def get_thumbnail_cache(config: Optional[dict] = None) -> ThumbnailCache:
+    """Общий кэш превью (при первом вызове создается по config или config.json)"""
+    global _cache
+    if _cache is None and config is not None:
+        _cache = ThumbnailCache.from_config(config)
+    elif _cache is None:
+        try:
+            with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
+                _cache = ThumbnailCache.from_config(json.load(f))
+        except Exception as e:
+            logger.error(f"Не удалось прочитать настройки превью: {e}")
+            _cache = ThumbnailCache()
+    return _cache
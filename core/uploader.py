@@ -0,0 +1,351 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import AsyncIterable, Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+import aiohttp
+
+from core.metrics import get_metrics
+from core.progress import CountingStream
+from core.streams import iter_file
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = 'config.json'
+
+# Встроенные файлообменники; в секции uploader config.json можно указать их имена
+# или описать свой сервис в том же формате
+BUILTIN_HOSTS = [
+    {
+        'name': 'file.io',
+        'url': 'https://file.io/',
+        'field_name': 'file',
+        'link_key': 'link',
+        'success_key': 'success',
+        'expires_field': 'expires',
+    },
+    {
+        'name': 'tmpfiles.org',
+        'url': 'https://tmpfiles.org/api/v1/upload',
+        'field_name': 'file',
+        'link_key': 'data.url',
+        'success_key': 'status',
+        # API возвращает ссылку на страницу, прямая ссылка - через /dl/
+        'link_replace': ['tmpfiles.org/', 'tmpfiles.org/dl/'],
+    },
+]
+
+# Настройки по умолчанию (секция uploader в config.json)
+DEFAULT_HOSTS = ['file.io', 'tmpfiles.org']
+DEFAULT_RACE_BELOW = 20 * 1024 * 1024
+DEFAULT_EXPIRES = '30m'
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
+    'Accept': '*/*',
+}
+
+# Соединение и пауза между блоками ответа; общий таймаут не ограничен - файлы большие
+TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=300)
+
+# Пауза после ошибки удваивается с каждой ошибкой подряд
+COOLDOWN = 60
+MAX_COOLDOWN = 30 * 60
+
+# Вес нового замера в сглаженной скорости
+SPEED_SMOOTHING = 0.3
+
+# Скорость сервиса, для которого еще нет замеров (байт/с)
+UNKNOWN_SPEED = 1024 * 1024
+
+class UploadError(Exception):
+    """Ошибка загрузки на файлообменник"""
+
+class UploadResult(NamedTuple):
+    link: str
+    host: str
+    size: int
+    seconds: float
+
+def _lookup(data, key: str):
+    """Значение по пути вида data.url в ответе сервиса"""
+    for part in key.split('.'):
+        if not isinstance(data, dict):
+            return None
+        data = data.get(part)
+    return data
+
+class FileHost:
+    """Описание файлообменника: куда и в каком поле отправлять файл, где искать ссылку"""
+
+    def __init__(self, name: str, url: str, field_name: str = 'file', link_key: str = 'link',
+                 success_key: Optional[str] = None, expires_field: Optional[str] = None,
+                 link_replace: Optional[List[str]] = None, fields: Optional[dict] = None):
+        self.name = name
+        self.url = url
+        self.field_name = field_name
+        self.link_key = link_key
+        self.success_key = success_key
+        self.expires_field = expires_field
+        self.link_replace = link_replace
+        self.fields = fields or {}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'FileHost':
+        return cls(
+            data['name'], data['url'], data.get('field_name', 'file'), data.get('link_key', 'link'),
+            data.get('success_key'), data.get('expires_field'), data.get('link_replace'), data.get('fields')
+        )
+
+    def form(self, stream: AsyncIterable[bytes], filename: str, expires: Optional[str]) -> aiohttp.FormData:
+        data = aiohttp.FormData()
+        data.add_field(self.field_name, stream, filename=filename)
+        for name, value in self.fields.items():
+            data.add_field(name, str(value))
+        if self.expires_field and expires:
+            data.add_field(self.expires_field, expires)
+        return data
+
+    def parse(self, result) -> str:
+        """Ссылка из ответа сервиса"""
+        if self.success_key and _lookup(result, self.success_key) not in (True, 'success', 'ok'):
+            raise UploadError(f"{self.name}: {_lookup(result, 'message') or result}")
+        link = _lookup(result, self.link_key)
+        if not isinstance(link, str) or not link:
+            raise UploadError(f"{self.name}: в ответе нет ссылки")
+        if self.link_replace:
+            link = link.replace(*self.link_replace, 1)
+        return link
+
+class HostHealth:
+    """Состояние файлообменника: успехи и ошибки, сглаженная скорость, пауза после ошибок"""
+
+    __slots__ = ('successes', 'failures', 'consecutive_failures', 'speed', 'last_error', 'retry_at')
+
+    def __init__(self):
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.speed = 0.0
+        self.last_error = None
+        self.retry_at = 0.0
+
+    def record_success(self, nbytes: int, seconds: float):
+        self.successes += 1
+        self.consecutive_failures = 0
+        self.retry_at = 0.0
+        if seconds > 0 and nbytes > 0:
+            speed = nbytes / seconds
+            self.speed = speed if not self.speed else self.speed + SPEED_SMOOTHING * (speed - self.speed)
+
+    def record_failure(self, error: str):
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.last_error = error
+        self.retry_at = time.monotonic() + min(COOLDOWN * 2 ** (self.consecutive_failures - 1), MAX_COOLDOWN)
+
+    def available(self) -> bool:
+        return time.monotonic() >= self.retry_at
+
+    def score(self) -> float:
+        """Ожидаемая полезность: доля успехов (со сглаживанием) на скорость"""
+        reliability = (self.successes + 1) / (self.successes + self.failures + 2)
+        return reliability * (self.speed or UNKNOWN_SPEED)
+
+class _Progress:
+    """
+    Прогресс по самой продвинутой попытке: при гонке двух сервисов
+    наружу сообщается только прирост лидера.
+    """
+
+    def __init__(self, on_chunk: Optional[Callable[[int], Awaitable]]):
+        self.on_chunk = on_chunk
+        self.reported = 0
+
+    def restart(self):
+        self.reported = 0
+
+    def attempt(self) -> '_AttemptCounter':
+        return _AttemptCounter(self)
+
+class _AttemptCounter:
+    def __init__(self, progress: _Progress):
+        self.progress = progress
+        self.sent = 0
+
+    async def __call__(self, nbytes: int):
+        self.sent += nbytes
+        progress = self.progress
+        if self.sent > progress.reported:
+            delta = self.sent - progress.reported
+            progress.reported = self.sent
+            if progress.on_chunk:
+                await progress.on_chunk(delta)
+
+class Uploader:
+    """
+    Загрузка файлов на файлообменники. Сервисы упорядочиваются по состоянию
+    (доля успешных загрузок и скорость), после ошибки сервис уходит на паузу
+    и следующая попытка идет на другой. Небольшие файлы можно загружать
+    на два сервиса одновременно: побеждает первый ответ, вторая загрузка
+    отменяется. Объем и скорость по сервисам пишутся в метрики host:<имя>.
+    """
+
+    def __init__(self, hosts: Optional[List[FileHost]] = None, race_below: int = DEFAULT_RACE_BELOW):
+        self.hosts: Dict[str, FileHost] = {}
+        self.health: Dict[str, HostHealth] = {}
+        self.race_below = race_below
+        for host in hosts if hosts is not None else [FileHost.from_dict(h) for h in BUILTIN_HOSTS]:
+            self.register(host)
+
+    @classmethod
+    def from_config(cls, config: dict) -> 'Uploader':
+        """Создание по секции uploader из config.json"""
+        settings = config.get('uploader', {})
+        builtin = {h['name']: h for h in BUILTIN_HOSTS}
+        hosts = []
+        for item in settings.get('hosts', DEFAULT_HOSTS):
+            if isinstance(item, dict):
+                hosts.append(FileHost.from_dict(item))
+            elif item in builtin:
+                hosts.append(FileHost.from_dict(builtin[item]))
+            else:
+                logger.warning(f"Неизвестный файлообменник в настройках: {item}")
+        return cls(hosts, settings.get('race_below', DEFAULT_RACE_BELOW))
+
+    def register(self, host: FileHost):
+        self.hosts[host.name] = host
+        self.health.setdefault(host.name, HostHealth())
+
+    def ranked(self) -> List[FileHost]:
+        """Сервисы в порядке попыток: доступные по убыванию оценки, затем стоящие на паузе"""
+        return sorted(
+            self.hosts.values(),
+            key=lambda host: (not self.health[host.name].available(), -self.health[host.name].score())
+        )
+
+    async def _attempt(self, host: FileHost, stream: AsyncIterable[bytes], filename: str,
+                       expires: Optional[str], progress: _Progress) -> UploadResult:
+        metrics = get_metrics()
+        kind = f"host:{host.name}"
+        counter = progress.attempt()
+        started = time.monotonic()
+        metrics.transfer_started(kind)
+        try:
+            async with aiohttp.ClientSession(headers=HEADERS, timeout=TIMEOUT) as session:
+                form = host.form(CountingStream(stream, counter), filename, expires)
+                async with session.post(host.url, data=form) as response:
+                    if response.status != 200:
+                        raise UploadError(f"{host.name}: HTTP {response.status}")
+                    link = host.parse(await response.json(content_type=None))
+        except asyncio.CancelledError:
+            metrics.transfer_aborted(kind)
+            raise
+        except Exception as e:
+            seconds = time.monotonic() - started
+            metrics.transfer_finished(kind, seconds, ok=False)
+            self.health[host.name].record_failure(str(e))
+            logger.warning(f"Не удалось загрузить {filename} на {host.name}: {e}")
+            raise e if isinstance(e, UploadError) else UploadError(f"{host.name}: {e}") from e
+        seconds = time.monotonic() - started
+        metrics.add_bytes(kind, counter.sent)
+        metrics.transfer_finished(kind, seconds)
+        self.health[host.name].record_success(counter.sent, seconds)
+        logger.info(f"{filename} загружен на {host.name}: {link}")
+        return UploadResult(link, host.name, counter.sent, seconds)
+
+    async def _race(self, hosts: List[FileHost], make_stream: Callable[[], AsyncIterable[bytes]],
+                    filename: str, expires: Optional[str], progress: _Progress) -> Optional[UploadResult]:
+        """Одновременная загрузка на несколько сервисов, результат первого успешного"""
+        tasks = {
+            asyncio.create_task(self._attempt(host, make_stream(), filename, expires, progress)): host
+            for host in hosts
+        }
+        try:
+            while tasks:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    tasks.pop(task)
+                    if task.exception() is None:
+                        return task.result()
+            return None
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def upload_stream(self, make_stream: Callable[[], AsyncIterable[bytes]], filename: str,
+                            size: Optional[int] = None,
+                            on_chunk: Optional[Callable[[int], Awaitable]] = None,
+                            on_retry: Optional[Callable[[str], None]] = None,
+                            expires: Optional[str] = DEFAULT_EXPIRES) -> Optional[UploadResult]:
+        """
+        Загрузка с переключением на следующий сервис при ошибке.
+        make_stream() вызывается на каждую попытку и возвращает новый поток байтов.
+        Если размер известен и меньше race_below, первые два сервиса загружаются
+        наперегонки. on_retry(имя сервиса) вызывается перед повторной попыткой,
+        прогресс после нее считается заново.
+        """
+        hosts = self.ranked()
+        progress = _Progress(on_chunk)
+        retrying = False
+        if size is not None and size < self.race_below and len(hosts) >= 2 \
+                and self.health[hosts[1].name].available():
+            result = await self._race(hosts[:2], make_stream, filename, expires, progress)
+            if result is not None:
+                return result
+            hosts = hosts[2:]
+            retrying = True
+        for host in hosts:
+            if retrying and on_retry:
+                on_retry(host.name)
+            progress.restart()
+            retrying = True
+            try:
+                return await self._attempt(host, make_stream(), filename, expires, progress)
+            except UploadError:
+                continue
+        logger.error(f"Не удалось загрузить {filename} ни на один файлообменник")
+        return None
+
+    async def upload_file(self, path: str, on_chunk: Optional[Callable[[int], Awaitable]] = None,
+                          on_retry: Optional[Callable[[str], None]] = None,
+                          user_id=None, filename: Optional[str] = None,
+                          expires: Optional[str] = DEFAULT_EXPIRES) -> Optional[UploadResult]:
+        """Потоковая загрузка файла с диска"""
+        return await self.upload_stream(
+            lambda: iter_file(path, user_id=user_id), filename or os.path.basename(path),
+            os.path.getsize(path), on_chunk, on_retry, expires
+        )
+
+    def stats(self) -> Dict[str, dict]:
+        """Состояние сервисов в порядке попыток"""
+        now = time.monotonic()
+        return {
+            host.name: {
+                'successes': self.health[host.name].successes,
+                'failures': self.health[host.name].failures,
+                'speed': self.health[host.name].speed,
+                'paused_for': max(self.health[host.name].retry_at - now, 0.0),
+                'last_error': self.health[host.name].last_error,
+            }
+            for host in self.ranked()
+        }
+
+_uploader = None
+
+def get_uploader(config: Optional[dict] = None) -> Uploader:
+    """Общий загрузчик (при первом вызове создается по config или config.json)"""
+    global _uploader
+    if _uploader is None and config is not None:
+        _uploader = Uploader.from_config(config)
+    elif _uploader is None:
+        try:
+            with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
+                _uploader = Uploader.from_config(json.load(f))
+        except Exception as e:
+            logger.error(f"Не удалось прочитать настройки файлообменников: {e}")
+            _uploader = Uploader()
+    return _uploader
@@ -10,6 +10,9 @@ import asyncio
 from concurrent.futures import ThreadPoolExecutor
 import time
 import random
+from core.dir_watch import get_dir_watcher
+from core.file_index import get_file_index
+from core.storage import get_storage_manager
 
 # Настройка логирования
 logging.basicConfig(
@@ -59,6 +62,7 @@ class TelegramBot:
             .read_timeout(30)\
             .write_timeout(30)\
             .pool_timeout(30)\
+            .post_init(self.post_init)\
             .build()
             
         # Store config in bot_data for access from modules
@@ -71,6 +75,15 @@ class TelegramBot:
         # Загрузка модулей
         self.load_modules()
         
+    async def post_init(self, application):
+        """Запуск фоновых служб после инициализации бота"""
+        # Очистка папок загрузок: брошенные временные файлы, квоты и LRU
+        application.create_task(get_storage_manager(self.config).run())
+        # Уведомления об изменениях в папках: наблюдения восстанавливаются после перезапуска
+        application.create_task(get_dir_watcher(self.config).run(application.bot))
+        # Индекс имен для /files find строится сразу, а не при первом поиске
+        get_file_index(self.config).ensure_started()
+
     def check_user_access(self, user_id):
         """Проверка доступа пользователя"""
         return str(user_id) in self.config['allowed_users']
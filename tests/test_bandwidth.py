@@ -0,0 +1,153 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from core import bandwidth
+from core.bandwidth import MIN_RATE, RELOAD_INTERVAL, USER_IDLE_TIMEOUT, BandwidthShaper, TokenBucket
+
+class FakeTime:
+    """Часы, которые идут только по команде: задержки проверяются точно"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.slept.append(seconds)
+        self.now += seconds
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+class ClockTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeTime()
+        patcher = mock.patch.object(bandwidth, 'time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+class TokenBucketTest(ClockTest):
+    """Модель долга: запрос забирает токены сразу и возвращает время ожидания"""
+
+    def test_burst_then_debt(self):
+        bucket = TokenBucket(1000)
+        self.assertEqual(bucket.reserve(1000), 0.0)
+        self.assertAlmostEqual(bucket.reserve(500), 0.5)
+        # Долг растет: следующий ждет и свою долю, и чужую
+        self.assertAlmostEqual(bucket.reserve(500), 1.0)
+        self.clock.advance(1.0)
+        self.assertEqual(bucket.reserve(0), 0.0)
+        self.assertEqual(bucket.tokens, 0)
+
+    def test_block_larger_than_capacity_does_not_block_forever(self):
+        bucket = TokenBucket(1000)
+        self.assertAlmostEqual(bucket.reserve(3000), 2.0)
+        self.clock.advance(2.0)
+        self.assertEqual(bucket.reserve(0), 0.0)
+
+    def test_refill_is_capped(self):
+        bucket = TokenBucket(1000, burst=2000)
+        bucket.reserve(2000)
+        self.clock.advance(100)
+        self.assertEqual(bucket.reserve(2000), 0.0)
+        self.assertAlmostEqual(bucket.reserve(1), 0.001)
+
+    def test_set_rate_keeps_debt(self):
+        bucket = TokenBucket(1000)
+        bucket.reserve(3000)
+        bucket.set_rate(4000)
+        self.assertEqual(bucket.tokens, -2000)
+        self.assertAlmostEqual(bucket.reserve(0), 0.5)
+        # Меньший лимит урезает накопленный запас до новой емкости
+        self.clock.advance(10)
+        bucket.set_rate(100)
+        self.assertEqual(bucket.tokens, 100)
+
+    def test_unlimited(self):
+        bucket = TokenBucket(0)
+        self.assertEqual(bucket.reserve(10 ** 12), 0.0)
+
+    def test_idle(self):
+        bucket = TokenBucket(1000)
+        bucket.reserve(500)
+        self.assertFalse(bucket.idle(self.clock.now + USER_IDLE_TIMEOUT - 1, USER_IDLE_TIMEOUT))
+        self.assertTrue(bucket.idle(self.clock.now + USER_IDLE_TIMEOUT, USER_IDLE_TIMEOUT))
+        # Долг не погашен за время простоя - ведро остается
+        debtor = TokenBucket(1000)
+        debtor.reserve(int(1000 * USER_IDLE_TIMEOUT * 3))
+        self.assertFalse(debtor.idle(self.clock.now + USER_IDLE_TIMEOUT * 2, USER_IDLE_TIMEOUT))
+
+class BandwidthShaperTest(ClockTest):
+    """Общий, по направлениям и по пользователям лимит"""
+
+    def setUp(self):
+        super().setUp()
+        # Настройки берутся только из теста, а не из config.json репозитория
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        patcher = mock.patch.object(bandwidth, 'CONFIG_PATH', os.path.join(tmp.name, 'config.json'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_control_reserve(self):
+        shaper = BandwidthShaper({'total_limit': 1000000, 'control_reserve': 65536})
+        self.assertEqual(shaper.total.rate, 1000000 - 65536)
+        # Резерв не урезает канал ниже MIN_RATE
+        shaper.apply({'total_limit': 50000, 'control_reserve': 65536})
+        self.assertEqual(shaper.total.rate, MIN_RATE)
+        shaper.apply({'total_limit': 0})
+        self.assertEqual(shaper.total.rate, 0)
+
+    def test_delay_is_the_slowest_bucket(self):
+        shaper = BandwidthShaper({
+            'download_limit': 2000, 'per_user_download_limit': 1000, 'control_reserve': 0
+        })
+        # Ведро, которому лимит задан через apply, начинает пустым, а новое ведро пользователя - полным
+        self.clock.advance(1)
+        self.assertEqual(shaper.reserve(1000, 'download', user_id=1), 0.0)
+        # Пользовательское ведро (1000 байт/с) медленнее общего по направлению
+        self.assertAlmostEqual(shaper.reserve(1000, 'download', user_id=1), 1.0)
+        # У другого пользователя свое ведро, ждет только общее по направлению
+        self.assertAlmostEqual(shaper.reserve(1000, 'download', user_id=2), 0.5)
+        # Отправки не ограничены
+        self.assertEqual(shaper.reserve(10 ** 9, 'upload', user_id=1), 0.0)
+
+    def test_apply_updates_user_buckets(self):
+        shaper = BandwidthShaper({'per_user_upload_limit': 1000})
+        shaper.reserve(1000, 'upload', user_id=1)
+        shaper.apply({'per_user_upload_limit': 4000})
+        self.assertEqual(shaper.users[(1, 'upload')].rate, 4000)
+
+    def test_idle_user_buckets_expire(self):
+        shaper = BandwidthShaper({'per_user_download_limit': 1000})
+        shaper.reserve(500, 'download', user_id='idle')
+        # Должник: долг на три таймаута простоя
+        shaper.reserve(int(1000 * USER_IDLE_TIMEOUT * 3), 'download', user_id='debtor')
+        self.clock.advance(USER_IDLE_TIMEOUT + RELOAD_INTERVAL)
+        shaper.reserve(1, 'download', user_id='active')
+        self.assertEqual(
+            set(shaper.users), {('debtor', 'download'), ('active', 'download')}
+        )
+        # Долг сохранился: должник по-прежнему ждет
+        self.assertGreater(shaper.reserve(1, 'download', user_id='debtor'), USER_IDLE_TIMEOUT)
+
+    def test_throttle_sync_sleeps_for_delay(self):
+        shaper = BandwidthShaper({'upload_limit': 1000})
+        self.clock.advance(1)
+        shaper.throttle_sync(1000, 'upload')
+        shaper.throttle_sync(1500, 'upload')
+        self.assertEqual(len(self.clock.slept), 1)
+        self.assertAlmostEqual(self.clock.slept[0], 1.5)
+
+    def test_reload_from_config(self):
+        with open(bandwidth.CONFIG_PATH, 'w', encoding='utf-8') as f:
+            f.write('{"bandwidth": {"download_limit": 5000, "unknown": 1}}')
+        shaper = BandwidthShaper()
+        self.assertEqual(shaper.directions['download'].rate, 0)
+        shaper.reload_if_changed()
+        self.assertEqual(shaper.directions['download'].rate, 5000)
+        self.assertNotIn('unknown', shaper.limits)
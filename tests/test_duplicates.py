@@ -0,0 +1,160 @@
+import os
+import tempfile
+import types
+import unittest
+from unittest import mock
+
+from core import duplicates
+from core.duplicates import SMALL_FILE_SIZE, DuplicateGroup, DuplicateSearch, HashCache
+
+LARGE = SMALL_FILE_SIZE * 4
+
+def content(seed: int, size: int) -> bytes:
+    return bytes((seed + i * 7) % 251 for i in range(size))
+
+class DuplicateSearchTest(unittest.IsolatedAsyncioTestCase):
+    """Поиск дубликатов по этапам (размер, начало и конец, полный хеш) и их обработка"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmp.name, 'data')
+        os.makedirs(os.path.join(self.root, 'sub'))
+        self.cache = HashCache(os.path.join(self.tmp.name, 'hashes.json.gz'))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name: str, data: bytes, mtime: int = None) -> str:
+        path = os.path.join(self.root, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+        return path
+
+    async def search(self) -> DuplicateSearch:
+        search = DuplicateSearch(self.root, self.cache)
+        await search.run()
+        self.assertIsNone(search.error)
+        return search
+
+    def groups(self, search: DuplicateSearch):
+        return sorted(sorted(info.path for info in group.files) for group in search.groups)
+
+    async def test_stages_separate_identical_from_different(self):
+        data = content(1, LARGE)
+        copies = [self.write('a.bin', data, 1000), self.write('sub/b.bin', data, 2000), self.write('c.bin', data, 3000)]
+        # Отличается последним байтом - отсеивается на хеше начала и конца
+        self.write('tail.bin', data[:-1] + bytes([data[-1] ^ 1]))
+        # Отличается в середине - доходит до полного хеша и там отсеивается
+        middle = bytearray(data)
+        middle[LARGE // 2] ^= 1
+        self.write('middle.bin', bytes(middle))
+        # Жесткая ссылка на копию - тот же файл, а не дубликат
+        os.link(copies[0], os.path.join(self.root, 'sub', 'a-link.bin'))
+        # Маленькие файлы сравниваются целиком уже на втором этапе
+        small = [self.write('s1.txt', b'small'), self.write('sub/s2.txt', b'small')]
+        self.write('unique.bin', content(2, LARGE + 1))
+        self.write('empty.txt', b'')
+
+        search = await self.search()
+        self.assertEqual(self.groups(search), [sorted(copies), sorted(small)])
+        self.assertEqual(search.linked, 1)
+        # Файлы уникального размера не читаются, пустые не учитываются
+        self.assertEqual(search.candidates, 7)
+        self.assertEqual(search.files_scanned, 9)
+        group = next(group for group in search.groups if group.size == LARGE)
+        self.assertEqual(group.keeper.path, copies[0])
+        self.assertEqual(group.wasted, LARGE * 2)
+
+        # Повторный поиск берет хеши из кэша
+        again = await self.search()
+        self.assertEqual(self.groups(again), self.groups(search))
+        self.assertEqual(again.files_hashed, 0)
+        self.assertGreater(again.cache_hits, 0)
+
+    async def test_hardlinks_only_are_not_duplicates(self):
+        path = self.write('a.bin', content(3, LARGE))
+        os.link(path, os.path.join(self.root, 'sub', 'b.bin'))
+        search = await self.search()
+        self.assertEqual(search.groups, [])
+        self.assertEqual(search.linked, 1)
+
+    async def test_resolve_delete_keeps_oldest(self):
+        data = content(4, LARGE)
+        keeper = self.write('old.bin', data, 1000)
+        copy = self.write('sub/new.bin', data, 2000)
+        group = (await self.search()).groups[0]
+        self.assertEqual(group.resolve('delete'), (1, []))
+        self.assertTrue(os.path.exists(keeper))
+        self.assertFalse(os.path.exists(copy))
+        self.assertEqual(group.resolved, 'delete')
+
+    async def test_resolve_link_shares_inode(self):
+        data = content(5, LARGE)
+        keeper = self.write('old.bin', data, 1000)
+        copy = self.write('sub/new.bin', data, 2000)
+        group = (await self.search()).groups[0]
+        self.assertEqual(group.resolve('link'), (1, []))
+        self.assertTrue(os.path.samefile(keeper, copy))
+        with open(copy, 'rb') as f:
+            self.assertEqual(f.read(), data)
+        self.assertEqual(os.listdir(os.path.join(self.root, 'sub')), ['new.bin'])
+        # После связывания повторный поиск их не находит
+        self.assertEqual((await self.search()).groups, [])
+
+    async def test_resolve_skips_files_changed_since_scan(self):
+        data = content(6, LARGE)
+        keeper = self.write('old.bin', data, 1000)
+        copy = self.write('sub/new.bin', data, 2000)
+        group = (await self.search()).groups[0]
+        self.write('sub/new.bin', content(7, LARGE), 3000)
+        done, errors = group.resolve('delete')
+        self.assertEqual(done, 0)
+        self.assertEqual(len(errors), 1)
+        self.assertIn('изменился', errors[0])
+        self.assertTrue(os.path.exists(copy))
+
+        # Изменился сам оставляемый файл - не трогаем ничего
+        self.write('sub/new.bin', data, 2000)
+        group = (await self.search()).groups[0]
+        self.write('old.bin', content(8, LARGE), 4000)
+        done, errors = group.resolve('link')
+        self.assertEqual(done, 0)
+        self.assertIn(keeper, errors[0])
+        self.assertFalse(os.path.samefile(keeper, copy))
+
+    async def test_resolve_link_across_devices_is_refused(self):
+        data = content(9, LARGE)
+        keeper = self.write('old.bin', data, 1000)
+        copy = self.write('sub/new.bin', data, 2000)
+        group = (await self.search()).groups[0]
+        real_stat = os.stat
+
+        def other_device(path, *args, **kwargs):
+            stats = real_stat(path, *args, **kwargs)
+            if path != copy:
+                return stats
+            return types.SimpleNamespace(
+                st_size=stats.st_size, st_mtime_ns=stats.st_mtime_ns, st_dev=stats.st_dev + 1
+            )
+
+        with mock.patch.object(duplicates.os, 'stat', other_device):
+            done, errors = group.resolve('link')
+        self.assertEqual(done, 0)
+        self.assertIn('другой диск', errors[0])
+        self.assertFalse(os.path.samefile(keeper, copy))
+        # Удаление копии на другом диске возможно
+        with mock.patch.object(duplicates.os, 'stat', other_device):
+            self.assertEqual(group.resolve('delete'), (1, []))
+        self.assertFalse(os.path.exists(copy))
+
+    def test_group_orders_by_mtime(self):
+        files = [
+            duplicates.FileInfo('/b', 10, 2, 1, 2),
+            duplicates.FileInfo('/a', 10, 2, 1, 3),
+            duplicates.FileInfo('/c', 10, 1, 1, 4),
+        ]
+        group = DuplicateGroup('x', files)
+        self.assertEqual([info.path for info in group.files], ['/c', '/a', '/b'])
+        self.assertEqual(group.wasted, 20)
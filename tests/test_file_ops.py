@@ -0,0 +1,203 @@
+import errno
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from core import file_ops
+from core.file_ops import FileJob, JobCancelled, copy_file, unique_path
+
+PAYLOAD = bytes(range(256)) * 1024
+
+def tree(root: str) -> list:
+    """Все файлы под root (относительные пути)"""
+    return sorted(
+        os.path.relpath(os.path.join(dirpath, name), root)
+        for dirpath, _, names in os.walk(root) for name in names
+    )
+
+class FileJobTest(unittest.IsolatedAsyncioTestCase):
+    """Копирование, перемещение и удаление файлов фоновой операцией"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.src = os.path.join(self.tmp.name, 'src')
+        self.dst = os.path.join(self.tmp.name, 'dst')
+        os.makedirs(os.path.join(self.src, 'dir', 'nested'))
+        os.makedirs(self.dst)
+        self.write('src/file.txt', b'hello')
+        self.write('src/dir/a.bin', PAYLOAD)
+        self.write('src/dir/nested/b.txt', b'nested')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.tmp.name, name)
+
+    def write(self, name: str, data: bytes):
+        with open(self.path(name), 'wb') as f:
+            f.write(data)
+
+    def read(self, name: str) -> bytes:
+        with open(self.path(name), 'rb') as f:
+            return f.read()
+
+    async def test_copy_tree(self):
+        job = FileJob('copy', [self.path('src/dir'), self.path('src/file.txt')], self.dst)
+        await job.run()
+        self.assertEqual(job.errors, [])
+        self.assertEqual(tree(self.dst), ['dir/a.bin', 'dir/nested/b.txt', 'file.txt'])
+        self.assertEqual(self.read('dst/dir/a.bin'), PAYLOAD)
+        self.assertEqual(job.done_files, 3)
+        self.assertEqual(job.done_bytes, len(PAYLOAD) + len(b'hello') + len(b'nested'))
+        # Источник не тронут
+        self.assertEqual(tree(self.src), ['dir/a.bin', 'dir/nested/b.txt', 'file.txt'])
+
+    async def test_copy_into_itself_is_rejected(self):
+        inside = self.path('src/dir/nested')
+        job = FileJob('copy', [self.path('src/dir')], inside)
+        await job.run()
+        self.assertEqual(len(job.errors), 1)
+        self.assertIn('саму себя', job.errors[0][1])
+        self.assertEqual(os.listdir(inside), ['b.txt'])
+        # Сама папка назначения тоже считается «внутри»
+        job = FileJob('move', [self.path('src/dir')], self.path('src/dir'))
+        await job.run()
+        self.assertEqual(len(job.errors), 1)
+        self.assertTrue(os.path.isdir(self.path('src/dir')))
+
+    async def test_name_clash_gets_suffix(self):
+        self.write('dst/file.txt', b'old')
+        os.makedirs(os.path.join(self.dst, 'dir'))
+        job = FileJob('copy', [self.path('src/file.txt'), self.path('src/dir')], self.dst)
+        await job.run()
+        self.assertEqual(job.errors, [])
+        self.assertEqual(self.read('dst/file.txt'), b'old')
+        self.assertEqual(self.read('dst/file (1).txt'), b'hello')
+        self.assertEqual(tree(os.path.join(self.dst, 'dir (1)')), ['a.bin', 'nested/b.txt'])
+
+    def test_unique_path(self):
+        self.assertEqual(unique_path(self.dst, 'new.txt'), os.path.join(self.dst, 'new.txt'))
+        self.write('dst/a.tar', b'')
+        self.write('dst/a (1).tar', b'')
+        self.assertEqual(unique_path(self.dst, 'a.tar'), os.path.join(self.dst, 'a (2).tar'))
+        # Битая символическая ссылка тоже занимает имя
+        os.symlink('missing', os.path.join(self.dst, 'link'))
+        self.assertEqual(unique_path(self.dst, 'link'), os.path.join(self.dst, 'link (1)'))
+
+    async def test_move_same_filesystem_renames(self):
+        job = FileJob('move', [self.path('src/dir')], self.dst)
+        await job.run()
+        self.assertEqual(job.errors, [])
+        self.assertEqual(job.renamed, 1)
+        self.assertEqual(job.done_files, 0)
+        self.assertFalse(os.path.exists(self.path('src/dir')))
+        self.assertEqual(tree(self.dst), ['dir/a.bin', 'dir/nested/b.txt'])
+
+    async def test_move_across_filesystems_copies_and_removes(self):
+        def cross_device(source, target):
+            raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+
+        job = FileJob('move', [self.path('src/dir'), self.path('src/file.txt')], self.dst)
+        with mock.patch.object(file_ops.os, 'rename', cross_device):
+            await job.run()
+        self.assertEqual(job.errors, [])
+        self.assertEqual(job.renamed, 0)
+        self.assertEqual(job.done_files, 3)
+        self.assertEqual(tree(self.dst), ['dir/a.bin', 'dir/nested/b.txt', 'file.txt'])
+        self.assertEqual(self.read('dst/dir/a.bin'), PAYLOAD)
+        # Исходные файлы и опустевшие папки удалены
+        self.assertEqual(os.listdir(self.src), [])
+
+    async def test_delete(self):
+        job = FileJob('delete', [self.path('src/dir'), self.path('src/missing')])
+        await job.run()
+        self.assertEqual(os.listdir(self.src), ['file.txt'])
+        self.assertEqual(job.errors, [(self.path('src/missing'), 'Не найден')])
+
+    async def test_cancel_leaves_no_part_files(self):
+        self.write('src/big.bin', PAYLOAD * 8)
+        job = FileJob('copy', [self.path('src/big.bin'), self.path('src/dir')], self.dst, workers=1)
+        count_bytes = job._on_bytes
+
+        def cancel_after_first_chunk(n):
+            count_bytes(n)
+            job.cancel()
+
+        job._on_bytes = cancel_after_first_chunk
+        with mock.patch.object(file_ops, 'COPY_CHUNK', 64 * 1024):
+            await job.run()
+        self.assertTrue(job.cancelled)
+        self.assertLess(job.done_bytes, len(PAYLOAD) * 8)
+        self.assertFalse([name for name in tree(self.dst) if name.endswith('.part')])
+        self.assertFalse(os.path.exists(os.path.join(self.dst, 'big.bin')))
+
+    def test_copy_file_cancelled_removes_part(self):
+        with self.assertRaises(JobCancelled):
+            copy_file(self.path('src/dir/a.bin'), self.path('dst/a.bin'), cancelled=lambda: True)
+        self.assertEqual(os.listdir(self.dst), [])
+
+class TransferTest(unittest.TestCase):
+    """Цепочка способов копирования: copy_file_range -> sendfile -> буфер"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.tmp.name, 'source')
+        self.target = os.path.join(self.tmp.name, 'target')
+        with open(self.source, 'wb') as f:
+            f.write(PAYLOAD)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def transfer(self) -> int:
+        progress = []
+        with open(self.source, 'rb') as fsrc, open(self.target, 'wb') as fdst:
+            copied = file_ops._transfer(fsrc.fileno(), fdst.fileno(), progress.append, None)
+        self.assertEqual(sum(progress), copied)
+        with open(self.target, 'rb') as f:
+            self.assertEqual(f.read(), PAYLOAD)
+        return copied
+
+    def failing(self, code: int):
+        calls = []
+
+        def call(*args):
+            calls.append(args)
+            raise OSError(code, os.strerror(code))
+        return call, calls
+
+    def test_default_mode(self):
+        self.assertEqual(self.transfer(), len(PAYLOAD))
+
+    @unittest.skipUnless(hasattr(os, 'copy_file_range') and hasattr(os, 'sendfile'), "нужны copy_file_range и sendfile")
+    def test_falls_back_to_sendfile(self):
+        copy_file_range, calls = self.failing(errno.EXDEV)
+        with mock.patch.object(file_ops.os, 'copy_file_range', copy_file_range):
+            self.assertEqual(self.transfer(), len(PAYLOAD))
+        self.assertEqual(len(calls), 1)
+
+    @unittest.skipUnless(hasattr(os, 'copy_file_range') and hasattr(os, 'sendfile'), "нужны copy_file_range и sendfile")
+    def test_falls_back_to_buffer(self):
+        copy_file_range, range_calls = self.failing(errno.ENOSYS)
+        sendfile, sendfile_calls = self.failing(errno.EINVAL)
+        with mock.patch.object(file_ops.os, 'copy_file_range', copy_file_range), \
+                mock.patch.object(file_ops.os, 'sendfile', sendfile):
+            self.assertEqual(self.transfer(), len(PAYLOAD))
+        self.assertEqual((len(range_calls), len(sendfile_calls)), (1, 1))
+
+    @unittest.skipUnless(hasattr(os, 'copy_file_range'), "нужен copy_file_range")
+    def test_zero_length_source_is_read_with_buffer(self):
+        # Файлы вроде /proc/* сообщают нулевой размер, хотя данные есть
+        with mock.patch.object(file_ops.os, 'copy_file_range', return_value=0) as copy_file_range:
+            self.assertEqual(self.transfer(), len(PAYLOAD))
+        self.assertEqual(copy_file_range.call_count, 1)
+
+    @unittest.skipUnless(hasattr(os, 'copy_file_range'), "нужен copy_file_range")
+    def test_other_errors_are_raised(self):
+        copy_file_range, _ = self.failing(errno.ENOSPC)
+        with mock.patch.object(file_ops.os, 'copy_file_range', copy_file_range):
+            with self.assertRaises(OSError) as raised:
+                self.transfer()
+        self.assertEqual(raised.exception.errno, errno.ENOSPC)
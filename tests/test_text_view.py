@@ -0,0 +1,140 @@
+import codecs
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from core import text_view
+from core.text_view import PAGE_CHARS, PAGE_LINES, BinaryFileError, TextFile, TextViewCache, detect_encoding
+
+class TextFileTest(unittest.TestCase):
+    """Постраничный просмотр: границы страниц, многобайтовые символы, BOM, кодировки"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def open(self, data: bytes, name: str = 'file.txt') -> TextFile:
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return TextFile(path, os.stat(path))
+
+    def forward(self, text_file: TextFile) -> list:
+        """Все страницы с начала файла; каждая начинается там, где кончилась предыдущая"""
+        pages = [text_file.page_after(0)]
+        while not pages[-1].at_end:
+            page = text_file.page_after(pages[-1].end)
+            self.assertEqual(page.start, pages[-1].end)
+            self.assertGreater(page.end, page.start)
+            pages.append(page)
+        return pages
+
+    def backward(self, text_file: TextFile) -> list:
+        """Все страницы с конца файла"""
+        pages = [text_file.last_page()]
+        while not pages[-1].at_start:
+            page = text_file.page_before(pages[-1].start)
+            self.assertEqual(page.end, pages[-1].start)
+            self.assertLess(page.start, page.end)
+            pages.append(page)
+        return pages[::-1]
+
+    def test_paging_forward_and_back(self):
+        lines = [f"строка {number}" for number in range(1, PAGE_LINES * 3 + 6)]
+        text_file = self.open(('\n'.join(lines) + '\n').encode('utf-8'))
+        self.assertEqual(text_file.encoding, 'utf-8')
+        pages = self.forward(text_file)
+        self.assertEqual(len(pages), 4)
+        self.assertEqual('\n'.join(page.text for page in pages).split('\n'), lines)
+        self.assertEqual([page.first_line for page in pages], [1, 41, 81, 121])
+        self.assertEqual(pages[0].total_lines, len(lines))
+        self.assertTrue(pages[0].at_start)
+
+        # Назад получаются те же строки; последняя страница - последние PAGE_LINES строк
+        back = self.backward(text_file)
+        self.assertEqual('\n'.join(page.text for page in back).split('\n'), lines)
+        self.assertEqual(back[-1].text.split('\n'), lines[-PAGE_LINES:])
+        self.assertEqual(back[-1].end, text_file.size)
+
+    def test_long_cyrillic_line_split_on_char_boundary(self):
+        # Нечетный префикс сдвигает двухбайтовые символы относительно границы страницы
+        line = 'x' + 'я' * (PAGE_CHARS * 2) + 'конец'
+        text_file = self.open(f"{line}\nвторая\n".encode('utf-8'))
+        pages = self.forward(text_file)
+        self.assertGreater(len(pages), 2)
+        for page in pages:
+            self.assertNotIn('�', page.text)
+            self.assertLessEqual(len(page.text), PAGE_CHARS + 1)
+        self.assertEqual(''.join(page.text for page in pages[:-1]) + pages[-1].text.split('\n')[0], line)
+        self.assertEqual(pages[-1].text.split('\n')[-1], 'вторая')
+
+        # Назад от конца - те же куски без поврежденных символов
+        back = self.backward(text_file)
+        for page in back:
+            self.assertNotIn('�', page.text)
+        self.assertIn('конец', back[-1].text + back[-2].text)
+
+    def test_utf8_bom_is_skipped(self):
+        text_file = self.open(codecs.BOM_UTF8 + 'первая\nвторая'.encode('utf-8'))
+        self.assertEqual(text_file.encoding, 'utf-8-sig')
+        page = text_file.page_after(0)
+        self.assertEqual(page.start, 3)
+        self.assertTrue(page.at_start)
+        self.assertTrue(page.at_end)
+        self.assertEqual(page.text, 'первая\nвторая')
+        self.assertEqual(text_file.last_page().text, page.text)
+
+    def test_utf16_paging(self):
+        lines = [f"строка {number}" for number in range(PAGE_LINES + 10)]
+        data = codecs.BOM_UTF16_LE + '\n'.join(lines).encode('utf-16-le')
+        text_file = self.open(data)
+        self.assertEqual(text_file.encoding, 'utf-16-le')
+        pages = self.forward(text_file)
+        self.assertEqual(len(pages), 2)
+        self.assertEqual('\n'.join(page.text for page in pages).split('\n'), lines)
+        self.assertEqual(pages[0].start, 2)
+        back = self.backward(text_file)
+        self.assertEqual('\n'.join(page.text for page in back).split('\n'), lines)
+
+    def test_binary_rejected(self):
+        with self.assertRaises(BinaryFileError):
+            self.open(b'ELF\x00\x01\x02text')
+
+    def test_cp1251_detection(self):
+        text = 'Привет, мир\nЕще строка\n'
+        # Без charset_normalizer не-UTF-8 текст читается как cp1251
+        with mock.patch.object(text_view, 'charset_normalizer', None):
+            text_file = self.open(text.encode('cp1251'))
+        self.assertEqual(text_file.encoding, 'cp1251')
+        self.assertEqual(text_file.page_after(0).text, text.rstrip('\n'))
+
+    def test_detect_encoding(self):
+        self.assertEqual(detect_encoding('текст'.encode('utf-8')), 'utf-8')
+        # Выборка могла обрезать последний символ посередине
+        self.assertEqual(detect_encoding('текст'.encode('utf-8')[:-1]), 'utf-8')
+        self.assertEqual(detect_encoding(codecs.BOM_UTF16_BE + 'a'.encode('utf-16-be')), 'utf-16-be')
+
+    def test_empty_file(self):
+        page = self.open(b'').last_page()
+        self.assertEqual(page.text, '')
+        self.assertTrue(page.at_start and page.at_end)
+
+    def test_cache_positions(self):
+        lines = [str(number) for number in range(PAGE_LINES * 2)]
+        path = os.path.join(self.tmp.name, 'numbers.txt')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines))
+        cache = TextViewCache()
+        first = cache.page(path, 'start')
+        self.assertEqual(first.text.split('\n'), lines[:PAGE_LINES])
+        self.assertEqual(cache.page(path, str(first.end)).text.split('\n'), lines[PAGE_LINES:])
+        last = cache.page(path, 'end')
+        self.assertEqual(cache.page(path, f"b{last.start}"), first)
+        self.assertIs(cache.get(path), cache.get(path))
+        # Измененный файл открывается заново
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write('\nеще')
+        self.assertEqual(cache.page(path, 'end').text.split('\n')[-1], 'еще')
@@ -0,0 +1,150 @@
+import asyncio
+import time
+import unittest
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from core import uploader
+from core.uploader import COOLDOWN, FileHost, Uploader
+
+PAYLOAD = b'x' * 256 * 1024
+
+def make_stream():
+    async def stream():
+        for start in range(0, len(PAYLOAD), 64 * 1024):
+            yield PAYLOAD[start:start + 64 * 1024]
+    return stream()
+
+class UploaderTest(unittest.IsolatedAsyncioTestCase):
+    """Загрузчик против локальных серверов, изображающих файлообменники"""
+
+    async def asyncSetUp(self):
+        self.hits = {}
+        self.received = {}
+        # Медленный сервис отвечает только после release (или никогда)
+        self.release = asyncio.Event()
+        app = web.Application()
+        app.router.add_post('/ok/{name}', self.handle_ok)
+        app.router.add_post('/fail/{name}', self.handle_fail)
+        app.router.add_post('/slow/{name}', self.handle_slow)
+        self.server = TestServer(app)
+        await self.server.start_server()
+
+    async def asyncTearDown(self):
+        self.release.set()
+        await self.server.close()
+
+    async def _receive(self, request) -> str:
+        name = request.match_info['name']
+        self.hits[name] = self.hits.get(name, 0) + 1
+        post = await request.post()
+        self.received[name] = len(post['file'].file.read())
+        return name
+
+    async def handle_ok(self, request):
+        name = await self._receive(request)
+        return web.json_response({'success': True, 'link': f'https://{name}/file'})
+
+    async def handle_fail(self, request):
+        await self._receive(request)
+        return web.Response(status=500)
+
+    async def handle_slow(self, request):
+        name = await self._receive(request)
+        await self.release.wait()
+        return web.json_response({'success': True, 'link': f'https://{name}/file'})
+
+    def host(self, kind: str, name: str) -> FileHost:
+        return FileHost(name, str(self.server.make_url(f'/{kind}/{name}')), success_key='success')
+
+    async def test_failover_to_next_host(self):
+        up = Uploader([self.host('fail', 'bad'), self.host('ok', 'good')], race_below=0)
+        retries = []
+        result = await up.upload_stream(make_stream, 'a.bin', len(PAYLOAD), on_retry=retries.append)
+        self.assertEqual(result.host, 'good')
+        self.assertEqual(result.link, 'https://good/file')
+        self.assertEqual(result.size, len(PAYLOAD))
+        self.assertEqual(self.received['good'], len(PAYLOAD))
+        self.assertEqual(retries, ['good'])
+        self.assertEqual(up.health['bad'].failures, 1)
+        self.assertEqual(up.health['good'].successes, 1)
+
+    async def test_all_hosts_failing(self):
+        up = Uploader([self.host('fail', 'a'), self.host('fail', 'b')], race_below=0)
+        self.assertIsNone(await up.upload_stream(make_stream, 'a.bin', len(PAYLOAD)))
+        self.assertEqual(self.hits, {'a': 1, 'b': 1})
+
+    async def test_race_returns_first_and_cancels_loser(self):
+        up = Uploader([self.host('slow', 'slow'), self.host('ok', 'fast')], race_below=len(PAYLOAD) + 1)
+        progress = []
+
+        async def on_chunk(nbytes):
+            progress.append(nbytes)
+
+        started = time.monotonic()
+        result = await asyncio.wait_for(
+            up.upload_stream(make_stream, 'a.bin', len(PAYLOAD), on_chunk=on_chunk), 5
+        )
+        self.assertEqual(result.host, 'fast')
+        self.assertLess(time.monotonic() - started, 5)
+        # Обе загрузки начались, но прогресс - только по лидеру, без двойного счета
+        self.assertEqual(self.hits, {'slow': 1, 'fast': 1})
+        self.assertEqual(sum(progress), len(PAYLOAD))
+        # Отмененная загрузка не считается ни успехом, ни ошибкой сервиса
+        self.assertEqual((up.health['slow'].successes, up.health['slow'].failures), (0, 0))
+
+    async def test_race_not_used_for_large_files(self):
+        up = Uploader([self.host('ok', 'a'), self.host('ok', 'b')], race_below=len(PAYLOAD))
+        result = await up.upload_stream(make_stream, 'a.bin', len(PAYLOAD))
+        self.assertEqual(len(self.hits), 1)
+        self.assertEqual(result.host, next(iter(self.hits)))
+
+    async def test_backoff_after_failures(self):
+        up = Uploader([self.host('fail', 'bad'), self.host('ok', 'good')], race_below=0)
+        # Без замеров порядок - порядок регистрации
+        self.assertEqual([h.name for h in up.ranked()], ['bad', 'good'])
+        await up.upload_stream(make_stream, 'a.bin', len(PAYLOAD))
+        health = up.health['bad']
+        self.assertFalse(health.available())
+        self.assertAlmostEqual(health.retry_at - time.monotonic(), COOLDOWN, delta=5)
+        # Сервис на паузе пробуется последним
+        self.assertEqual([h.name for h in up.ranked()], ['good', 'bad'])
+        await up.upload_stream(make_stream, 'a.bin', len(PAYLOAD))
+        self.assertEqual(self.hits, {'bad': 1, 'good': 2})
+
+        # Пауза удваивается с каждой ошибкой подряд, но не больше MAX_COOLDOWN
+        health.record_failure('again')
+        self.assertAlmostEqual(health.retry_at - time.monotonic(), COOLDOWN * 2, delta=5)
+        for _ in range(20):
+            health.record_failure('again')
+        self.assertAlmostEqual(health.retry_at - time.monotonic(), uploader.MAX_COOLDOWN, delta=5)
+
+        # Успех снимает паузу
+        health.record_success(1024, 1.0)
+        self.assertTrue(health.available())
+        self.assertEqual(health.consecutive_failures, 0)
+
+    async def test_health_score_updates(self):
+        up = Uploader([self.host('fail', 'bad'), self.host('ok', 'good')], race_below=0)
+        before = up.health['good'].score()
+        await up.upload_stream(make_stream, 'a.bin', len(PAYLOAD))
+        good, bad = up.health['good'], up.health['bad']
+        self.assertGreater(good.speed, 0)
+        self.assertEqual(bad.speed, 0)
+        self.assertEqual(bad.last_error, 'bad: HTTP 500')
+        self.assertNotEqual(good.score(), before)
+        self.assertGreater(good.score() / good.speed, bad.score() / uploader.UNKNOWN_SPEED)
+
+        # Сглаженная скорость: новый замер входит с весом SPEED_SMOOTHING
+        speed = good.speed
+        good.record_success(int(speed * 3), 1.0)
+        self.assertAlmostEqual(good.speed, speed + uploader.SPEED_SMOOTHING * (speed * 3 - speed), delta=1)
+
+        stats = up.stats()
+        self.assertEqual(stats['good']['successes'], 2)
+        self.assertEqual(stats['bad']['failures'], 1)
+        self.assertGreater(stats['bad']['paused_for'], 0)
+
+if __name__ == '__main__':
+    unittest.main()